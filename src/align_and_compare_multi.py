@@ -9,6 +9,11 @@ Compares:
  - Road signs (count)
  - Shoulder condition (erosion score / presence)
  - VRU elements (optional)
+The summary is computed by compare_engine.py (one vectorized pass over both runs), which
+also adds "distributions" and per-window "segments"; the compare_* functions below are kept
+for callers that already hold nested results dicts.
+With --alignment (or --base-frames/--present-frames, aligned here by align_frames.py) base and
+present frames are matched by appearance, and segments compare the same stretch of road.
 Outputs:
   results/compare/multi_summary.json
   results/compare/multi_report.pdf
@@ -19,10 +24,19 @@ import os
 import argparse
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
+from src.results_io import load_results
+from src.compare_engine import load_run, compare_runs, SEGMENT_MODES
+from src.align_frames import align, load_alignment
+from src.tracking import track_results
+from src import profiling
 
 def load_json(path):
-    with open(path, "r") as f:
-        return json.load(f)
+    """
+    Per-frame results from detect_multiclass.py in any layout (.json, .jsonl, .npz, .parquet).
+    .jsonl files come back as a StreamedResults view: each legacy compare_* pass streams them again.
+    (main() uses compare_engine, which reads .jsonl line by line into numeric columns instead.)
+    """
+    return load_results(path, stream=True)
 
 def ensure_dir(path):
     os.makedirs(path, exist_ok=True)
@@ -88,12 +102,19 @@ def compare_signs(base, present):
     base_count = count_signs(base)
     present_count = count_signs(present)
 
-    verdict = "Improved" if present_count >= base_count else "Worsened"
+    # one physical sign seen on several frames counts once
+    base_unique = track_results(base.items())["signs"]
+    present_unique = track_results(present.items())["signs"]
+
+    verdict = "Improved" if present_unique >= base_unique else "Worsened"
 
     return {
         "base_sign_count": base_count,
         "present_sign_count": present_count,
         "difference": present_count - base_count,
+        "base_unique_signs": base_unique,
+        "present_unique_signs": present_unique,
+        "unique_difference": present_unique - base_unique,
         "verdict": verdict
     }
 
@@ -117,8 +138,8 @@ def compare_shoulder(base, present):
 # --------------------------------------------------------------------
 # PDF Generator
 # --------------------------------------------------------------------
-def generate_pdf(summary, out_pdf):
-    c = canvas.Canvas(out_pdf, pagesize=A4)
+def draw_comparison(c, summary):
+    """Draws the comparison sections from the top of the current page of canvas c (make_final_report reuses it)."""
     c.setFont("Helvetica-Bold", 18)
     c.drawString(40, 800, "Road Infrastructure Comparison Report")
     c.setFont("Helvetica", 12)
@@ -127,6 +148,9 @@ def generate_pdf(summary, out_pdf):
 
     def add_section(title, data_dict):
         nonlocal y
+        if y - 20 - 15 * len(data_dict) < 40:
+            c.showPage()
+            y = 800
         c.setFont("Helvetica-Bold", 14)
         c.drawString(40, y, title)
         y -= 20
@@ -141,6 +165,10 @@ def generate_pdf(summary, out_pdf):
     add_section("Road Signs", summary["signs"])
     add_section("Shoulder Condition", summary["shoulder"])
 
+
+def generate_pdf(summary, out_pdf):
+    c = canvas.Canvas(out_pdf, pagesize=A4)
+    draw_comparison(c, summary)
     c.save()
     print(f"📄 PDF saved: {out_pdf}")
 
@@ -153,24 +181,52 @@ def main():
     parser.add_argument("--present", required=True)
     parser.add_argument("--out", default="results/compare/multi_summary.json")
     parser.add_argument("--pdf", default="results/compare/multi_report.pdf")
+    parser.add_argument("--segment-size", type=float, default=50,
+                        help="window size for per-segment comparison (0 disables segments)")
+    parser.add_argument("--segment-by", choices=SEGMENT_MODES, default="frames",
+                        help="window unit; seconds/meters need timestamps (from --video runs)")
+    parser.add_argument("--speed-kmh", type=float, default=40,
+                        help="assumed survey speed to turn timestamps into meters for --segment-by meters")
+    parser.add_argument("--track-window", type=int, default=5,
+                        help="tracking window for results written without track ids (see tracking.py)")
+    parser.add_argument("--alignment", help="alignment.json from align_frames.py (base -> present frame mapping)")
+    parser.add_argument("--base-frames", help="base frames folder/video to align against --present-frames")
+    parser.add_argument("--present-frames", help="present frames folder/video")
+    parser.add_argument("--band", type=float, default=0.1, help="DTW band for --base-frames/--present-frames (see align_frames.py)")
+    parser.add_argument("--profile", action="store_true", help="print per-stage timings and peak RSS")
+    parser.add_argument("--trace", default=None, help="Chrome trace-event JSON output (implies --profile)")
     args = parser.parse_args()
+    if args.profile or args.trace:
+        profiling.enable(trace=bool(args.trace))
 
     ensure_dir(os.path.dirname(args.out))
 
-    base = load_json(args.base)
-    present = load_json(args.present)
-
-    summary = {
-        "pavement": compare_pavement(base, present),
-        "lane": compare_lane_markings(base, present),
-        "signs": compare_signs(base, present),
-        "shoulder": compare_shoulder(base, present)
-    }
-
-    json.dump(summary, open(args.out, "w"), indent=2)
+    with profiling.stage("load_base"):
+        base = load_run(args.base, args.track_window)
+    with profiling.stage("load_present"):
+        present = load_run(args.present, args.track_window)
+
+    mapping = None
+    if args.alignment:
+        mapping = load_alignment(args.alignment)
+    elif args.base_frames and args.present_frames:
+        with profiling.stage("align"):
+            alignment = align(args.base_frames, args.present_frames, args.band)
+        align_out = os.path.join(os.path.dirname(args.out), "alignment.json")
+        json.dump(alignment, open(align_out, "w"), indent=2)
+        print(f"Saved alignment: {align_out} (mean cost {alignment['mean_cost']})")
+        mapping = {p["base"]: p["present"] for p in alignment["pairs"]}
+
+    with profiling.stage("compare"):
+        summary = compare_runs(base, present, args.segment_size, args.segment_by, args.speed_kmh, mapping)
+
+    with profiling.stage("write_summary"):
+        json.dump(summary, open(args.out, "w"), indent=2)
     print("Saved summary:", args.out)
 
-    generate_pdf(summary, args.pdf)
+    with profiling.stage("pdf"):
+        generate_pdf(summary, args.pdf)
+    profiling.report(args.trace)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,197 @@
+# src/align_frames.py
+"""
+Base-vs-present frame alignment.
+
+Each sampled frame gets a compact fixed-length descriptor:
+ - the per-bit frequency of its ORB descriptors (256 values, what kind of texture is there)
+ - a tiny normalized grayscale thumbnail (coarse layout of the scene)
+The two sequences are then matched with dynamic time warping restricted to a
+Sakoe-Chiba band around the diagonal, so cost stays O(n*w) instead of O(n*m).
+The warping path gives a base -> present frame mapping that compare_engine.py
+uses to compare every metric location by location.
+
+PYTHONPATH=. python src/align_frames.py --base frames/base --present frames/present --out results/compare/alignment.json
+(--base / --present also accept videos, sampled with --fps like detect_multiclass.py --video)
+"""
+
+import os
+import json
+import argparse
+import cv2
+import numpy as np
+from src.extract_frames import iter_frames, SAMPLE_MODES
+
+ORB_FEATURES = 300
+WORK_WIDTH = 320
+THUMB_SIZE = (16, 9)
+
+
+def iter_source(src, fps=1.0, sample_mode="grab"):
+    """
+    Yields (fname, frame) from a frames folder or a video.
+    Names match detect_multiclass.py, so the mapping lines up with result keys.
+    """
+    if os.path.isdir(src):
+        for fname in sorted(os.listdir(src)):
+            if not fname.lower().endswith((".jpg", ".png", ".webp")) or fname.endswith(("_multi.jpg", "_multi.png", "_multi.webp")):
+                continue
+            frame = cv2.imread(os.path.join(src, fname))
+            if frame is not None:
+                yield fname, frame
+        return
+    for idx, _, frame in iter_frames(src, fps, sample_mode):
+        yield f"frame_{idx:05}.jpg", frame
+
+
+def _unit(v):
+    n = np.linalg.norm(v)
+    return v / n if n > 0 else v
+
+
+def frame_descriptor(frame, orb):
+    """BGR frame -> float32 vector of length 256 + thumbnail pixels, unit norm."""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    h, w = gray.shape[:2]
+    if w > WORK_WIDTH:
+        gray = cv2.resize(gray, (WORK_WIDTH, max(1, int(round(h*WORK_WIDTH/w)))), interpolation=cv2.INTER_AREA)
+
+    _, des = orb.detectAndCompute(gray, None)
+    bits = np.unpackbits(des, axis=1).mean(axis=0) - 0.5 if des is not None else np.zeros(256)
+
+    thumb = cv2.resize(gray, THUMB_SIZE, interpolation=cv2.INTER_AREA).astype(np.float64).ravel()
+    thumb = thumb - thumb.mean()
+
+    return (np.concatenate([_unit(bits), _unit(thumb)]) / np.sqrt(2)).astype(np.float32)
+
+
+def describe(src, fps=1.0, sample_mode="grab"):
+    """Returns (names, descriptors[n, d]) for a frames folder or video."""
+    orb = cv2.ORB_create(nfeatures=ORB_FEATURES)
+    names, rows = [], []
+    for fname, frame in iter_source(src, fps, sample_mode):
+        names.append(fname)
+        rows.append(frame_descriptor(frame, orb))
+    dim = 256 + THUMB_SIZE[0]*THUMB_SIZE[1]
+    return names, (np.stack(rows) if rows else np.zeros((0, dim), np.float32))
+
+
+def pair_cost(a, B):
+    """Squared distance between unit vectors, halved: 0 (identical) .. 2 (opposite)."""
+    return np.maximum(0.0, 1.0 - B @ a)
+
+
+def band_limits(n, m, band):
+    """Per base row i, present columns [lo[i], hi[i]) inside the Sakoe-Chiba band around the (stretched) diagonal."""
+    # the band must be at least as wide as the slope, or neighbouring rows stop overlapping
+    band = max(int(band), int(np.ceil(max(n, m) / max(min(n, m), 1))))
+    centers = np.round(np.arange(n) * ((m - 1) / (n - 1) if n > 1 else 0)).astype(int)
+    lo = np.clip(centers - band, 0, m - 1)
+    hi = np.clip(centers + band + 1, 1, m)
+    lo[0], hi[-1] = 0, m
+    return lo, hi, band
+
+
+def banded_dtw(A, B, band):
+    """
+    DTW between descriptor sequences A (n, d) and B (m, d) inside a Sakoe-Chiba band.
+    Returns (path, total_cost, band) with path a list of (i, j) from (0, 0) to (n-1, m-1).
+    Each band row is filled with numpy: the left-neighbour recursion
+    D[j] = min(v[j], c[j] + D[j-1]) is unrolled as S[j] + min_{k<=j}(v[k] - S[k]), S = cumsum(c).
+    """
+    n, m = len(A), len(B)
+    if n == 0 or m == 0:
+        return [], 0.0, band
+    lo, hi, band = band_limits(n, m, band)
+    rows = []
+    for i in range(n):
+        l, h = lo[i], hi[i]
+        c = pair_cost(A[i], B[l:h])
+        if i == 0:
+            v = np.full(h - l, np.inf)
+            v[0] = c[0]
+        else:
+            prev, pl, ph = rows[-1], lo[i-1], hi[i-1]
+            js = np.arange(l, h)
+            up = np.full(h - l, np.inf)
+            ok = (js >= pl) & (js < ph)
+            up[ok] = prev[js[ok] - pl]
+            diag = np.full(h - l, np.inf)
+            ok = (js - 1 >= pl) & (js - 1 < ph)
+            diag[ok] = prev[js[ok] - 1 - pl]
+            v = c + np.minimum(up, diag)
+        S = np.cumsum(c)
+        rows.append(S + np.minimum.accumulate(v - S))
+
+    def D(i, j):
+        if i < 0 or j < lo[i] or j >= hi[i]:
+            return np.inf
+        return rows[i][j - lo[i]]
+
+    i, j = n - 1, m - 1
+    path = [(i, j)]
+    while i > 0 or j > 0:
+        steps = [(i-1, j-1), (i-1, j), (i, j-1)]
+        i, j = min(steps, key=lambda s: D(*s) if s[0] >= 0 and s[1] >= 0 else np.inf)
+        path.append((i, j))
+    path.reverse()
+    return path, float(rows[-1][-1]), band
+
+
+def frame_mapping(path, A, B):
+    """One present frame per base frame: the cheapest match among the path cells of that base row."""
+    best = {}
+    for i, j in path:
+        c = float(pair_cost(A[i], B[j:j+1])[0])
+        if i not in best or c < best[i][1]:
+            best[i] = (j, c)
+    return [(i, j, c) for i, (j, c) in sorted(best.items())]
+
+
+def align(base, present, band=0.1, fps=1.0, sample_mode="grab"):
+    """
+    base / present: frames folders or videos.
+    band: Sakoe-Chiba half-width in frames, or as a fraction of the longer sequence if < 1.
+    Returns the alignment dict written by the CLI.
+    """
+    base_names, A = describe(base, fps, sample_mode)
+    present_names, B = describe(present, fps, sample_mode)
+    n, m = len(A), len(B)
+    w = int(round(band * max(n, m))) if band < 1 else int(band)
+    path, total, w = banded_dtw(A, B, max(w, 1))
+    pairs = frame_mapping(path, A, B)
+    return {
+        "base": base,
+        "present": present,
+        "base_frames": n,
+        "present_frames": m,
+        "band": w,
+        "total_cost": round(total, 4),
+        "mean_cost": round(total / max(len(path), 1), 4),
+        "pairs": [{"base": base_names[i], "present": present_names[j], "cost": round(c, 4)} for i, j, c in pairs],
+    }
+
+
+def load_alignment(path):
+    """alignment.json -> {base frame: present frame}"""
+    with open(path) as f:
+        data = json.load(f)
+    return {p["base"]: p["present"] for p in data["pairs"]}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--base", required=True, help="base frames folder or video")
+    ap.add_argument("--present", required=True, help="present frames folder or video")
+    ap.add_argument("--out", default="results/compare/alignment.json")
+    ap.add_argument("--band", type=float, default=0.1,
+                    help="Sakoe-Chiba half-width: frames, or fraction of the longer run if < 1")
+    ap.add_argument("--fps", type=float, default=1, help="sampling rate when --base/--present are videos")
+    ap.add_argument("--sample_mode", choices=SAMPLE_MODES, default="grab")
+    args = ap.parse_args()
+
+    result = align(args.base, args.present, args.band, args.fps, args.sample_mode)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Aligned {result['base_frames']} base / {result['present_frames']} present frames "
+          f"(band {result['band']}, mean cost {result['mean_cost']}) -> {args.out}")
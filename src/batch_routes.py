@@ -0,0 +1,209 @@
+# src/batch_routes.py
+"""
+Batch mode: many base/present route pairs in one invocation.
+
+Reads a manifest of routes, runs detection for every base and present run on one
+shared process pool (each worker loads the models once and reuses them for every
+run it gets), compares each route as soon as both of its runs are done, and writes:
+  <out>/<route>/multi_base.jsonl, multi_present.jsonl   per-frame results
+  <out>/<route>/multi_summary.json, multi_report.pdf    per-route comparison
+  <out>/network_summary.json, network_ranking.csv       routes ranked by deterioration
+
+Manifest: CSV with a header, or JSON (a list, or {"routes": [...]}); fields
+  route, base, present [, fps]
+base / present are videos (streamed, see detect_multiclass.py --video) or frames folders.
+
+PYTHONPATH=. python src/batch_routes.py --manifest routes.csv --out results/routes --workers 4
+"""
+
+import os
+import csv
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from src.utils import ensure_dir
+from src.extract_frames import SAMPLE_MODES
+from src.detect_multiclass import _init_worker, _detect_run, OBJ_MODEL, SEG_MODEL, CONF_THR, TEMPORAL_WINDOW, BACKENDS
+from src.image_writer import FORMATS
+from src.road_roi import parse_roi
+from src.compare_engine import load_run, compare_runs
+from src.align_and_compare_multi import generate_pdf
+from src.align_frames import align
+
+RANKING_COLUMNS = ["rank", "route", "deterioration_score", "worsened_factors",
+                   "pavement_percent_change", "fade_change", "erosion_change", "sign_change_percent", "error"]
+
+
+def load_manifest(path):
+    """-> list of {"route", "base", "present"[, "fps"]} in manifest order"""
+    with open(path) as f:
+        if path.lower().endswith(".json"):
+            data = json.load(f)
+            routes = data["routes"] if isinstance(data, dict) else data
+        else:
+            routes = [{k.strip(): (v or "").strip() for k, v in row.items()} for row in csv.DictReader(f)]
+    seen = set()
+    for i, r in enumerate(routes):
+        if not r.get("base") or not r.get("present"):
+            raise ValueError(f"manifest row {i+1}: base and present are required")
+        r["route"] = r.get("route") or f"route_{i+1:03}"
+        if r["route"] in seen:
+            raise ValueError(f"manifest row {i+1}: duplicate route name {r['route']!r}")
+        seen.add(r["route"])
+        r["fps"] = float(r["fps"]) if r.get("fps") else None
+    return routes
+
+
+def deterioration(summary):
+    """
+    Per-factor worsening (positive = worse) and their sum as one score for ranking.
+    Everything is in percent / percentage points: pavement mask area change in %, lane fade
+    and shoulder erosion changes (0..1 scores) x100, and lost unique signs as % of the base count.
+    """
+    signs = summary["signs"]
+    base_signs = signs.get("base_unique_signs", signs["base_sign_count"])
+    sign_diff = signs.get("unique_difference", signs["difference"])
+    parts = {
+        "pavement_percent_change": summary["pavement"]["percent_change"],
+        "fade_change": round(summary["lane"]["fade_change"] * 100, 2),
+        "erosion_change": round(summary["shoulder"]["change"] * 100, 2),
+        "sign_change_percent": round(-sign_diff / max(base_signs, 1) * 100, 2),
+    }
+    worsened = sum(1 for k in ("pavement", "lane", "signs", "shoulder") if summary[k]["verdict"] == "Worsened")
+    return dict(parts, deterioration_score=round(sum(parts.values()), 2), worsened_factors=worsened)
+
+
+def network_rollup(rows):
+    """Ranks routes by deterioration_score (worst first); failed routes go last."""
+    ok = sorted([r for r in rows if not r.get("error")], key=lambda r: -r["deterioration_score"])
+    failed = [r for r in rows if r.get("error")]
+    for i, r in enumerate(ok, 1):
+        r["rank"] = i
+    scores = [r["deterioration_score"] for r in ok]
+    network = {
+        "routes": len(rows),
+        "compared": len(ok),
+        "failed": len(failed),
+        "mean_deterioration_score": round(sum(scores) / len(scores), 2) if scores else 0,
+        "routes_worsened": sum(1 for s in scores if s > 0),
+        "worsened_by_factor": {k: sum(1 for r in ok if r["verdicts"][k] == "Worsened")
+                               for k in ("pavement", "lane", "signs", "shoulder")},
+    }
+    return {"network": network, "routes": ok + failed}
+
+
+def compare_route(route, route_dir, base_out, present_out, segment_size, alignment=None):
+    base, present = load_run(base_out), load_run(present_out)
+    mapping = {p["base"]: p["present"] for p in alignment["pairs"]} if alignment else None
+    summary = compare_runs(base, present, segment_size, mapping=mapping)
+    with open(os.path.join(route_dir, "multi_summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    generate_pdf(summary, os.path.join(route_dir, "multi_report.pdf"))
+    row = {"route": route["route"], **deterioration(summary),
+           "verdicts": {k: summary[k]["verdict"] for k in ("pavement", "lane", "signs", "shoulder")}}
+    return row
+
+
+def run_batch(manifest, out_dir, obj_model_path=OBJ_MODEL, seg_model_path=SEG_MODEL, conf=CONF_THR, workers=2,
+              fps=1, sample_mode="grab", batch_size=1, overlays=False, save_frames=False, image_format="jpg",
+              quality=95, work_width=None, roi=None, cache_path=None, track_window=TEMPORAL_WINDOW,
+              segment_size=50, do_align=False, backend="torch", socket_path=None):
+    routes = load_manifest(manifest)
+    ensure_dir(out_dir)
+    threads = max(1, (os.cpu_count() or 1) // max(1, workers))
+    t0 = time.perf_counter()
+
+    pending = {}   # route name -> set of run tags still running
+    outputs = {}   # (route name, tag) -> results path / alignment dict
+    rows = []
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(obj_model_path, seg_model_path, threads, None, conf, work_width, None, None, backend, socket_path)) as pool:
+        futures = {}
+        for r in routes:
+            route_dir = os.path.join(out_dir, r["route"])
+            ensure_dir(route_dir)
+            run_fps = r["fps"] or fps
+            tags = ["base", "present"]
+            for tag in tags:
+                out_json = os.path.join(route_dir, f"multi_{tag}.jsonl")
+                overlay_dir = os.path.join(route_dir, f"overlays_{tag}") if overlays else None
+                frames_dir = os.path.join(route_dir, f"frames_{tag}") if save_frames else None
+                fut = pool.submit(_detect_run, r[tag], out_json, overlay_dir, conf, batch_size, run_fps, sample_mode,
+                                  frames_dir, image_format, quality, cache_path, roi, 50, track_window)
+                futures[fut] = (r, tag)
+            if do_align:
+                futures[pool.submit(align, r["base"], r["present"], 0.1, run_fps, sample_mode)] = (r, "alignment")
+                tags.append("alignment")
+            pending[r["route"]] = set(tags)
+
+        for fut in as_completed(futures):
+            r, tag = futures[fut]
+            name = r["route"]
+            if name not in pending:
+                continue   # route already failed
+            try:
+                outputs[(name, tag)] = fut.result()
+            except Exception as e:
+                print(f"⚠ {name}: {tag} failed: {e}")
+                rows.append({"route": name, "error": f"{tag}: {e}"})
+                pending.pop(name)
+                continue
+            pending[name].discard(tag)
+            if pending[name]:
+                continue
+            pending.pop(name)
+            route_dir = os.path.join(out_dir, name)
+            try:
+                row = compare_route(r, route_dir, outputs[(name, "base")][0], outputs[(name, "present")][0],
+                                    segment_size, outputs.get((name, "alignment")))
+                rows.append(row)
+                print(f"✔ {name}: deterioration score {row['deterioration_score']}")
+            except Exception as e:
+                print(f"⚠ {name}: comparison failed: {e}")
+                rows.append({"route": name, "error": f"compare: {e}"})
+
+    rollup = network_rollup(rows)
+    with open(os.path.join(out_dir, "network_summary.json"), "w") as f:
+        json.dump(rollup, f, indent=2)
+    with open(os.path.join(out_dir, "network_ranking.csv"), "w", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=RANKING_COLUMNS, extrasaction="ignore")
+        w.writeheader()
+        w.writerows(rollup["routes"])
+    n = rollup["network"]
+    print(f"Batch done in {time.perf_counter() - t0:.1f}s: {n['compared']}/{n['routes']} routes compared, "
+          f"{n['routes_worsened']} worsened -> {out_dir}/network_summary.json")
+    return rollup
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--manifest", required=True, help="CSV or JSON with route, base, present [, fps]")
+    ap.add_argument("--out", default="results/routes")
+    ap.add_argument("--workers", type=int, default=2, help="worker processes; each loads the models once")
+    ap.add_argument("--fps", type=float, default=1, help="sample rate for video runs (manifest fps overrides)")
+    ap.add_argument("--sample_mode", choices=SAMPLE_MODES, default="grab")
+    ap.add_argument("--batch-size", type=int, default=1, help="frames per model call")
+    ap.add_argument("--overlays", action="store_true", help="also write overlays per route")
+    ap.add_argument("--save-frames", action="store_true", help="also write the sampled frames of video runs per route")
+    ap.add_argument("--image-format", choices=FORMATS, default="jpg")
+    ap.add_argument("--quality", type=int, default=95)
+    ap.add_argument("--obj_model", default=OBJ_MODEL)
+    ap.add_argument("--seg_model", default=SEG_MODEL)
+    ap.add_argument("--conf", type=float, default=CONF_THR)
+    ap.add_argument("--work-width", type=int, default=None)
+    ap.add_argument("--roi", default="none", help="road ROI spec (see detect_multiclass.py); auto is estimated per run")
+    ap.add_argument("--cache", default=None, help="shared per-frame result cache (sqlite file)")
+    ap.add_argument("--track-window", type=int, default=TEMPORAL_WINDOW)
+    ap.add_argument("--segment-size", type=float, default=50, help="frames per comparison segment (0 disables)")
+    ap.add_argument("--align", action="store_true", help="align base/present frames per route (see align_frames.py)")
+    ap.add_argument("--backend", choices=BACKENDS, default="torch", help="server: workers share a running inference_server.py")
+    ap.add_argument("--socket", default=None)
+    args = ap.parse_args()
+
+    run_batch(args.manifest, args.out, args.obj_model, args.seg_model, args.conf, args.workers, args.fps,
+              args.sample_mode, args.batch_size, args.overlays, args.save_frames, args.image_format, args.quality,
+              args.work_width, parse_roi(args.roi), args.cache, args.track_window, args.segment_size, args.align,
+              args.backend, args.socket)
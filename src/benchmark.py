@@ -0,0 +1,284 @@
+# src/benchmark.py
+"""
+Offline benchmark suite: no network, no model weights, no real footage.
+
+Synthetic road videos (synthetic_road.py) are generated per resolution / frame count,
+and every stage runs on them:
+  extract, process_frames, detect_lane_markings, detect_shoulder_issues,
+  compare (compare_engine), compare_legacy (compare_* functions), generate_final_report
+process_frames uses StubYOLO, a deterministic stand-in for ultralytics.YOLO that finds
+the synthetic red signs and dark cracks with plain OpenCV and returns results shaped
+like ultralytics Results (inference.Results: boxes.cls / conf / xyxy, masks.data, model.names).
+
+Results go to a JSON file (one entry per stage@WxH@frames, best of --repeat runs) that can be
+diffed between commits; --baseline compares against an earlier file and exits with status 1
+when a stage got slower than its threshold.
+
+PYTHONPATH=. python src/benchmark.py --out results/benchmark.json
+PYTHONPATH=. python src/benchmark.py --out results/benchmark_new.json --baseline results/benchmark.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import cv2
+import numpy as np
+from src.synthetic_road import write_video, parse_size
+from src.inference import Boxes, Masks, Results
+
+STAGES = ("extract", "process_frames", "detect_lane_markings", "detect_shoulder_issues",
+          "compare", "compare_legacy", "generate_final_report")
+# allowed slowdown (fraction of the baseline ms/frame) before a stage counts as a regression
+THRESHOLDS = {"default": 0.15, "extract": 0.25, "generate_final_report": 0.30, "compare_legacy": 0.25}
+MIN_DELTA_MS = 0.2   # ignore differences below this (timer noise on very cheap stages)
+VIDEO_FPS = 30
+
+
+# ------------------------------------------------------------
+# stub detector
+# ------------------------------------------------------------
+class StubYOLO:
+    """
+    Deterministic stand-in for ultralytics.YOLO; the same frame always gives the same result.
+    task="detect": red blobs -> "stop sign" boxes
+    task="segment": dark thin pixels (cracks) in the lower part -> up to max_masks masks
+                    at 1/4 resolution, like YOLO's mask prototypes
+    delay_ms adds a fixed per-frame cost to mimic inference.
+    """
+    def __init__(self, task="detect", delay_ms=0.0, max_masks=5):
+        self.task = task
+        self.delay_ms = delay_ms
+        self.max_masks = max_masks
+        self.names = {11: "stop sign"} if task == "detect" else {0: "crack"}
+
+    def __call__(self, frames, conf=0.25):
+        if isinstance(frames, np.ndarray):
+            frames = [frames]
+        if self.delay_ms:
+            time.sleep(self.delay_ms * len(frames) / 1000)
+        run = self._detect if self.task == "detect" else self._segment
+        return [run(f, conf) for f in frames]
+
+    def _components(self, binary, min_area):
+        n, labels, stats, _ = cv2.connectedComponentsWithStats(binary.astype(np.uint8), connectivity=8)
+        keep = [i for i in range(1, n) if stats[i, cv2.CC_STAT_AREA] >= min_area]
+        keep.sort(key=lambda i: -stats[i, cv2.CC_STAT_AREA])
+        return labels, stats, keep
+
+    def _detect(self, frame, conf):
+        small = frame[::4, ::4].astype(np.int16)
+        red = (small[..., 2] > 150) & (small[..., 1] < 90) & (small[..., 0] < 90)
+        _, stats, keep = self._components(red, 4)
+        boxes, scores = [], []
+        for i in keep:
+            x, y, w, h, area = stats[i]
+            score = min(0.99, 0.4 + area / 400)
+            if score >= conf:
+                boxes.append([x*4, y*4, (x+w)*4, (y+h)*4])
+                scores.append(score)
+        return Results(Boxes(boxes, [11]*len(boxes), scores))
+
+    def _segment(self, frame, conf):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        h, w = gray.shape
+        small = cv2.resize(gray, (max(1, w // 4), max(1, h // 4)), interpolation=cv2.INTER_AREA)
+        dark = small < 45
+        dark[: int(small.shape[0] * 0.45)] = False
+        labels, stats, keep = self._components(dark, 3)
+        keep = keep[: self.max_masks]
+        data = np.stack([(labels == i).astype(np.float32) for i in keep]) if keep else np.zeros((0,) + small.shape, np.float32)
+        boxes = [[stats[i, 0]*4, stats[i, 1]*4, (stats[i, 0]+stats[i, 2])*4, (stats[i, 1]+stats[i, 3])*4] for i in keep]
+        return Results(Boxes(boxes, [0]*len(keep), [0.9]*len(keep)), Masks(data))
+
+
+# ------------------------------------------------------------
+# stages
+# ------------------------------------------------------------
+def best_of(fn, repeat):
+    """Runs fn() repeat times; returns (fastest seconds, result of the last run)."""
+    best, out = float("inf"), None
+    for _ in range(max(1, repeat)):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def load_folder(folder):
+    return [cv2.imread(os.path.join(folder, f)) for f in sorted(os.listdir(folder)) if f.endswith(".jpg")]
+
+
+def run_case(tmp, width, height, n_frames, stages, repeat=3, delay_ms=0.0):
+    """All requested stages for one resolution / frame count. Returns {stage: record}."""
+    from src.extract_frames import extract
+    out = {}
+
+    def record(stage, seconds, frames, metrics=None):
+        out[stage] = {"seconds": round(seconds, 4), "frames": frames,
+                      "ms_per_frame": round(seconds / max(frames, 1) * 1000, 3),
+                      "fps": round(frames / max(seconds, 1e-9), 2)}
+        if metrics:
+            out[stage]["metrics"] = metrics
+
+    videos = {"base": write_video(os.path.join(tmp, "base.mp4"), n_frames, width, height, VIDEO_FPS, fade=0.1, cracks=4, erosion=0.2),
+              "present": write_video(os.path.join(tmp, "present.mp4"), n_frames, width, height, VIDEO_FPS, fade=0.5, cracks=10, erosion=0.6, seed=1)}
+    folders = {tag: os.path.join(tmp, f"frames_{tag}") for tag in videos}
+
+    # every sampled frame, so ms/frame compares across frame counts
+    sec, _ = best_of(lambda: extract(videos["base"], folders["base"], fps=VIDEO_FPS), repeat if "extract" in stages else 1)
+    extract(videos["present"], folders["present"], fps=VIDEO_FPS)
+    if "extract" in stages:
+        record("extract", sec, len(os.listdir(folders["base"])))
+
+    frames = load_folder(folders["base"])
+    if "detect_lane_markings" in stages or "detect_shoulder_issues" in stages:
+        from src.lane_and_shoulder import detect_lane_markings, detect_shoulder_issues
+        if "detect_lane_markings" in stages:
+            sec, lanes = best_of(lambda: [detect_lane_markings(f) for f in frames], repeat)
+            record("detect_lane_markings", sec, len(frames),
+                   {"mean_line_count": round(float(np.mean([l["line_count"] for l in lanes])), 3),
+                    "mean_faded_score": round(float(np.mean([l["faded_score"] for l in lanes])), 4)})
+        if "detect_shoulder_issues" in stages:
+            sec, sh = best_of(lambda: [detect_shoulder_issues(f) for f in frames], repeat)
+            record("detect_shoulder_issues", sec, len(frames),
+                   {"mean_erosion_score": round(float(np.mean([s["erosion_score"] for s in sh])), 4)})
+
+    needs_results = {"process_frames", "compare", "compare_legacy", "generate_final_report"} & set(stages)
+    results = {tag: os.path.join(tmp, f"multi_{tag}.jsonl") for tag in videos}
+    if needs_results:
+        from src.detect_multiclass import run_detection, iter_folder_frames
+        obj, seg = StubYOLO("detect", delay_ms), StubYOLO("segment", delay_ms)
+
+        def detect_both():
+            for tag in videos:
+                run_detection(iter_folder_frames(folders[tag]), results[tag], os.path.join(tmp, f"overlays_{tag}"),
+                              obj, seg, batch_size=4)
+        sec, _ = best_of(detect_both, repeat if "process_frames" in stages else 1)
+        if "process_frames" in stages:
+            record("process_frames", sec, 2 * len(frames))
+
+    summary = None
+    if {"compare", "generate_final_report"} & set(stages):
+        from src.compare_engine import load_run, compare_runs
+        sec, summary = best_of(lambda: compare_runs(load_run(results["base"]), load_run(results["present"]), 10), repeat)
+        if "compare" in stages:
+            record("compare", sec, 2 * len(frames),
+                   {k: summary[k]["verdict"] for k in ("pavement", "lane", "signs", "shoulder")})
+
+    if "compare_legacy" in stages:
+        from src.align_and_compare_multi import load_json, compare_pavement, compare_lane_markings, compare_signs, compare_shoulder
+
+        def legacy():
+            base, present = load_json(results["base"]), load_json(results["present"])
+            return [f(base, present) for f in (compare_pavement, compare_lane_markings, compare_signs, compare_shoulder)]
+        sec, _ = best_of(legacy, repeat)
+        record("compare_legacy", sec, 2 * len(frames))
+
+    if "generate_final_report" in stages:
+        sec = bench_report(os.path.join(tmp, "report"), summary, repeat)
+        record("generate_final_report", sec, 1)
+    return out
+
+
+def bench_report(workdir, summary, repeat):
+    """generate_final_report reads fixed relative paths, so it runs inside its own working dir."""
+    from src import make_final_report
+    cwd = os.getcwd()
+    os.makedirs(os.path.join(workdir, "results", "compare"), exist_ok=True)
+    os.chdir(workdir)
+    try:
+        with open(make_final_report.MULTI_SUMMARY_PATH, "w") as f:
+            json.dump(summary, f)
+        llm = {"executive_summary": "Synthetic benchmark run. " * 20, "severity": "Medium", "urgency": "Low",
+               "evidence": "Stub detections on synthetic footage.", "tldr": "Benchmark only.",
+               "recommendations": [{"action": "None", "priority": "Low", "justification": "Synthetic data."}]}
+        with open(make_final_report.AI_SUMMARY_PATH, "w") as f:
+            json.dump({"llm_text": json.dumps(llm)}, f)
+        sec, _ = best_of(make_final_report.generate_final_report, repeat)
+    finally:
+        os.chdir(cwd)
+    return sec
+
+
+# ------------------------------------------------------------
+# results file
+# ------------------------------------------------------------
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10).stdout.strip()
+    except Exception:
+        commit = None
+    return {"commit": commit or None, "python": platform.python_version(), "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "opencv": cv2.__version__, "numpy": np.__version__}
+
+
+def check_regressions(current, baseline, thresholds=THRESHOLDS, min_delta_ms=MIN_DELTA_MS):
+    """Stages whose ms/frame grew by more than their threshold. Returns a list of messages."""
+    out = []
+    for key, rec in current["results"].items():
+        old = baseline.get("results", {}).get(key)
+        if not old:
+            continue
+        stage = key.split("@")[0]
+        limit = thresholds.get(stage, thresholds["default"])
+        a, b = old["ms_per_frame"], rec["ms_per_frame"]
+        if b - a > min_delta_ms and b > a * (1 + limit):
+            out.append(f"{key}: {a:.3f} -> {b:.3f} ms/frame (+{(b / a - 1) * 100:.0f}%, limit {limit * 100:.0f}%)")
+    return out
+
+
+def run_suite(resolutions, frame_counts, stages=STAGES, repeat=3, delay_ms=0.0, keep=None):
+    report = {"meta": environment(), "settings": {"repeat": repeat, "stub_delay_ms": delay_ms}, "results": {}}
+    for res in resolutions:
+        w, h = parse_size(res)
+        for n in frame_counts:
+            tmp = keep or tempfile.mkdtemp(prefix="road_bench_")
+            case_dir = os.path.join(tmp, f"{w}x{h}_{n}")
+            os.makedirs(case_dir, exist_ok=True)
+            print(f"▶ {w}x{h}, {n} frames")
+            try:
+                for stage, rec in run_case(case_dir, w, h, n, stages, repeat, delay_ms).items():
+                    report["results"][f"{stage}@{w}x{h}@{n}"] = rec
+                    print(f"  {stage:<24}{rec['ms_per_frame']:>10.2f} ms/frame")
+            finally:
+                if not keep:
+                    shutil.rmtree(tmp, ignore_errors=True)
+    return report
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", default="results/benchmark.json")
+    ap.add_argument("--baseline", default=None, help="earlier benchmark JSON; exit 1 on regressions")
+    ap.add_argument("--resolutions", nargs="+", default=["640x360", "1280x720"])
+    ap.add_argument("--frames", nargs="+", type=int, default=[30])
+    ap.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    ap.add_argument("--repeat", type=int, default=3, help="runs per stage; the fastest is kept")
+    ap.add_argument("--stub-delay-ms", type=float, default=0.0, help="simulated inference cost per frame")
+    ap.add_argument("--threshold", type=float, default=None, help="override every regression threshold (fraction)")
+    ap.add_argument("--keep", default=None, help="keep generated videos/outputs in this folder")
+    args = ap.parse_args()
+
+    report = run_suite(args.resolutions, args.frames, args.stages, args.repeat, args.stub_delay_ms, args.keep)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print("Saved:", args.out)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        thresholds = dict(THRESHOLDS) if args.threshold is None else {"default": args.threshold}
+        regressions = check_regressions(report, baseline, thresholds)
+        if regressions:
+            print("❌ Regressions vs", args.baseline)
+            for r in regressions:
+                print("  " + r)
+            sys.exit(1)
+        print("✔ No regressions vs", args.baseline)
@@ -0,0 +1,302 @@
+# src/compare_engine.py
+"""
+Vectorized comparison engine for align_and_compare_multi.py.
+
+Both runs are loaded once into column tables (results_io.load_tables) and
+every metric is computed from those columns in one pass:
+ - the legacy summary ("pavement", "lane", "signs", "shoulder") with the same
+   keys as the original compare_* functions, plus unique (tracked) sign / VRU counts
+ - "distributions": percentiles + histograms per metric, base vs present
+ - "segments": the same comparison per fixed window of frames / seconds / meters
+ - "aligned" (with an align_frames.py mapping): location-by-location deltas, where
+   segments pair each base window with the present frames matched to it
+"""
+
+import numpy as np
+import pandas as pd
+from src.results_io import load_tables
+from src.tracking import Tracker, count_unique, VRU_LABELS
+
+# per-frame metric columns: name -> source column in the frames table
+METRICS = {
+    "mask_area": "pavement.total_mask_area",
+    "mask_count": "pavement.mask_count",
+    "line_count": "lane.line_count",
+    "faded_score": "lane.faded_score",
+    "erosion_score": "shoulder.erosion_score",
+}
+PERCENTILES = [10, 25, 50, 75, 90, 95]
+SEGMENT_MODES = ("frames", "seconds", "meters")
+
+
+def unique_objects(frames_df, objects_df, window=5):
+    """
+    count_unique() of the physical objects in a run. Uses the track_id column written by
+    detect_multiclass.py; runs written before tracking existed are tracked here, in frame order.
+    """
+    if not len(objects_df):
+        return count_unique({})
+    if "track_id" in objects_df.columns and (objects_df["track_id"] >= 0).any():
+        tracked = objects_df[objects_df["track_id"] >= 0]
+        return count_unique(tracked.groupby("track_id")["label"].first().to_dict())
+    order = pd.Series(np.arange(len(frames_df)), index=frames_df["frame"].to_numpy())
+    objs = objects_df.assign(_pos=objects_df["frame"].map(order)).dropna(subset=["_pos"]).sort_values("_pos", kind="stable")
+    tracker = Tracker(window)
+    last = -1
+    for pos, group in objs.groupby("_pos", sort=True):
+        # frames without detections still age the open tracks
+        for _ in range(int(pos) - last - 1):
+            tracker.update([], [])
+        tracker.update(group[["x1", "y1", "x2", "y2"]].to_numpy(), group["label"].tolist())
+        last = int(pos)
+    return tracker.unique_counts()
+
+
+def frame_table(frames_df, objects_df, track_window=5):
+    """
+    One row per frame with plain metric columns plus sign_count / vru_count (detections per frame).
+    Rows keep the run order; "pos" is the 0-based position, "t" the timestamp (NaN if unknown).
+    attrs["unique"] holds the run's unique object counts (see unique_objects).
+    """
+    n = len(frames_df)
+    df = pd.DataFrame({"frame": frames_df["frame"].to_numpy() if n else np.array([], dtype=str)})
+    for name, col in METRICS.items():
+        df[name] = pd.to_numeric(frames_df[col], errors="coerce").fillna(0).to_numpy() if col in frames_df else 0.0
+    df["pos"] = np.arange(n)
+    df["t"] = pd.to_numeric(frames_df["timestamp"], errors="coerce").to_numpy() if "timestamp" in frames_df else np.nan
+
+    labels = objects_df["label"].astype(str).str.lower() if len(objects_df) else pd.Series([], dtype=str)
+    for name, mask in (("sign_count", labels.str.contains("sign", regex=False)),
+                       ("vru_count", labels.isin(list(VRU_LABELS)))):
+        counts = objects_df.loc[mask.to_numpy(), "frame"].value_counts() if len(objects_df) else pd.Series(dtype=int)
+        df[name] = df["frame"].map(counts).fillna(0).astype(int).to_numpy()
+    df.attrs["unique"] = unique_objects(frames_df, objects_df, track_window)
+    return df
+
+
+def load_run(path, track_window=5):
+    """Results file in any results_io layout -> frame_table"""
+    return frame_table(*load_tables(path), track_window=track_window)
+
+
+def _mean(s):
+    return float(s.mean()) if len(s) else 0
+
+
+# ------------------------------------------------------------
+# legacy summary (same keys and rules as compare_* in align_and_compare_multi)
+# ------------------------------------------------------------
+def legacy_summary(base, present):
+    avg_base, avg_present = _mean(base["mask_area"]), _mean(present["mask_area"])
+    change = avg_present - avg_base
+    percent = (change / avg_base * 100) if avg_base > 1 else 0
+    pavement = {
+        "avg_base_area": int(avg_base),
+        "avg_present_area": int(avg_present),
+        "change_pixels": int(change),
+        "percent_change": round(percent, 2),
+        "verdict": "Worsened" if change > 0 else "Improved",
+    }
+
+    bl, pl = _mean(base["line_count"]), _mean(present["line_count"])
+    bf, pf = _mean(base["faded_score"]), _mean(present["faded_score"])
+    lane = {
+        "avg_base_lines": round(bl, 2),
+        "avg_present_lines": round(pl, 2),
+        "line_change": round(pl - bl, 2),
+        "avg_base_fade": round(bf, 2),
+        "avg_present_fade": round(pf, 2),
+        "fade_change": round(pf - bf, 3),
+        "verdict": "Worsened" if (pf - bf) > 0.05 else "Improved",
+    }
+
+    # sign / VRU verdicts use unique tracked objects; raw counts depend on how long each object stays in view
+    bs, ps = int(base["sign_count"].sum()), int(present["sign_count"].sum())
+    ub, up = base.attrs.get("unique"), present.attrs.get("unique")
+    signs = {
+        "base_sign_count": bs,
+        "present_sign_count": ps,
+        "difference": ps - bs,
+        "verdict": "Improved" if ps >= bs else "Worsened",
+    }
+    vru = {
+        "base_vru_detections": int(base["vru_count"].sum()),
+        "present_vru_detections": int(present["vru_count"].sum()),
+    }
+    if ub is not None and up is not None:
+        signs.update(base_unique_signs=ub["signs"], present_unique_signs=up["signs"],
+                     unique_difference=up["signs"] - ub["signs"],
+                     verdict="Improved" if up["signs"] >= ub["signs"] else "Worsened")
+        vru.update(base_unique_vru=ub["vru"], present_unique_vru=up["vru"], difference=up["vru"] - ub["vru"])
+
+    be, pe = _mean(base["erosion_score"]), _mean(present["erosion_score"])
+    shoulder = {
+        "avg_base_erosion": round(be, 3),
+        "avg_present_erosion": round(pe, 3),
+        "change": round(pe - be, 3),
+        "verdict": "Worsened" if (pe - be) > 0 else "Improved",
+    }
+    return {"pavement": pavement, "lane": lane, "signs": signs, "shoulder": shoulder, "vru": vru}
+
+
+# ------------------------------------------------------------
+# distributions
+# ------------------------------------------------------------
+def distributions(base, present, bins=10):
+    out = {}
+    for name in list(METRICS) + ["sign_count"]:
+        b, p = base[name].to_numpy(dtype=float), present[name].to_numpy(dtype=float)
+        both = np.concatenate([b, p])
+        if not len(both):
+            continue
+        lo, hi = float(both.min()), float(both.max())
+        edges = np.linspace(lo, hi if hi > lo else lo + 1, bins + 1)
+        entry = {"bin_edges": [round(float(e), 4) for e in edges]}
+        for tag, v in (("base", b), ("present", p)):
+            if not len(v):
+                continue
+            pct = np.percentile(v, PERCENTILES)
+            entry[tag] = {
+                "mean": round(float(v.mean()), 4),
+                "std": round(float(v.std()), 4),
+                "max": round(float(v.max()), 4),
+                **{f"p{q}": round(float(x), 4) for q, x in zip(PERCENTILES, pct)},
+                "histogram": np.histogram(v, bins=edges)[0].tolist(),
+            }
+        out[name] = entry
+    return out
+
+
+# ------------------------------------------------------------
+# segments
+# ------------------------------------------------------------
+def segment_mode(by, *tables):
+    """
+    The segment mode that can actually be used: "seconds" / "meters" need timestamps in
+    every table, otherwise frame windows are used (with a warning).
+    """
+    if by != "frames" and any(df["t"].isna().all() for df in tables):
+        print(f"⚠ --segment-by {by} needs frame timestamps (detect_multiclass.py --video runs); "
+              f"these results have none, segmenting by frames instead")
+        return "frames"
+    return by
+
+
+def segment_ids(df, size, by="frames", speed_kmh=None):
+    """Window id per frame: position // size, or timestamp (s or m at speed_kmh) // size."""
+    if by == "frames":
+        return (df["pos"].to_numpy() // max(1, int(size))).astype(int)
+    t = df["t"].ffill().fillna(0).to_numpy()
+    if by == "meters":
+        t = t * (speed_kmh or 40) / 3.6
+    return (t // size).astype(int)
+
+
+def segment_table(df, ids):
+    g = df.assign(segment=ids).groupby("segment")
+    return g.agg(frames=("pos", "size"),
+                 first_frame=("frame", "first"),
+                 last_frame=("frame", "last"),
+                 mask_area=("mask_area", "mean"),
+                 line_count=("line_count", "mean"),
+                 faded_score=("faded_score", "mean"),
+                 erosion_score=("erosion_score", "mean"),
+                 sign_count=("sign_count", "sum"))
+
+
+def compare_segments(seg_b, seg_p):
+    """Joins per-segment aggregates of base and present on segment id and applies the legacy verdict rules."""
+    j = seg_b.join(seg_p, how="inner", lsuffix="_base", rsuffix="_present")
+    d_area = j["mask_area_present"] - j["mask_area_base"]
+    d_fade = j["faded_score_present"] - j["faded_score_base"]
+    d_eros = j["erosion_score_present"] - j["erosion_score_base"]
+    d_sign = j["sign_count_present"] - j["sign_count_base"]
+    out = pd.DataFrame({
+        "segment": j.index.to_numpy(),
+        "base_frames": j["frames_base"].to_numpy(),
+        "present_frames": j["frames_present"].to_numpy(),
+        "base_range": (j["first_frame_base"] + " .. " + j["last_frame_base"]).to_numpy(),
+        "present_range": (j["first_frame_present"] + " .. " + j["last_frame_present"]).to_numpy(),
+        "avg_base_area": j["mask_area_base"].round(1).to_numpy(),
+        "avg_present_area": j["mask_area_present"].round(1).to_numpy(),
+        "area_change": d_area.round(1).to_numpy(),
+        "avg_base_lines": j["line_count_base"].round(2).to_numpy(),
+        "avg_present_lines": j["line_count_present"].round(2).to_numpy(),
+        "fade_change": d_fade.round(3).to_numpy(),
+        "erosion_change": d_eros.round(3).to_numpy(),
+        "base_sign_count": j["sign_count_base"].astype(int).to_numpy(),
+        "present_sign_count": j["sign_count_present"].astype(int).to_numpy(),
+        "pavement_verdict": np.where(d_area > 0, "Worsened", "Improved"),
+        "lane_verdict": np.where(d_fade > 0.05, "Worsened", "Improved"),
+        "signs_verdict": np.where(d_sign >= 0, "Improved", "Worsened"),
+        "shoulder_verdict": np.where(d_eros > 0, "Worsened", "Improved"),
+    })
+    return out.to_dict("records")
+
+
+# ------------------------------------------------------------
+# location-by-location (aligned) comparison
+# ------------------------------------------------------------
+def align_present(base, present, mapping):
+    """
+    mapping: {base frame: present frame} (align_frames.load_alignment).
+    Returns (base rows that have a match, present rows re-ordered to line up with them);
+    the present copy takes the base "pos"/"t" so both share the same segment windows.
+    """
+    matched = base["frame"].map(mapping)
+    keep = matched.isin(present["frame"]).to_numpy()
+    base = base[keep].reset_index(drop=True)
+    aligned = present.drop_duplicates("frame").set_index("frame").loc[matched[keep].to_numpy()].reset_index()
+    aligned["pos"], aligned["t"] = base["pos"].to_numpy(), base["t"].to_numpy()
+    return base, aligned
+
+
+def aligned_summary(base, aligned, top=10):
+    """Per-location deltas summarized: mean/percentiles of each change plus the worst locations."""
+    d = pd.DataFrame({
+        "base_frame": base["frame"].to_numpy(),
+        "present_frame": aligned["frame"].to_numpy(),
+        "area_change": (aligned["mask_area"] - base["mask_area"]).to_numpy(),
+        "fade_change": (aligned["faded_score"] - base["faded_score"]).to_numpy(),
+        "erosion_change": (aligned["erosion_score"] - base["erosion_score"]).to_numpy(),
+        "sign_change": (aligned["sign_count"] - base["sign_count"]).to_numpy(),
+    })
+    out = {"pairs": len(d)}
+    for col in ("area_change", "fade_change", "erosion_change", "sign_change"):
+        v = d[col].to_numpy(dtype=float)
+        if not len(v):
+            continue
+        pct = np.percentile(v, PERCENTILES)
+        out[col] = {"mean": round(float(v.mean()), 4),
+                    "worsened_locations": int((v < 0).sum() if col == "sign_change" else (v > 0).sum()),
+                    **{f"p{q}": round(float(x), 4) for q, x in zip(PERCENTILES, pct)}}
+    worst = d.nlargest(top, "area_change")
+    out["worst_pavement_locations"] = [{k: (v.item() if isinstance(v, np.generic) else v) for k, v in rec.items()}
+                                       for rec in worst.round(3).to_dict("records")]
+    return out
+
+
+def compare_runs(base, present, segment_size=50, segment_by="frames", speed_kmh=None, mapping=None):
+    """
+    base / present: frame tables (see frame_table / load_run).
+    mapping: optional {base frame: present frame} from align_frames.py.
+    Returns the legacy summary keys plus "distributions", "segments" and "segment_config"
+    (and "aligned" with a mapping). The legacy keys always compare whole runs.
+    """
+    summary = legacy_summary(base, present)
+    summary["distributions"] = distributions(base, present)
+    seg_base, seg_present = base, present
+    if mapping:
+        seg_base, seg_present = align_present(base, present, mapping)
+        summary["aligned"] = aligned_summary(seg_base, seg_present)
+    if segment_size:
+        by = segment_mode(segment_by, seg_base, seg_present)
+        seg_b = segment_table(seg_base, segment_ids(seg_base, segment_size, by, speed_kmh))
+        seg_p = segment_table(seg_present, segment_ids(seg_present, segment_size, by, speed_kmh))
+        summary["segment_config"] = {"size": segment_size, "by": by, "speed_kmh": speed_kmh,
+                                     "aligned": bool(mapping)}
+        if by != segment_by:
+            summary["segment_config"]["requested_by"] = segment_by
+        summary["segments"] = [{k: (v.item() if isinstance(v, np.generic) else v) for k, v in rec.items()}
+                               for rec in compare_segments(seg_b, seg_p)]
+    return summary
@@ -1,6 +1,10 @@
 import streamlit as st
-import os, json
+import os, json, math, hashlib
+import pandas as pd
 from PIL import Image
+from src.report_charts import chart_factors, segment_series
+from src.compare_engine import load_run, align_present
+from src.align_frames import load_alignment
 
 # ------------------------------------
 # Page Config
@@ -11,23 +15,118 @@ st.set_page_config(
     page_icon="🛣️"
 )
 
+# ------------------------------------
+# Paths
+# ------------------------------------
+FINAL_PDF = "results/final_report.pdf"
+MULTI_PDF = "results/compare/multi_report.pdf"
+MULTI_SUMMARY = "results/compare/multi_summary.json"
+LLM_SUMMARY = "results/compare/llm_summary.json"
+BASE_RESULTS = "results/multi_base.json"
+PRESENT_RESULTS = "results/multi_present.json"
+ALIGNMENT = "results/compare/alignment.json"
+THUMBS_DIR = "results/thumbs"
+THUMB_WIDTH = 480
+
 # ------------------------------------
 # Helper
 # ------------------------------------
-def load_json(path):
+# Everything read from disk is cached with the file's mtime in the key, so reruns
+# (every widget click) reuse it and a regenerated file is picked up automatically.
+def mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+@st.cache_data(show_spinner=False)
+def _load_json(path, version):   # version = mtime: a rewritten file is a cache miss
     try:
         return json.load(open(path))
     except:
         return None
 
-# ------------------------------------
-# Paths
-# ------------------------------------
-FINAL_PDF = "results/final_report.pdf"
-MULTI_PDF = "results/compare/multi_report.pdf"
-MULTI_SUMMARY = "results/compare/multi_summary.json"
-LLM_SUMMARY = "results/compare/llm_summary.json"
-CHARTS_DIR = "results/charts"
+
+def load_json(path):
+    return _load_json(path, mtime(path))
+
+
+@st.cache_data(show_spinner=False)
+def _read_bytes(path, version):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def read_bytes(path):
+    return _read_bytes(path, mtime(path))
+
+
+@st.cache_data(show_spinner="Loading per-frame results…")
+def _frame_pairs(base_path, present_path, alignment_path, mtimes):
+    """
+    One row per base/present frame pair: by alignment.json when it exists, else by position.
+    Only the numbers are kept (no objects), so 100k+ frames stay a small DataFrame.
+    """
+    base, present = load_run(base_path), load_run(present_path)
+    if alignment_path and os.path.exists(alignment_path):
+        base, present = align_present(base, present, load_alignment(alignment_path))
+    else:
+        n = min(len(base), len(present))
+        base, present = base.iloc[:n], present.iloc[:n]
+    d = pd.DataFrame({
+        "base_frame": base["frame"].to_numpy(), "present_frame": present["frame"].to_numpy(),
+        "base_area": base["mask_area"].to_numpy(), "present_area": present["mask_area"].to_numpy(),
+        "base_fade": base["faded_score"].to_numpy(), "present_fade": present["faded_score"].to_numpy(),
+        "base_signs": base["sign_count"].to_numpy(), "present_signs": present["sign_count"].to_numpy(),
+        "base_erosion": base["erosion_score"].to_numpy(), "present_erosion": present["erosion_score"].to_numpy(),
+    })
+    d["area_change"] = d["present_area"] - d["base_area"]
+    d["fade_change"] = d["present_fade"] - d["base_fade"]
+    d["signs_missing"] = (d["base_signs"] - d["present_signs"]).clip(lower=0)
+    return d
+
+
+def frame_pairs(base_path, present_path, alignment_path):
+    return _frame_pairs(base_path, present_path, alignment_path,
+                        (mtime(base_path), mtime(present_path), mtime(alignment_path) if alignment_path else None))
+
+
+def image_for(frame, overlay_dir, frames_dir):
+    """Overlay written by detect_multiclass.py (<stem>_multi.<ext>), else the raw frame, else None."""
+    stem = os.path.splitext(frame)[0]
+    for ext in ("jpg", "webp", "png"):
+        p = os.path.join(overlay_dir, f"{stem}_multi.{ext}")
+        if os.path.exists(p):
+            return p
+    p = os.path.join(frames_dir, frame)
+    return p if os.path.exists(p) else None
+
+
+def thumbnail(src, width=THUMB_WIDTH):
+    """Thumbnail made on first view (and again when the source changes); full-size overlays are never sent."""
+    if not src:
+        return None
+    folder = hashlib.md5(os.path.abspath(os.path.dirname(src)).encode()).hexdigest()[:10]
+    dst = os.path.join(THUMBS_DIR, folder,
+                       os.path.splitext(os.path.basename(src))[0] + ".jpg")
+    if mtime(dst) is None or mtime(dst) < mtime(src):
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        img = Image.open(src).convert("RGB")
+        img.thumbnail((width, width))
+        img.save(dst, "JPEG", quality=80)
+    return dst
+
+
+def factor_bar_chart(title, base, present):
+    """Same base/present numbers as the final report's chart page, as a native Streamlit chart."""
+    st.write(f"**{title}**")
+    st.bar_chart(pd.DataFrame({"value": [base, present]}, index=["Base", "Present"]))
+
+
+def segment_line_chart(title, series):
+    st.write(f"**{title}**")
+    st.line_chart(pd.DataFrame({name: values for name, values, _ in series}))
 
 # ------------------------------------
 # Sidebar Navigation
@@ -41,6 +140,7 @@ page = st.sidebar.radio(
         "📊 Aggregated Summary",
         "🧠 AI Summary",
         "📈 Visual Charts",
+        "🖼️ Frame Explorer",
         "📄 Reports",
     ]
 )
@@ -74,17 +174,12 @@ if page == "🏠 Dashboard Home":
     else:
         st.warning("Run pipeline to generate results first.")
 
-    # Show sample chart preview if exists
-    if os.path.exists(CHARTS_DIR):
-        images = [f for f in os.listdir(CHARTS_DIR) if f.endswith(".png")]
-        if images:
-            st.write("### Recent Comparison Visualization")
-            preview = os.path.join(CHARTS_DIR, images[0])
-            st.image(preview, caption="Comparison Preview", use_column_width=True)
-        else:
-            st.info("Charts will appear here once generated.")
+    # Show a chart preview once a summary exists
+    if data:
+        st.write("### Recent Comparison Visualization")
+        factor_bar_chart(*chart_factors(data)[0])
     else:
-        st.info("Charts directory not found.")
+        st.info("Charts will appear here once generated.")
 
 
 # ------------------------------------
@@ -136,19 +231,94 @@ elif page == "🧠 AI Summary":
 elif page == "📈 Visual Charts":
     st.title("📈 Visual Comparison Charts")
 
-    if os.path.exists(CHARTS_DIR):
-        images = [f for f in os.listdir(CHARTS_DIR) if f.endswith(".png")]
+    data = load_json(MULTI_SUMMARY)
+
+    if data:
+        cols = st.columns(2)
 
-        if images:
-            cols = st.columns(2)
+        for i, factor in enumerate(chart_factors(data)):
+            with cols[i % 2]:
+                factor_bar_chart(*factor)
 
-            for i, img in enumerate(images):
-                with cols[i % 2]:
-                    st.image(os.path.join(CHARTS_DIR, img), caption=img)
-        else:
-            st.warning("Charts folder is empty.")
+        if data.get("segments"):
+            st.write(f"### Per-Segment Trends ({len(data['segments'])} segments)")
+            for title, series in segment_series(data["segments"]):
+                segment_line_chart(title, series)
     else:
-        st.error("Charts directory missing.")
+        st.error("multi_summary.json not found.")
+
+
+# ------------------------------------
+# FRAME EXPLORER
+# ------------------------------------
+elif page == "🖼️ Frame Explorer":
+    st.title("🖼️ Frame Explorer")
+
+    with st.expander("Sources", expanded=False):
+        c1, c2 = st.columns(2)
+        base_results = c1.text_input("Base results", BASE_RESULTS)
+        present_results = c2.text_input("Present results", PRESENT_RESULTS)
+        base_overlays = c1.text_input("Base overlays", "frames/overlays_base")
+        present_overlays = c2.text_input("Present overlays", "frames/overlays_present")
+        base_frames = c1.text_input("Base frames (fallback)", "frames/base")
+        present_frames = c2.text_input("Present frames (fallback)", "frames/present")
+        alignment = st.text_input("Alignment (pairs frames by location when present)", ALIGNMENT)
+
+    if not (os.path.exists(base_results) and os.path.exists(present_results)):
+        st.error("Per-frame results not found; run detection for both surveys first.")
+        st.stop()
+
+    pairs = frame_pairs(base_results, present_results, alignment)
+    st.caption(f"{len(pairs):,} frame pairs " + ("(aligned by location)" if os.path.exists(alignment) else "(paired by position)"))
+
+    f1, f2, f3, f4 = st.columns(4)
+    min_area = f1.number_input("Present pavement area above (px)", min_value=0, value=0, step=500)
+    min_fade = f2.number_input("Lane fade increase above", value=None, step=0.05, format="%.2f", placeholder="any")
+    worse_only = f3.checkbox("Pavement worsened only")
+    missing_signs = f4.checkbox("Frames with missing signs")
+    sort_by = f1.selectbox("Sort by", ["frame order", "pavement change", "present pavement area", "fade change", "missing signs"])
+
+    # vectorized filter over all pairs; only the current page ever touches images.
+    # Filters left at their defaults are skipped, so the unfiltered view shows every pair.
+    keep = pd.Series(True, index=pairs.index)
+    if min_area > 0:
+        keep &= pairs["present_area"] > min_area
+    if min_fade is not None:
+        keep &= pairs["fade_change"] > min_fade
+    if worse_only:
+        keep &= pairs["area_change"] > 0
+    if missing_signs:
+        keep &= pairs["signs_missing"] > 0
+    view = pairs[keep.to_numpy()]
+    sort_col = {"pavement change": "area_change", "present pavement area": "present_area",
+                "fade change": "fade_change", "missing signs": "signs_missing"}.get(sort_by)
+    if sort_col:
+        view = view.sort_values(sort_col, ascending=False, kind="stable")
+
+    per_page = f2.selectbox("Pairs per page", [5, 10, 20, 50], index=1)
+    pages = max(1, math.ceil(len(view) / per_page))
+    page_no = f3.number_input(f"Page (of {pages:,})", min_value=1, max_value=pages, value=1)
+    f4.metric("Matching pairs", f"{len(view):,}")
+
+    for _, r in view.iloc[(page_no - 1) * per_page: page_no * per_page].iterrows():
+        cb, cp = st.columns(2)
+        with cb:
+            img = thumbnail(image_for(r["base_frame"], base_overlays, base_frames))
+            if img:
+                st.image(img, use_column_width=True)
+            else:
+                st.info("No overlay / frame image on disk.")
+            st.caption(f"Base {r['base_frame']} · area {r['base_area']:.0f} px · fade {r['base_fade']:.2f} · signs {r['base_signs']}")
+        with cp:
+            img = thumbnail(image_for(r["present_frame"], present_overlays, present_frames))
+            if img:
+                st.image(img, use_column_width=True)
+            else:
+                st.info("No overlay / frame image on disk.")
+            st.caption(f"Present {r['present_frame']} · area {r['present_area']:.0f} px ({r['area_change']:+.0f}) · "
+                       f"fade {r['present_fade']:.2f} ({r['fade_change']:+.2f}) · signs {r['present_signs']}"
+                       + (f" · ⚠ {r['signs_missing']} missing" if r["signs_missing"] else ""))
+        st.divider()
 
 
 # ------------------------------------
@@ -161,13 +331,14 @@ elif page == "📄 Reports":
 
     with col1:
         if os.path.exists(FINAL_PDF):
+            final_pdf = read_bytes(FINAL_PDF)
             st.download_button(
                 "⬇️ Download FINAL Report", 
-                open(FINAL_PDF, "rb"), 
+                final_pdf, 
                 file_name="final_report.pdf"
             )
             st.write("#### Preview:")
-            st.pdf(FINAL_PDF)
+            st.pdf(final_pdf)
         else:
             st.error("final_report.pdf not found.")
 
@@ -175,7 +346,7 @@ elif page == "📄 Reports":
         if os.path.exists(MULTI_PDF):
             st.download_button(
                 "⬇️ Download YOLO Multi Report", 
-                open(MULTI_PDF, "rb"), 
+                read_bytes(MULTI_PDF), 
                 file_name="multi_report.pdf"
             )
         else:
@@ -4,25 +4,34 @@ Multi-class detection pipeline:
  - YOLO object detection (signs, cones, barriers, poles, benches, studs)
  - Pothole/crack segmentation (use your best.pt or other)
  - Lane & shoulder heuristics (lane_and_shoulder.py)
+Input is either a frames folder or (streaming mode) a video file decoded in memory.
 Outputs:
- - results/multi_base.json  (per-frame detections)
- - writes overlays to frames/*_multi.jpg for visualization
+ - results/multi_base.json  (per-frame detections; .npz / .parquet for columnar tables)
+ - writes overlays to frames/*_multi.jpg for visualization (background writer; --no-overlays skips them)
 """
 
-import os, json, argparse
+import os, argparse, time, multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from ultralytics import YOLO
 import cv2
 import numpy as np
 from tqdm import tqdm
 from src.utils import ensure_dir
-from src.lane_and_shoulder import detect_lane_markings, detect_shoulder_issues
+from src.extract_frames import iter_frames, SAMPLE_MODES
+from src.lane_and_shoulder import FrameAnalyzer, default_analyzer
+from src.frame_cache import FrameCache, frame_hash, make_run_key
+from src.image_writer import ImageWriter, FORMATS
+from src.road_roi import parse_roi, resolve_roi
+from src.results_io import open_sink
+from src.tracking import Tracker
+from src import profiling
 
 # ----- CONFIG -----
 # YOLO detection model for general objects (signs, cones, barriers). Default uses ultralytics hub yolov8n; you can point to custom weights.
 OBJ_MODEL = "yolov8n.pt"   # leave as is if you want Auto-download COCO weights (detects many objects). Replace with custom weights path if available.
 SEG_MODEL = "best.pt"      # your pothole/crack segmentation model (local). If not present, segmentation fallback uses bbox detections.
 CONF_THR = 0.25
-TEMPORAL_WINDOW = 5   # for simple smoothing
+TEMPORAL_WINDOW = 5   # frames a tracked object may go undetected before its track closes (tracking.py)
 
 # map COCO classes of interest -> our infra classes (if using coco)
 COCO_MAP = {
@@ -45,96 +54,516 @@ def load_model(path):
     return YOLO(path)
 
 
-def process_frames(frames_folder, out_json, overlay_out_folder, obj_model_path=OBJ_MODEL, seg_model_path=SEG_MODEL, conf=CONF_THR):
-    ensure_dir(overlay_out_folder)
-    ensure_dir(os.path.dirname(out_json) or ".")
+def list_frame_files(frames_folder):
+    return sorted([f for f in os.listdir(frames_folder) if f.lower().endswith((".jpg",".png",".webp"))])
+
+
+def iter_folder_frames(frames_folder, frame_files=None):
+    """Yields (fname, frame, None) for every image in a frames folder (or the given subset), in sorted order."""
+    if frame_files is None:
+        frame_files = list_frame_files(frames_folder)
+    for fname in frame_files:
+        with profiling.stage("decode"):
+            frame = cv2.imread(os.path.join(frames_folder, fname))
+        if frame is None:
+            continue
+        yield fname, frame, None
+
+
+def iter_video_frames(video, fps=1, save_frames=None, sample_mode="grab", writer=None):
+    """
+    Yields (fname, frame, timestamp_s) straight from a video without the JPEG round trip.
+    Names follow extract_frames.py so JSON keys match the folder workflow.
+    If save_frames is set, the sampled frames are also written there (through writer when given).
+    """
+    if save_frames:
+        ensure_dir(save_frames)
+    for idx, ts, frame in profiling.timed_iter("decode", iter_frames(video, fps, sample_mode)):
+        fname = f"frame_{idx:05}.jpg"
+        if save_frames:
+            if writer is not None:
+                writer.write(os.path.join(save_frames, fname), frame)
+            else:
+                cv2.imwrite(os.path.join(save_frames, fname), frame)
+        yield fname, frame, ts
+
+
+def as_numpy(t):
+    """torch tensor (any device) or array-like -> numpy array"""
+    return t.cpu().numpy() if hasattr(t, "cpu") else np.asarray(t)
+
+
+def nearest_weights(src_len, dst_len):
+    """
+    How many destination pixels cv2.resize(INTER_NEAREST) maps onto each source pixel
+    along one axis (OpenCV picks src = min(floor(dst * src_len / dst_len), src_len - 1)).
+    """
+    src_idx = np.minimum(np.floor(np.arange(dst_len) * (src_len / dst_len)).astype(np.int64), src_len - 1)
+    return np.bincount(src_idx, minlength=src_len)
+
+
+def mask_areas(mask_data, w, h):
+    """
+    Per-mask pixel areas at full frame resolution, computed at the model's native mask
+    resolution: a single weighted reduction over the (N, mh, mw) mask stack gives exactly
+    the count a nearest-neighbour upsample to (w, h) followed by >127 would.
+    Returns (areas int64 array of length N, union bool mask at native resolution or None).
+    """
+    if len(mask_data) == 0:
+        return np.zeros(0, dtype=np.int64), None
+    # same threshold as (mask*255).astype(uint8) > 127
+    binary = (mask_data * 255).astype(np.uint8) > 127
+    _, mh, mw = binary.shape
+    wy = nearest_weights(mh, h)
+    wx = nearest_weights(mw, w)
+    # float32 BLAS for the big reduction (row sums <= w are exact), float64 for the totals
+    rows = binary.astype(np.float32) @ wx.astype(np.float32)
+    areas = np.rint(rows.astype(np.float64) @ wy).astype(np.int64)
+    return areas, binary.any(axis=0)
+
+
+def build_entry(frame, res, seg_res, names, draw=True, analyzer=None, roi=None):
+    """
+    Turns the model results for one decoded BGR frame into its JSON entry.
+    res / seg_res are the ultralytics results for this frame (seg_res is None without a seg model).
+    With a road roi, seg_res comes from the ROI crop; areas/boxes are mapped back to the full
+    frame and the entry gets "roi": [x1, y1, x2, y2] plus full-frame "pavement.boxes".
+    Heuristics see the clean frame; boxes and masks are drawn on a copy (skipped when draw=False).
+    Returns (det_entry, overlay); overlay is None when draw=False.
+    """
+    h,w = frame.shape[:2]
+    overlay = frame.copy() if draw else None
+    det_entry = {"objects": [], "pavement": {}, "lane": {}, "shoulder": {}}
+    rx1, ry1, rx2, ry2 = roi.box(w, h) if roi is not None else (0, 0, w, h)
+    if roi is not None:
+        det_entry["roi"] = [rx1, ry1, rx2, ry2]
+
+    # YOLO object detection
+    if len(res.boxes) > 0:
+        for i,box in enumerate(res.boxes):
+            cls_id = int(box.cls[0])
+            conf_v = float(box.conf[0])
+            label = names.get(cls_id, str(cls_id))
+            x1,y1,x2,y2 = map(int, box.xyxy[0].tolist())
+            det_entry["objects"].append({
+                "label": label, "conf": round(conf_v,3), "bbox":[x1,y1,x2,y2]
+            })
+            # draw box on overlay
+            if not draw:
+                continue
+            cv2.rectangle(overlay, (x1,y1),(x2,y2),(0,255,0),2)
+            cv2.putText(overlay, f"{label} {conf_v:.2f}", (x1,y1-6), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0,255,0),1)
+
+    # segmentation for pavement (pothole/crack) if available
+    if seg_res is not None:
+        # segmentation framework: results.masks
+        if seg_res.masks is not None:
+            with profiling.stage("masks"):
+                mask_data = as_numpy(seg_res.masks.data)
+                areas, union = mask_areas(mask_data, rx2-rx1, ry2-ry1)
+            # overlay: blend the union of all masks in red, in one pass
+            if draw and union is not None:
+                with profiling.stage("overlay_draw"):
+                    union_full = cv2.resize(union.view(np.uint8), (rx2-rx1, ry2-ry1), interpolation=cv2.INTER_NEAREST).astype(bool)
+                    color_mask = overlay.copy()
+                    color_mask[ry1:ry2, rx1:rx2][union_full] = (0,0,255)
+                    overlay = cv2.addWeighted(overlay, 0.7, color_mask, 0.3, 0)
+            det_entry["pavement"]["mask_count"] = len(areas)
+            det_entry["pavement"]["total_mask_area"] = int(areas.sum())
+        else:
+            # fallback: use boxes from seg_res.boxes if no masks
+            det_entry["pavement"]["mask_count"] = len(seg_res.boxes)
+            det_entry["pavement"]["total_mask_area"] = 0
+        if roi is not None:
+            boxes = as_numpy(seg_res.boxes.xyxy).reshape(-1, 4) + [rx1, ry1, rx1, ry1]
+            det_entry["pavement"]["boxes"] = [[int(v) for v in b] for b in boxes]
+    else:
+        det_entry["pavement"]["mask_count"] = 0
+        det_entry["pavement"]["total_mask_area"] = 0
 
+    # lane marking + shoulder analysis (shared grayscale / CLAHE / edges)
+    lane_info, sh_info = (analyzer or default_analyzer()).analyze(frame, roi=roi)
+    det_entry["lane"] = {"line_count": lane_info["line_count"], "faded_score": lane_info["faded_score"]}
+    det_entry["shoulder"] = {"shoulder_present": sh_info["shoulder_present"], "erosion_score": sh_info["erosion_score"]}
+
+    return det_entry, overlay
+
+
+def analyze_batch(frames, obj_model, seg_model, conf=CONF_THR, draw=True, analyzer=None, roi=None):
+    """
+    Runs both models once on a list of frames, then builds each frame's entry.
+    With a road roi the segmentation model only sees the ROI crops.
+    Returns a list of (det_entry, overlay) in the same order as frames.
+    """
+    with profiling.stage("obj_yolo", frames=len(frames)):
+        obj_results = obj_model(frames, conf=conf)
+    if seg_model is None:
+        seg_results = [None] * len(frames)
+    else:
+        with profiling.stage("seg_yolo", frames=len(frames)):
+            seg_inputs = frames if roi is None else [np.ascontiguousarray(roi.crop(f)) for f in frames]
+            seg_results = seg_model(seg_inputs, conf=conf)
+    return [build_entry(frame, res, seg_res, obj_model.names, draw, analyzer, roi)
+            for frame, res, seg_res in zip(frames, obj_results, seg_results)]
+
+
+def analyze_frame(frame, obj_model, seg_model, conf=CONF_THR, draw=True, analyzer=None, roi=None):
+    """Single-frame convenience wrapper around analyze_batch."""
+    return analyze_batch([frame], obj_model, seg_model, conf, draw, analyzer, roi)[0]
+
+
+def iter_batches(frames, batch_size):
+    """Groups an iterable of frame items into lists of at most batch_size items."""
+    batch = []
+    for item in frames:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+BACKENDS = ("torch", "server", "onnx", "onnx-int8")
+
+
+def load_models(obj_model_path=OBJ_MODEL, seg_model_path=SEG_MODEL, backend="torch", socket_path=None, threads=None):
+    """
+    (obj_model, seg_model); seg_model is None when it cannot be loaded.
+    backend="server" uses a running inference_server.py (models already loaded and warm)
+    and falls back to loading in-process when it is not available.
+    backend="onnx" / "onnx-int8" export the weights once and run them on ONNX Runtime (onnx_backend.py).
+    """
+    if backend in ("onnx", "onnx-int8"):
+        from src.onnx_backend import load_onnx_models
+        return load_onnx_models(obj_model_path, seg_model_path, quantize=backend == "onnx-int8", threads=threads)
+    if backend == "server":
+        from src.inference_server import connect_models
+        models = connect_models(socket_path, obj_model_path, seg_model_path)
+        if models is not None:
+            return models
     obj_model = load_model(obj_model_path)
     seg_model = None
     try:
         seg_model = load_model(seg_model_path)
     except Exception:
         print("⚠ segmentation model not loaded; continuing without masks")
+    return obj_model, seg_model
 
-    results_all = {}
-    frame_files = sorted([f for f in os.listdir(frames_folder) if f.lower().endswith((".jpg",".png"))])
-    for fname in tqdm(frame_files):
-        path = os.path.join(frames_folder, fname)
-        frame = cv2.imread(path)
-        if frame is None: 
-            continue
-        h,w = frame.shape[:2]
-        det_entry = {"objects": [], "pavement": {}, "lane": {}, "shoulder": {}}
-
-        # YOLO object detection
-        res = obj_model(path, conf=conf)[0]
-        if len(res.boxes) > 0:
-            for i,box in enumerate(res.boxes):
-                cls_id = int(box.cls[0])
-                conf_v = float(box.conf[0])
-                label = obj_model.names.get(cls_id, str(cls_id))
-                x1,y1,x2,y2 = map(int, box.xyxy[0].tolist())
-                det_entry["objects"].append({
-                    "label": label, "conf": round(conf_v,3), "bbox":[x1,y1,x2,y2]
-                })
-                # draw box on overlay
-                cv2.rectangle(frame, (x1,y1),(x2,y2),(0,255,0),2)
-                cv2.putText(frame, f"{label} {conf_v:.2f}", (x1,y1-6), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0,255,0),1)
-
-        # segmentation for pavement (pothole/crack) if available
-        if seg_model is not None:
-            seg_res = seg_model(path, conf=conf)[0]
-            # segmentation framework: results.masks
-            if seg_res.masks is not None:
-                masks = []
-                total_area = 0
-                for i,mask in enumerate(seg_res.masks.data):
-                    mask_np = mask.cpu().numpy()
-                    mask_resized = cv2.resize((mask_np*255).astype("uint8"), (w,h), interpolation=cv2.INTER_NEAREST)
-                    area = int((mask_resized>127).sum())
-                    total_area += area
-                    masks.append({"area": int(area)})
-                    # overlay
-                    color_mask = np.zeros_like(frame)
-                    color_mask[:,:,2] = mask_resized
-                    frame = cv2.addWeighted(frame, 0.7, color_mask, 0.3, 0)
-                det_entry["pavement"]["mask_count"] = len(masks)
-                det_entry["pavement"]["total_mask_area"] = int(total_area)
-            else:
-                # fallback: use boxes from seg_res.boxes if no masks
-                det_entry["pavement"]["mask_count"] = len(seg_res.boxes)
-                det_entry["pavement"]["total_mask_area"] = 0
+
+def overlay_path_for(overlay_out_folder, fname, fmt="jpg"):
+    return os.path.join(overlay_out_folder, f"{os.path.splitext(fname)[0]}_multi.{fmt}")
+
+
+def executed_weights(models, obj_model_path, seg_model_path):
+    """
+    Weight files the loaded models actually run: the exported .onnx / .int8.onnx for the onnx
+    backends, None for a model that did not load (so mask-less runs get their own cache key).
+    """
+    return tuple(None if m is None else getattr(m, "onnx_path", None) or p
+                 for m, p in zip(models, (obj_model_path, seg_model_path)))
+
+
+def open_cache(cache_path, obj_model_path, seg_model_path, conf, analyzer, roi=None, backend="torch", models=None):
+    """
+    FrameCache for this run's settings, or None when caching is off.
+    The backend is part of the key and, given the loaded models, the hashed weights are the
+    files they execute, so torch, onnx and int8 runs never serve each other's entries.
+    """
+    if not cache_path:
+        return None
+    if models is not None:
+        obj_model_path, seg_model_path = executed_weights(models, obj_model_path, seg_model_path)
+    params = dict(analyzer.params(), roi=roi.to_dict() if roi is not None else None, backend=backend)
+    run_key = make_run_key(obj_model_path, seg_model_path, conf, params)
+    return FrameCache(cache_path, run_key)
+
+
+def iter_detections(frames, overlay_out_folder, obj_model, seg_model, conf=CONF_THR, batch_size=1, pbar=None, cache=None, writer=None, analyzer=None, roi=None):
+    """
+    Runs detection over an iterable of (fname, frame, timestamp) and writes the overlays
+    (through writer when given; overlay_out_folder=None skips rendering them at all).
+    Frames are sent to the models batch_size at a time; yields (fname, timestamp, entry) in input order.
+    With a cache, frames already seen with the same settings (and whose overlay exists) skip the models.
+    """
+    draw = overlay_out_folder is not None
+    analyzer = analyzer or default_analyzer()
+    fmt = writer.fmt if writer is not None else "jpg"
+    for batch in iter_batches(frames, max(1, batch_size)):
+        entries = [None] * len(batch)  # keeps frame order regardless of cache hits
+        todo = []
+        for i, (fname, frame, _) in enumerate(batch):
+            fhash = frame_hash(frame) if cache is not None else None
+            if cache is not None and (not draw or os.path.exists(overlay_path_for(overlay_out_folder, fname, fmt))):
+                with profiling.stage("cache"):
+                    entries[i] = cache.get(fhash)
+            if entries[i] is None:
+                todo.append((i, fname, frame, fhash))
+
+        if todo:
+            outputs = analyze_batch([frame for _, _, frame, _ in todo], obj_model, seg_model, conf, draw, analyzer, roi)
+            for (i, fname, _, fhash), (det_entry, overlay) in zip(todo, outputs):
+                # save overlay image
+                if draw:
+                    overlay_path = overlay_path_for(overlay_out_folder, fname, fmt)
+                    with profiling.stage("overlay_write", frame=fname):
+                        if writer is not None:
+                            writer.write(overlay_path, overlay)
+                        else:
+                            cv2.imwrite(overlay_path, overlay)
+
+                entries[i] = det_entry
+                if cache is not None:
+                    cache.put(fhash, det_entry)
+        if pbar is not None:
+            pbar.update(len(batch))
+        for (fname, _, ts), entry in zip(batch, entries):
+            yield fname, ts, entry
+
+
+def detect_frames(frames, overlay_out_folder, obj_model, seg_model, conf=CONF_THR, batch_size=1, pbar=None, cache=None, writer=None, analyzer=None, roi=None):
+    """iter_detections collected into [(fname, timestamp, entry), ...]"""
+    return list(iter_detections(frames, overlay_out_folder, obj_model, seg_model, conf, batch_size, pbar, cache, writer, analyzer, roi))
+
+
+def report_throughput(n_frames, t0, batch_size=1, workers=1):
+    elapsed = time.perf_counter() - t0
+    print(f"Processed {n_frames} frames in {elapsed:.1f}s "
+          f"({n_frames / max(elapsed, 1e-9):.2f} frames/s, batch size {max(1, batch_size)}, workers {workers})")
+
+
+def make_tracker(track_window):
+    """Tracker giving every object a "track_id" across frames, or None when track_window is 0."""
+    return Tracker(track_window) if track_window else None
+
+
+def report_tracks(tracker):
+    if tracker is not None:
+        counts = tracker.unique_counts()
+        print(f"Tracked {tracker.next_id} objects: {counts['signs']} unique signs, {counts['vru']} unique VRUs")
+
+
+def run_detection(frames, out_json, overlay_out_folder, obj_model, seg_model, conf=CONF_THR, total=None, batch_size=1, cache=None, writer=None, analyzer=None, roi=None, flush_every=50, track_window=TEMPORAL_WINDOW):
+    """
+    Core loop shared by the folder and video modes; frames is an iterable of (fname, frame, timestamp).
+    Entries go to the sink for out_json as they are produced: a .jsonl output is written line by
+    line (constant memory, returns None); other formats are collected and returned as a dict.
+    Objects are tracked across frames in output order (track_window=0 disables it).
+    """
+    if overlay_out_folder is not None:
+        ensure_dir(overlay_out_folder)
+    ensure_dir(os.path.dirname(out_json) or ".")
+
+    t0 = time.perf_counter()
+    sink = open_sink(out_json, flush_every)
+    tracker = make_tracker(track_window)
+    pbar = tqdm(total=total)
+    try:
+        for fname, ts, entry in iter_detections(frames, overlay_out_folder, obj_model, seg_model, conf, batch_size, pbar, cache, writer, analyzer, roi):
+            if tracker is not None:
+                with profiling.stage("tracking"):
+                    tracker.track_objects(entry["objects"])
+            with profiling.stage("results_write"):
+                sink.add(fname, entry, ts)
+    finally:
+        pbar.close()
+        # commits the last partial checkpoint even if the run is interrupted
+        if cache is not None:
+            print(f"Cache: {cache.hits} hits, {cache.misses} misses ({cache.path})")
+            cache.close()
+    report_throughput(sink.count, t0, batch_size)
+    report_tracks(tracker)
+    with profiling.stage("results_write", frames=0):
+        results_all = sink.close()
+    print("Saved:", out_json)
+    return results_all
+
+
+# ----- multi-process sharding -----
+# Each worker process loads both models once (in the pool initializer) and keeps them here.
+_WORKER_MODELS = {}
+
+
+def _init_worker(obj_model_path, seg_model_path, threads, cache_path=None, conf=CONF_THR, work_width=None, roi=None, profile=None, backend="torch", socket_path=None):
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    if profile:
+        profiling.enable(**profile)   # profiling.settings() of the parent
+    _WORKER_MODELS["models"] = load_models(obj_model_path, seg_model_path, backend, socket_path, threads)
+    _WORKER_MODELS["paths"] = (obj_model_path, seg_model_path)
+    _WORKER_MODELS["backend"] = backend
+    _WORKER_MODELS["analyzer"] = FrameAnalyzer(work_width=work_width)
+    _WORKER_MODELS["roi"] = roi
+    _WORKER_MODELS["cache"] = open_cache(cache_path, obj_model_path, seg_model_path, conf, _WORKER_MODELS["analyzer"], roi, backend, _WORKER_MODELS["models"])
+
+
+def _detect_shard(frames_folder, frame_files, overlay_out_folder, conf, batch_size, image_format="jpg", quality=95):
+    obj_model, seg_model = _WORKER_MODELS["models"]
+    cache = _WORKER_MODELS["cache"]
+    with ImageWriter(image_format, quality) as writer:
+        results = detect_frames(iter_folder_frames(frames_folder, frame_files), overlay_out_folder, obj_model, seg_model, conf, batch_size, cache=cache, writer=writer, analyzer=_WORKER_MODELS["analyzer"], roi=_WORKER_MODELS["roi"])
+    if cache is not None:
+        cache.flush()  # every finished shard is a checkpoint
+    return results, (profiling.collect() if profiling.enabled() else None)
+
+
+def _detect_run(source, out_json, overlay_out_folder, conf, batch_size=1, fps=1, sample_mode="grab", save_frames=None, image_format="jpg", quality=95, cache_path=None, roi=None, flush_every=50, track_window=TEMPORAL_WINDOW):
+    """
+    A whole run (frames folder or video) on the models this process loaded in _init_worker,
+    so batch_routes.py reuses them across routes. roi may be ("auto", N): resolved per run.
+    Returns (out_json, frames processed); the results themselves stay on disk.
+    """
+    obj_model, seg_model = _WORKER_MODELS["models"]
+    analyzer = _WORKER_MODELS["analyzer"]
+    with ImageWriter(image_format, quality) as writer:
+        if os.path.isdir(source):
+            total, frames = len(list_frame_files(source)), iter_folder_frames(source)
         else:
-            det_entry["pavement"]["mask_count"] = 0
-            det_entry["pavement"]["total_mask_area"] = 0
+            total, frames = None, iter_video_frames(source, fps, save_frames, sample_mode, writer)
+        roi, frames = resolve_roi(roi, frames)
+        cache = open_cache(cache_path, *_WORKER_MODELS["paths"], conf, analyzer, roi, _WORKER_MODELS["backend"], _WORKER_MODELS["models"])
+        results = run_detection(frames, out_json, overlay_out_folder, obj_model, seg_model, conf, total=total, batch_size=batch_size, cache=cache, writer=writer, analyzer=analyzer, roi=roi, flush_every=flush_every, track_window=track_window)
+    if results is not None:
+        return out_json, len(results)
+    with open(out_json) as f:
+        return out_json, sum(1 for _ in f)
 
-        # lane marking analysis
-        lane_info = detect_lane_markings(frame)
-        det_entry["lane"] = {"line_count": lane_info["line_count"], "faded_score": lane_info["faded_score"]}
-        # shoulder analysis
-        sh_info = detect_shoulder_issues(frame)
-        det_entry["shoulder"] = {"shoulder_present": sh_info["shoulder_present"], "erosion_score": sh_info["erosion_score"]}
 
-        # save overlay image
-        overlay_path = os.path.join(overlay_out_folder, f"{os.path.splitext(fname)[0]}_multi.jpg")
-        cv2.imwrite(overlay_path, frame)
+def split_shards(items, n_shards):
+    """Splits a list into n_shards contiguous, nearly equal slices (order preserved)."""
+    n_shards = max(1, min(n_shards, len(items)))
+    size, extra = divmod(len(items), n_shards)
+    shards, start = [], 0
+    for i in range(n_shards):
+        end = start + size + (1 if i < extra else 0)
+        shards.append(items[start:end])
+        start = end
+    return shards
 
-        results_all[fname] = det_entry
 
-    # save json
-    json.dump(results_all, open(out_json, "w"), indent=2)
+def process_frames_parallel(frames_folder, out_json, overlay_out_folder, obj_model_path=OBJ_MODEL, seg_model_path=SEG_MODEL, conf=CONF_THR, batch_size=1, workers=2, cache_path=None, image_format="jpg", quality=95, work_width=None, roi=None, flush_every=50, track_window=TEMPORAL_WINDOW, backend="torch", socket_path=None):
+    """
+    Splits the sorted frame list into contiguous shards and runs them on a process pool.
+    Shards are handed to the sink in order as soon as all earlier shards are done, so the
+    output is byte-identical to the sequential run and only out-of-order shards are buffered.
+    An auto road ROI is estimated once here and shipped to every worker.
+    Tracking runs here, on the ordered stream, so track ids match the sequential run.
+    """
+    if overlay_out_folder is not None:
+        ensure_dir(overlay_out_folder)
+    ensure_dir(os.path.dirname(out_json) or ".")
+
+    frame_files = list_frame_files(frames_folder)
+    if isinstance(roi, tuple):
+        roi, _ = resolve_roi(roi, iter_folder_frames(frames_folder, frame_files[:roi[1]]))
+    # a few shards per worker keeps the pool busy when some shards finish early
+    shards = split_shards(frame_files, workers * 4)
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    t0 = time.perf_counter()
+    sink = open_sink(out_json, flush_every)
+    tracker = make_tracker(track_window)
+    shard_results = [None] * len(shards)
+    next_shard = 0
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                             initargs=(obj_model_path, seg_model_path, threads, cache_path, conf, work_width, roi, profiling.settings(), backend, socket_path)) as pool:
+        futures = {pool.submit(_detect_shard, frames_folder, shard, overlay_out_folder, conf, batch_size, image_format, quality): i
+                   for i, shard in enumerate(shards)}
+        with tqdm(total=len(frame_files)) as pbar:
+            for fut in as_completed(futures):
+                i = futures[fut]
+                shard_results[i], prof = fut.result()
+                profiling.merge(prof)
+                pbar.update(len(shards[i]))
+                while next_shard < len(shards) and shard_results[next_shard] is not None:
+                    for fname, ts, entry in shard_results[next_shard]:
+                        if tracker is not None:
+                            with profiling.stage("tracking"):
+                                tracker.track_objects(entry["objects"])
+                        with profiling.stage("results_write"):
+                            sink.add(fname, entry, ts)
+                    shard_results[next_shard] = ()  # done; free the entries
+                    next_shard += 1
+
+    report_throughput(sink.count, t0, batch_size, workers)
+    report_tracks(tracker)
+    with profiling.stage("results_write", frames=0):
+        results_all = sink.close()
     print("Saved:", out_json)
     return results_all
 
 
+def process_frames(frames_folder, out_json, overlay_out_folder, obj_model_path=OBJ_MODEL, seg_model_path=SEG_MODEL, conf=CONF_THR, batch_size=1, workers=1, cache_path=None, image_format="jpg", quality=95, work_width=None, roi=None, flush_every=50, track_window=TEMPORAL_WINDOW, backend="torch", socket_path=None):
+    """
+    Returns {fname: entry}, or None when out_json is a streamed .jsonl file.
+    overlay_out_folder=None skips overlay rendering and encoding (headless runs).
+    work_width runs the lane/shoulder heuristics on a downscaled copy (see FrameAnalyzer).
+    roi (road_roi.RoadROI or ("auto", N) from parse_roi) limits segmentation and the lane search to the road.
+    backend="server" sends frames to a running inference_server.py instead of loading the weights here.
+    """
+    if workers > 1:
+        return process_frames_parallel(frames_folder, out_json, overlay_out_folder, obj_model_path, seg_model_path, conf, batch_size, workers, cache_path, image_format, quality, work_width, roi, flush_every, track_window, backend, socket_path)
+    obj_model, seg_model = load_models(obj_model_path, seg_model_path, backend, socket_path)
+    analyzer = FrameAnalyzer(work_width=work_width)
+    total = len(list_frame_files(frames_folder))
+    roi, frames = resolve_roi(roi, iter_folder_frames(frames_folder))
+    cache = open_cache(cache_path, obj_model_path, seg_model_path, conf, analyzer, roi, backend, (obj_model, seg_model))
+    with ImageWriter(image_format, quality) as writer:
+        return run_detection(frames, out_json, overlay_out_folder, obj_model, seg_model, conf, total=total, batch_size=batch_size, cache=cache, writer=writer, analyzer=analyzer, roi=roi, flush_every=flush_every, track_window=track_window)
+
+
+def process_video(video, out_json, overlay_out_folder, obj_model_path=OBJ_MODEL, seg_model_path=SEG_MODEL, conf=CONF_THR, fps=1, save_frames=None, batch_size=1, sample_mode="grab", cache_path=None, image_format="jpg", quality=95, work_width=None, roi=None, flush_every=50, track_window=TEMPORAL_WINDOW, backend="torch", socket_path=None):
+    """Streaming mode: decodes each sampled frame once and never touches JPEGs unless save_frames is set."""
+    obj_model, seg_model = load_models(obj_model_path, seg_model_path, backend, socket_path)
+    analyzer = FrameAnalyzer(work_width=work_width)
+    # one writer pool for both the sampled frames and the overlays
+    with ImageWriter(image_format, quality) as writer:
+        roi, frames = resolve_roi(roi, iter_video_frames(video, fps, save_frames, sample_mode, writer))
+        cache = open_cache(cache_path, obj_model_path, seg_model_path, conf, analyzer, roi, backend, (obj_model, seg_model))
+        return run_detection(frames, out_json, overlay_out_folder, obj_model, seg_model, conf, batch_size=batch_size, cache=cache, writer=writer, analyzer=analyzer, roi=roi, flush_every=flush_every, track_window=track_window)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--frames", required=True, help="frames folder")
-    parser.add_argument("--out", default="results/multi_detections.json")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--frames", help="frames folder")
+    src.add_argument("--video", help="video file (streaming mode, no intermediate JPEGs)")
+    parser.add_argument("--fps", type=float, default=1, help="sample rate for --video")
+    parser.add_argument("--sample_mode", choices=SAMPLE_MODES, default="grab", help="frame sampler for --video (see extract_frames.py)")
+    parser.add_argument("--save_frames", default=None, help="also write sampled frames here (--video only)")
+    parser.add_argument("--out", default="results/multi_detections.json", help="results file; .jsonl streams one line per frame, .npz or .parquet writes columnar tables")
+    parser.add_argument("--flush-every", type=int, default=50, help="flush a .jsonl output every N frames")
     parser.add_argument("--overlays", default="frames/overlays_multi")
+    parser.add_argument("--no-overlays", action="store_true", help="skip overlay rendering and encoding (headless runs)")
+    parser.add_argument("--image-format", choices=FORMATS, default="jpg", help="format for overlays and --save_frames")
+    parser.add_argument("--quality", type=int, default=95, help="JPEG/WebP quality (0-100)")
     parser.add_argument("--obj_model", default=OBJ_MODEL)
     parser.add_argument("--seg_model", default=SEG_MODEL)
     parser.add_argument("--conf", type=float, default=CONF_THR)
+    parser.add_argument("--batch-size", type=int, default=1, help="frames per model call")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes for --frames (models load once per worker)")
+    parser.add_argument("--work-width", type=int, default=None, help="run lane/shoulder heuristics at this width (e.g. 640); see resolution_drift.py")
+    parser.add_argument("--roi", default="none", help='road ROI for segmentation + lanes: "none", "auto[:N frames]" or "top,top_width,bottom_width[,center]" fractions, e.g. "0.4,0.3,1.0"')
+    parser.add_argument("--track-window", type=int, default=TEMPORAL_WINDOW, help="frames an object may go undetected and keep its track_id (0 disables tracking)")
+    parser.add_argument("--cache", default=None, help="per-frame result cache (sqlite file); reruns skip unchanged frames and resume after a crash")
+    parser.add_argument("--backend", choices=BACKENDS, default="torch", help="server: use a running inference_server.py (falls back to torch); onnx / onnx-int8: ONNX Runtime on CPU")
+    parser.add_argument("--socket", default=None, help="inference server socket (default $ROAD_SAFETY_SOCKET or /tmp/road_safety_infer.sock)")
+    parser.add_argument("--profile", action="store_true", help="print per-stage wall/CPU time and peak RSS at the end")
+    parser.add_argument("--trace", default=None, help="also write a Chrome trace-event JSON here (implies --profile)")
     args = parser.parse_args()
+    if args.video and args.workers > 1:
+        parser.error("--workers is only supported with --frames")
+
+    overlays = None if args.no_overlays else args.overlays
+    if args.profile or args.trace:
+        profiling.enable(trace=bool(args.trace))
 
-    process_frames(args.frames, args.out, args.overlays, args.obj_model, args.seg_model, args.conf)
+    if args.video:
+        process_video(args.video, args.out, overlays, args.obj_model, args.seg_model, args.conf, args.fps, args.save_frames, args.batch_size, args.sample_mode, args.cache, args.image_format, args.quality, args.work_width, parse_roi(args.roi), args.flush_every, args.track_window, args.backend, args.socket)
+    else:
+        process_frames(args.frames, args.out, overlays, args.obj_model, args.seg_model, args.conf, args.batch_size, args.workers, args.cache, args.image_format, args.quality, args.work_width, parse_roi(args.roi), args.flush_every, args.track_window, args.backend, args.socket)
+    profiling.report(args.trace)
@@ -1,15 +1,83 @@
-import cv2, os, argparse
+import cv2, os, argparse, bisect
 from src.utils import ensure_dir
-def extract(video,out,fps=1):
-    ensure_dir(out); cap=cv2.VideoCapture(video)
-    real_fps=cap.get(cv2.CAP_PROP_FPS) or 30
-    step=max(int(real_fps/fps),1); i=saved=0
-    while True:
-        r,f=cap.read(); 
-        if not r: break
-        if i%step==0: cv2.imwrite(f"{out}/frame_{saved:05}.jpg",f); saved+=1
+from src.image_writer import ImageWriter, FORMATS
+from src import profiling
+SAMPLE_MODES=("grab","seek","keyframes")
+def keyframe_indices(video):
+    """Frame indices of keyframes, read from packet flags without decoding (FFmpeg backend, OpenCV>=4.7). None if unsupported."""
+    prop=getattr(cv2,"CAP_PROP_LRF_HAS_KEY_FRAME",None)
+    if prop is None: return None
+    raw=cv2.VideoCapture(video,cv2.CAP_FFMPEG,[cv2.CAP_PROP_FORMAT,-1])
+    if not raw.isOpened(): return None
+    keys=[]; i=0
+    while raw.grab():
+        if raw.get(prop): keys.append(i)
         i+=1
-    cap.release(); print("Saved",saved,"frames in",out)
+    raw.release(); return keys or None
+def iter_frames(video,fps=1.0,mode="grab"):
+    """
+    Yields (sample_index, timestamp_s, frame) for the frames nearest to t = k/fps (fps may be fractional).
+    mode: "grab"      - grab() every frame, decode with retrieve() only the kept ones (exact)
+          "seek"      - jump to each kept frame with CAP_PROP_POS_FRAMES (cheap for sparse sampling of long videos)
+          "keyframes" - snap every sample to its nearest keyframe so only keyframes are decoded (fast, approximate)
+    """
+    if mode not in SAMPLE_MODES: raise ValueError(f"mode must be one of {SAMPLE_MODES}")
+    cap=cv2.VideoCapture(video)
+    real_fps=cap.get(cv2.CAP_PROP_FPS) or 30
+    ratio=real_fps/fps
+    target=lambda k: int(round(k*ratio))
+    try:
+        if mode=="keyframes":
+            keys=keyframe_indices(video)
+            if keys is None: print("⚠ keyframe flags unavailable; falling back to seek mode"); mode="seek"
+        if mode=="grab":
+            i=k=0; nxt=0
+            while cap.grab():
+                if i==nxt:
+                    r,f=cap.retrieve()
+                    if r: yield k,i/real_fps,f
+                    k+=1; nxt=max(target(k),i+1)
+                i+=1
+        elif mode=="seek":
+            n=int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or float("inf")
+            k=0; nxt=0
+            while nxt<n:
+                cap.set(cv2.CAP_PROP_POS_FRAMES,nxt)
+                r,f=cap.read()
+                if not r: break
+                yield k,nxt/real_fps,f
+                k+=1; nxt=max(target(k),nxt+1)
+        else:
+            k=s=0; last=-1
+            while True:
+                t=target(k)
+                if t>keys[-1]+ratio: break
+                j=bisect.bisect_left(keys,t)
+                kf=min(keys[max(j-1,0):j+1],key=lambda x:abs(x-t))
+                if kf!=last:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES,kf)
+                    r,f=cap.read()
+                    if not r: break
+                    yield s,kf/real_fps,f; s+=1; last=kf
+                k+=1
+    finally: cap.release()
+def extract(video,out,fps=1.0,mode="grab",fmt="jpg",quality=95,writer=None):
+    """Samples frames to out/frame_XXXXX.<fmt>; encoding runs on a background ImageWriter (pass one in to share it)."""
+    ensure_dir(out); saved=0
+    own=writer is None
+    if own: writer=ImageWriter(fmt,quality)
+    try:
+        for idx,_,f in profiling.timed_iter("decode",iter_frames(video,fps,mode)):
+            with profiling.stage("write_queue"): writer.write(f"{out}/frame_{idx:05}.jpg",f)
+            saved+=1
+    finally:
+        if own: writer.close()
+    print("Saved",saved,"frames in",out)
 if __name__=="__main__":
-    p=argparse.ArgumentParser(); p.add_argument("video"); p.add_argument("--out"); p.add_argument("--fps",type=int,default=1)
-    a=p.parse_args(); extract(a.video,a.out,a.fps)
+    p=argparse.ArgumentParser(); p.add_argument("video"); p.add_argument("--out"); p.add_argument("--fps",type=float,default=1)
+    p.add_argument("--mode",choices=SAMPLE_MODES,default="grab",help="grab: exact, decode kept frames only; seek: jump between samples; keyframes: fastest, approximate")
+    p.add_argument("--format",choices=FORMATS,default="jpg"); p.add_argument("--quality",type=int,default=95,help="JPEG/WebP quality (0-100)")
+    p.add_argument("--profile",action="store_true",help="print per-stage timings and peak RSS"); p.add_argument("--trace",help="Chrome trace-event JSON output (implies --profile)")
+    a=p.parse_args()
+    if a.profile or a.trace: profiling.enable(trace=bool(a.trace))
+    extract(a.video,a.out,a.fps,a.mode,a.format,a.quality); profiling.report(a.trace)
@@ -0,0 +1,86 @@
+# src/frame_cache.py
+"""
+Content-addressed per-frame result cache for detect_multiclass.py.
+
+Each entry is keyed by the hash of the decoded frame pixels plus a run key
+built from the model weight hashes, conf, the inference backend and the lane/shoulder parameters,
+so a rerun only pays for frames (or settings) that actually changed.
+Entries are committed every `checkpoint_every` frames; an interrupted run
+resumes from the last checkpoint simply by running again with the same cache.
+"""
+
+import os
+import json
+import sqlite3
+import hashlib
+
+
+def file_hash(path, chunk=1 << 20):
+    """blake2b of a file's bytes; falls back to the path itself (e.g. hub weights not downloaded yet)"""
+    if not path or not os.path.exists(path):
+        return f"name:{path}"
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def frame_hash(frame):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(frame.shape).encode())
+    h.update(frame.tobytes())
+    return h.hexdigest()
+
+
+def make_run_key(obj_model_path, seg_model_path, conf, params):
+    """Everything besides the frame itself that changes a frame's entry."""
+    payload = {
+        "obj_model": file_hash(obj_model_path),
+        "seg_model": file_hash(seg_model_path),
+        "conf": conf,
+        "params": params,
+    }
+    return hashlib.blake2b(json.dumps(payload, sort_keys=True).encode(), digest_size=16).hexdigest()
+
+
+class FrameCache:
+    def __init__(self, path, run_key, checkpoint_every=200):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.run_key = run_key
+        self.checkpoint_every = checkpoint_every
+        self.hits = 0
+        self.misses = 0
+        self._pending = 0
+        # timeout + WAL so several worker processes can share one cache file
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, entry TEXT NOT NULL)")
+        self.conn.commit()
+
+    def key(self, fhash):
+        return f"{self.run_key}:{fhash}"
+
+    def get(self, fhash):
+        row = self.conn.execute("SELECT entry FROM entries WHERE key = ?", (self.key(fhash),)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, fhash, entry):
+        self.conn.execute("INSERT OR REPLACE INTO entries (key, entry) VALUES (?, ?)",
+                          (self.key(fhash), json.dumps(entry)))
+        self._pending += 1
+        if self._pending >= self.checkpoint_every:
+            self.flush()
+
+    def flush(self):
+        self.conn.commit()
+        self._pending = 0
+
+    def close(self):
+        self.flush()
+        self.conn.close()
@@ -1,53 +1,96 @@
 # src/gemini_summary.py
 """
-Gemini Summarizer - FINAL VERSION
-Works 100% with your key using models/gemini-pro-latest
+Gemini Summarizer
+Turns multi_summary.json (align_and_compare_multi.py / batch_routes.py) into the JSON
+summary make_final_report.py prints: executive_summary, recommendations, evidence,
+severity, urgency, tldr. Saved as {"llm_text": raw reply, "llm_parsed": parsed JSON}.
+
+ - one route (--summary) or many (--summary a b c, or --routes results/routes) summarized
+   concurrently: at most --concurrency requests in flight and --rpm requests per minute
+ - timeouts, rate-limit (429) and server errors are retried with exponential backoff
+   (Retry-After is honoured)
+ - replies are cached on disk by hash of model + generation config + prompt, so an
+   unchanged summary is never paid for twice (--no-cache to bypass)
+ - calls the Gemini REST API directly; --endpoint (or $GEMINI_ENDPOINT) points it at
+   llm_mock_server.py for offline runs
+ - --engine rules uses rule_summary.py instead (no network); Gemini failures (or a missing
+   key) also fall back to it unless --no-fallback
+
+PYTHONPATH=. python src/llm_mock_server.py &
+PYTHONPATH=. python src/gemini_summary.py --summary results/compare/multi_summary.json --endpoint http://127.0.0.1:8765
 """
 
 import os
+import glob
 import json
+import time
+import random
+import asyncio
+import hashlib
 import argparse
-import google.generativeai as genai
+import urllib.error
+import urllib.request
+from src.rule_summary import write_rule_summary
+
+DEFAULT_ENDPOINT = "https://generativelanguage.googleapis.com"
+DEFAULT_MODEL = "models/gemini-pro-latest"
+GENERATION_CONFIG = {"temperature": 0.2, "responseMimeType": "application/json"}
+CACHE_DIR = "results/llm_cache"
+RETRY_STATUS = (429, 500, 502, 503, 504)
+WORST_SEGMENTS = 5
 
 
 # ----------------------------------------
 # Build Prompt
 # ----------------------------------------
-def build_prompt(summary):
-
-    base = summary.get("Base Analysis", {})
-    pres = summary.get("Present Analysis", {})
-    change = summary.get("Change Analysis", {})
-
-    b_count = base.get("Detected Areas", 0)
-    b_area = base.get("Total Mask Area", 0)
-    b_conf = base.get("Avg Confidence", 0)
+def data_lines(summary):
+    """The multi_summary.json facts the model may use, one per line (no derived numbers)."""
+    pav, lane, signs, sh = summary["pavement"], summary["lane"], summary["signs"], summary["shoulder"]
+    lines = [
+        f"Pavement damage (segmentation mask area, px per frame): base {pav['avg_base_area']}, present {pav['avg_present_area']}, "
+        f"change {pav['change_pixels']} px ({pav['percent_change']}%) -> {pav['verdict']}",
+        f"Lane markings: lines per frame base {lane['avg_base_lines']}, present {lane['avg_present_lines']} "
+        f"(change {lane['line_change']}); fade score (0-1, higher = more faded) base {lane['avg_base_fade']}, "
+        f"present {lane['avg_present_fade']} (change {lane['fade_change']}) -> {lane['verdict']}",
+    ]
+    if "base_unique_signs" in signs:
+        lines.append(f"Road signs: unique signs base {signs['base_unique_signs']}, present {signs['present_unique_signs']} "
+                     f"(change {signs['unique_difference']}); sign detections base {signs['base_sign_count']}, "
+                     f"present {signs['present_sign_count']} -> {signs['verdict']}")
+    else:
+        lines.append(f"Road signs: sign detections base {signs['base_sign_count']}, present {signs['present_sign_count']} "
+                     f"(change {signs['difference']}) -> {signs['verdict']}")
+    lines.append(f"Shoulder erosion score (0-1): base {sh['avg_base_erosion']}, present {sh['avg_present_erosion']} "
+                 f"(change {sh['change']}) -> {sh['verdict']}")
+    vru = summary.get("vru")
+    if vru:
+        if "base_unique_vru" in vru:
+            lines.append(f"Vulnerable road users (people, cyclists): unique base {vru['base_unique_vru']}, present {vru['present_unique_vru']}")
+        else:
+            lines.append(f"Vulnerable road user detections: base {vru['base_vru_detections']}, present {vru['present_vru_detections']}")
 
-    p_count = pres.get("Detected Areas", 0)
-    p_area = pres.get("Total Mask Area", 0)
-    p_conf = pres.get("Avg Confidence", 0)
+    segments = summary.get("segments") or []
+    if segments:
+        cfg = summary.get("segment_config", {})
+        worsened = sum(1 for s in segments if s["pavement_verdict"] == "Worsened")
+        lines.append(f"Segments: {len(segments)} of {cfg.get('size')} {cfg.get('by', 'frames')} each; "
+                     f"pavement worsened in {worsened}")
+        for s in sorted(segments, key=lambda s: -s["area_change"])[:WORST_SEGMENTS]:
+            lines.append(f"  segment {s['segment']} (frames {s['base_range']}): pavement area change {s['area_change']} px, "
+                         f"fade change {s['fade_change']}, erosion change {s['erosion_change']}, "
+                         f"signs {s['base_sign_count']} -> {s['present_sign_count']}")
+    return lines
 
-    change_pct = change.get("Damage Increase (%)", 0)
-    severity = change.get("Severity", "Unknown")
-    area_diff = change.get("Area Difference", 0)
 
+def build_prompt(summary):
+    data = "\n".join(data_lines(summary))
     prompt = f"""
 You are a senior expert in road-safety and infrastructure assessment.
 
-Summarize the following data STRICTLY in JSON:
+Summarize the following Base (older survey) vs Present (newer survey) comparison STRICTLY in JSON:
 
 DATA:
-Base Detected Areas: {b_count}
-Base Total Mask Area: {b_area}
-Base Avg Confidence: {b_conf}
-
-Present Detected Areas: {p_count}
-Present Total Mask Area: {p_area}
-Present Avg Confidence: {p_conf}
-
-Damage Increase (%): {change_pct}
-Area Difference (px): {area_diff}
-Severity Level: {severity}
+{data}
 
 OUTPUT FORMAT (STRICT):
 
@@ -75,56 +118,213 @@ Rules:
     return prompt.strip()
 
 
+def parse_reply(text):
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        text = text.replace("json", "", 1).strip()
+    try:
+        return json.loads(text)
+    except ValueError:
+        return {"raw_text": text}
+
+
 # ----------------------------------------
-# Generate Summary
+# Cache
 # ----------------------------------------
-def generate_summary(summary_path, api_key, output_path):
-    with open(summary_path, "r") as f:
-        summary = json.load(f)
+def cache_key(model, prompt):
+    blob = json.dumps({"model": model, "config": GENERATION_CONFIG, "prompt": prompt}, sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()
 
-    prompt = build_prompt(summary)
 
-    genai.configure(api_key=api_key)
+def cache_get(cache_dir, key):
+    if not cache_dir:
+        return None
+    try:
+        with open(os.path.join(cache_dir, key + ".json")) as f:
+            return json.load(f)["text"]
+    except (OSError, ValueError, KeyError):
+        return None
 
-    # ❤️ The model that WORKS for your key
-    model = genai.GenerativeModel("models/gemini-pro-latest")
 
-    print("🔵 Calling Gemini (gemini-pro-latest)…")
+def cache_put(cache_dir, key, model, text):
+    if not cache_dir:
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, key + ".json")
+    with open(path + ".tmp", "w") as f:
+        json.dump({"model": model, "text": text}, f)
+    os.replace(path + ".tmp", path)
 
-    response = model.generate_content(prompt)
-    text = response.text.strip()
 
+# ----------------------------------------
+# Gemini REST call
+# ----------------------------------------
+class RetryableError(Exception):
+    def __init__(self, msg, retry_after=None):
+        super().__init__(msg)
+        self.retry_after = retry_after
+
+
+def post_generate(endpoint, model, api_key, prompt, timeout):
+    """Blocking generateContent call -> reply text (runs in a worker thread)."""
+    url = f"{endpoint.rstrip('/')}/v1beta/{model}:generateContent"
+    body = json.dumps({"contents": [{"parts": [{"text": prompt}]}], "generationConfig": GENERATION_CONFIG}).encode()
+    req = urllib.request.Request(url, data=body, method="POST",
+                                 headers={"Content-Type": "application/json", "x-goog-api-key": api_key or ""})
     try:
-        parsed = json.loads(text)
-    except:
-        parsed = {"raw_text": text}
-
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-
-    json.dump(
-        {
-            "llm_text": text,
-            "llm_parsed": parsed
-        },
-        open(output_path, "w"),
-        indent=2
-    )
-
-    print("✅ Saved:", output_path)
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            data = json.load(resp)
+    except urllib.error.HTTPError as e:
+        detail = e.read().decode(errors="replace")[:300]
+        if e.code in RETRY_STATUS:
+            retry_after = e.headers.get("Retry-After")
+            raise RetryableError(f"HTTP {e.code}", float(retry_after) if retry_after and retry_after.isdigit() else None)
+        raise RuntimeError(f"Gemini HTTP {e.code}: {detail}")
+    except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+        raise RetryableError(str(getattr(e, "reason", e)))
+    candidates = data.get("candidates") or []
+    if not candidates:
+        raise RuntimeError(f"Gemini returned no candidates: {data.get('promptFeedback')}")
+    return "".join(p.get("text", "") for p in candidates[0].get("content", {}).get("parts", []))
+
+
+class RateLimiter:
+    """Spaces request starts at least 60 / rpm seconds apart."""
+    def __init__(self, rpm):
+        self.interval = 60.0 / rpm if rpm else 0
+        self.next_at = 0.0
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_at - now
+            self.next_at = max(now, self.next_at) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def call_with_retries(prompt, cfg, limiter, sem, label):
+    for attempt in range(cfg["retries"] + 1):
+        await limiter.wait()
+        async with sem:
+            try:
+                return await asyncio.to_thread(post_generate, cfg["endpoint"], cfg["model"], cfg["api_key"],
+                                               prompt, cfg["timeout"])
+            except RetryableError as e:
+                if attempt == cfg["retries"]:
+                    raise RuntimeError(f"gave up after {attempt + 1} attempts ({e})")
+                reason = str(e)
+                delay = e.retry_after or min(60.0, 2 ** attempt) * (0.5 + random.random())
+        print(f"⚠ {label}: {reason}; retry {attempt + 1}/{cfg['retries']} in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+
+# ----------------------------------------
+# Generate Summary
+# ----------------------------------------
+def rules_fallback(summary_path, output_path):
+    parsed = write_rule_summary(summary_path, output_path)
+    print(f"✅ Saved: {output_path} (offline rules)")
+    return parsed
+
+
+async def summarize_one(summary_path, output_path, cfg, limiter, sem):
+    if cfg["engine"] == "rules":
+        return rules_fallback(summary_path, output_path)
+    with open(summary_path) as f:
+        summary = json.load(f)
+    prompt = build_prompt(summary)
+    key = cache_key(cfg["model"], prompt)
+    text = cache_get(cfg["cache_dir"], key)
+    cached = text is not None
+    if not cached:
+        try:
+            text = (await call_with_retries(prompt, cfg, limiter, sem, summary_path)).strip()
+        except Exception as e:
+            if not cfg["fallback"]:
+                raise
+            print(f"⚠ {summary_path}: Gemini failed ({e}); using the offline rules")
+            return rules_fallback(summary_path, output_path)
+        cache_put(cfg["cache_dir"], key, cfg["model"], text)
+
+    parsed = parse_reply(text)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump({"llm_text": text, "llm_parsed": parsed, "engine": "gemini"}, f, indent=2)
+    print(f"✅ Saved: {output_path}{' (cached)' if cached else ''}")
     return parsed
 
 
+async def summarize_many(jobs, cfg, concurrency=4, rpm=60):
+    """jobs: [(summary_path, output_path)] -> {summary_path: parsed summary or the exception}"""
+    limiter, sem = RateLimiter(rpm), asyncio.Semaphore(max(1, concurrency))
+    results = await asyncio.gather(*(summarize_one(s, o, cfg, limiter, sem) for s, o in jobs), return_exceptions=True)
+    for (s, _), r in zip(jobs, results):
+        if isinstance(r, Exception):
+            print(f"❌ {s}: {r}")
+    return dict(zip([s for s, _ in jobs], results))
+
+
+def make_config(api_key, model=DEFAULT_MODEL, endpoint=None, cache_dir=CACHE_DIR, timeout=60, retries=5,
+                engine="gemini", fallback=True):
+    return {"api_key": api_key, "model": model, "endpoint": endpoint or os.environ.get("GEMINI_ENDPOINT", DEFAULT_ENDPOINT),
+            "cache_dir": cache_dir, "timeout": timeout, "retries": retries, "engine": engine, "fallback": fallback}
+
+
+def generate_summary(summary_path, api_key, output_path, **kw):
+    """Single-route entry point (blocking)."""
+    print(f"🔵 Calling Gemini ({kw.get('model', DEFAULT_MODEL)})…")
+    result = asyncio.run(summarize_many([(summary_path, output_path)], make_config(api_key, **kw)))[summary_path]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def collect_jobs(summaries, out, routes_dir):
+    """One summary -> --out; several (or --routes) -> llm_summary.json next to each multi_summary.json."""
+    if routes_dir:
+        summaries = sorted(glob.glob(os.path.join(routes_dir, "*", "multi_summary.json")))
+    if len(summaries) == 1 and not routes_dir:
+        return [(summaries[0], out)]
+    return [(s, os.path.join(os.path.dirname(s), "llm_summary.json")) for s in summaries]
+
+
 # ----------------------------------------
 # CLI
 # ----------------------------------------
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--summary", default="results/compare/summary.json")
-    parser.add_argument("--out", default="results/compare/llm_summary.json")
+    parser.add_argument("--summary", nargs="+", default=["results/compare/multi_summary.json"])
+    parser.add_argument("--out", default="results/compare/llm_summary.json", help="output for a single --summary")
+    parser.add_argument("--routes", default=None, help="batch_routes.py output folder: summarize every route")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--endpoint", default=None, help="API base URL (default $GEMINI_ENDPOINT or Google); e.g. llm_mock_server.py")
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight")
+    parser.add_argument("--rpm", type=float, default=60, help="max requests started per minute")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds per request")
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--cache", default=CACHE_DIR, help="reply cache folder")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--engine", choices=["gemini", "rules"], default="gemini", help="rules: offline rule_summary.py, no network")
+    parser.add_argument("--no-fallback", action="store_true", help="fail instead of using the offline rules when Gemini fails")
     args = parser.parse_args()
 
-    key = os.environ.get("GEMINI_API_KEY")
-    if not key:
-        raise SystemExit("❌ ERROR: export GEMINI_API_KEY=your_key")
+    cfg = make_config(os.environ.get("GEMINI_API_KEY"), args.model, args.endpoint,
+                      None if args.no_cache else args.cache, args.timeout, args.retries,
+                      args.engine, not args.no_fallback)
+    if cfg["engine"] == "gemini" and not cfg["api_key"] and cfg["endpoint"] == DEFAULT_ENDPOINT:
+        if not cfg["fallback"]:
+            raise SystemExit("❌ ERROR: export GEMINI_API_KEY=your_key")
+        print("⚠ GEMINI_API_KEY not set; using the offline rules")
+        cfg["engine"] = "rules"
 
-    generate_summary(args.summary, key, args.out)
+    jobs = collect_jobs(args.summary, args.out, args.routes)
+    if cfg["engine"] == "rules":
+        print(f"🔵 Summarizing {len(jobs)} route(s) with the offline rules")
+    else:
+        print(f"🔵 Summarizing {len(jobs)} route(s) with {cfg['model']} at {cfg['endpoint']}")
+    results = asyncio.run(summarize_many(jobs, cfg, args.concurrency, args.rpm))
+    if any(isinstance(r, Exception) for r in results.values()):
+        raise SystemExit(1)
@@ -0,0 +1,76 @@
+# src/image_writer.py
+"""
+Background image writer shared by extract_frames.py and detect_multiclass.py.
+
+Encoding (cv2.imencode releases the GIL) and the disk write run on a small
+thread pool instead of the per-frame hot loop. At most `max_pending` images
+are queued; write() blocks beyond that, so memory stays bounded.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+from src import profiling
+
+FORMATS = ("jpg", "png", "webp")
+
+
+def encode_params(fmt, quality):
+    if fmt == "jpg":
+        return [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+    if fmt == "webp":
+        return [cv2.IMWRITE_WEBP_QUALITY, int(quality)]
+    # png: map quality 0..100 onto compression 9..0
+    return [cv2.IMWRITE_PNG_COMPRESSION, max(0, min(9, round((100 - quality) / 11)))]
+
+
+class ImageWriter:
+    def __init__(self, fmt="jpg", quality=95, threads=2, max_pending=32):
+        if fmt not in FORMATS:
+            raise ValueError(f"fmt must be one of {FORMATS}")
+        self.fmt = fmt
+        self.params = encode_params(fmt, quality)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="imwrite")
+        self._slots = threading.BoundedSemaphore(max(1, max_pending))
+        self._error = None
+
+    def path_for(self, path):
+        """Same path with the extension of the configured format."""
+        return f"{os.path.splitext(path)[0]}.{self.fmt}"
+
+    def write(self, path, img):
+        """Queues img for writing to path (extension replaced by the format). img must not be modified afterwards."""
+        if self._error is not None:
+            raise self._error
+        self._slots.acquire()  # backpressure
+        try:
+            self._pool.submit(self._write, self.path_for(path), img)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _write(self, path, img):
+        try:
+            with profiling.stage("image_encode"):
+                ok, buf = cv2.imencode(f".{self.fmt}", img, self.params)
+                if not ok:
+                    raise IOError(f"could not encode {path}")
+                with open(path, "wb") as f:
+                    f.write(buf.tobytes())
+        except Exception as e:
+            self._error = e
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Waits for every queued image, then re-raises the first write error if any."""
+        self._pool.shutdown(wait=True)
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,67 @@
+# src/inference.py
+"""
+Backend-neutral inference results.
+
+detect_multiclass.build_entry reads model outputs through a small part of the
+ultralytics Results API (boxes.cls / conf / xyxy, iterating boxes, masks.data,
+model.names). Backends other than in-process PyTorch (the inference server,
+benchmark stubs, ONNX Runtime) return these numpy-backed look-alikes instead.
+
+to_arrays() / from_arrays() convert either kind to plain arrays and back:
+ - xyxy  float32 (n, 4)
+ - cls   float32 (n,)
+ - conf  float32 (n,)
+ - masks uint8 (n, mh, mw) already thresholded to 0/1, or None
+Thresholding masks the way build_entry does ((m*255).astype(uint8) > 127) keeps
+mask areas bit-identical to the in-process path.
+"""
+
+import numpy as np
+
+
+class Boxes:
+    def __init__(self, xyxy, cls, conf):
+        self.xyxy = np.asarray(xyxy, np.float32).reshape(-1, 4)
+        self.cls = np.asarray(cls, np.float32).reshape(-1)
+        self.conf = np.asarray(conf, np.float32).reshape(-1)
+
+    def __len__(self):
+        return len(self.xyxy)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield Boxes(self.xyxy[i:i+1], self.cls[i:i+1], self.conf[i:i+1])
+
+
+class Masks:
+    def __init__(self, data):
+        self.data = data
+
+
+class Results:
+    def __init__(self, boxes, masks=None):
+        self.boxes = boxes
+        self.masks = masks
+
+
+def _np(t):
+    return t.cpu().numpy() if hasattr(t, "cpu") else np.asarray(t)
+
+
+def to_arrays(res):
+    """ultralytics Results (or Results above) -> dict of numpy arrays"""
+    b = res.boxes
+    out = {"xyxy": _np(b.xyxy).astype(np.float32).reshape(-1, 4),
+           "cls": _np(b.cls).astype(np.float32).reshape(-1),
+           "conf": _np(b.conf).astype(np.float32).reshape(-1),
+           "masks": None}
+    if getattr(res, "masks", None) is not None:
+        out["masks"] = ((_np(res.masks.data) * 255).astype(np.uint8) > 127).astype(np.uint8)
+    return out
+
+
+def from_arrays(d):
+    masks = None
+    if d.get("masks") is not None:
+        masks = Masks(d["masks"].astype(np.float32))
+    return Results(Boxes(d["xyxy"], d["cls"], d["conf"]), masks)
@@ -0,0 +1,261 @@
+# src/inference_server.py
+"""
+Long-lived local inference daemon.
+
+Keeps the object and segmentation models loaded (and warmed up) behind a Unix
+socket, so detect_multiclass.py runs skip model loading and the slow first
+inferences. Start it once:
+
+    PYTHONPATH=. python src/inference_server.py --obj_model yolov8n.pt --seg_model best.pt
+
+then run detection with --backend server (same --obj_model / --seg_model). When the
+socket is missing, unreachable, or serving other weights (compared by file content, and
+including a server that has no seg model when the client asks for one), detection prints a warning
+and loads the models in-process as before.
+
+Wire format (no pickle, so a client can never make the server run code):
+  4-byte big-endian header length | JSON header | raw buffers (sizes listed in header["buffers"])
+Ops: "hello" (model paths, content hashes + class names), "infer" (frames for "obj" or "seg"), "shutdown".
+Results travel as the arrays of inference.to_arrays; masks are already thresholded.
+"""
+
+import os
+import json
+import struct
+import socket
+import argparse
+import threading
+import socketserver
+import numpy as np
+from src.inference import to_arrays, from_arrays
+from src.frame_cache import file_hash
+
+DEFAULT_SOCKET = os.environ.get("ROAD_SAFETY_SOCKET", "/tmp/road_safety_infer.sock")
+PROTOCOL = 2
+
+
+# ------------------------------------------------------------
+# framing
+# ------------------------------------------------------------
+def _recv_exact(sock, n):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        k = sock.recv_into(view[got:], n - got)
+        if k == 0:
+            raise ConnectionError("connection closed")
+        got += k
+    return buf
+
+
+def send_msg(sock, header, buffers=()):
+    buffers = [memoryview(b).cast("B") for b in buffers]
+    header = dict(header, buffers=[b.nbytes for b in buffers])
+    raw = json.dumps(header).encode()
+    sock.sendall(struct.pack(">I", len(raw)) + raw)
+    for b in buffers:
+        sock.sendall(b)
+
+
+def recv_msg(sock):
+    (n,) = struct.unpack(">I", _recv_exact(sock, 4))
+    header = json.loads(bytes(_recv_exact(sock, n)))
+    return header, [_recv_exact(sock, size) for size in header.get("buffers", [])]
+
+
+def pack_results(results):
+    """Results list -> (header list, buffers)"""
+    meta, buffers = [], []
+    for res in results:
+        a = to_arrays(res)
+        m = {"n": len(a["xyxy"]), "masks": list(a["masks"].shape) if a["masks"] is not None else None}
+        meta.append(m)
+        buffers += [a["xyxy"], a["cls"], a["conf"]]
+        if a["masks"] is not None:
+            buffers.append(np.ascontiguousarray(a["masks"]))
+    return meta, buffers
+
+
+def unpack_results(meta, buffers):
+    out, k = [], 0
+    for m in meta:
+        n = m["n"]
+        d = {"xyxy": np.frombuffer(buffers[k], np.float32).reshape(n, 4),
+             "cls": np.frombuffer(buffers[k+1], np.float32),
+             "conf": np.frombuffer(buffers[k+2], np.float32),
+             "masks": None}
+        k += 3
+        if m["masks"] is not None:
+            d["masks"] = np.frombuffer(buffers[k], np.uint8).reshape(m["masks"])
+            k += 1
+        out.append(from_arrays(d))
+    return out
+
+
+# ------------------------------------------------------------
+# server
+# ------------------------------------------------------------
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        srv = self.server
+        while True:
+            try:
+                header, buffers = recv_msg(self.request)
+            except (ConnectionError, struct.error):
+                return
+            op = header.get("op")
+            if op == "hello":
+                send_msg(self.request, {"ok": True, "protocol": PROTOCOL, "pid": os.getpid(), **srv.info})
+            elif op == "infer":
+                model = srv.models.get(header["model"])
+                if model is None:
+                    send_msg(self.request, {"ok": False, "error": f"no {header['model']} model loaded"})
+                    continue
+                frames = [np.frombuffer(b, np.uint8).reshape(shape) for b, shape in zip(buffers, header["shapes"])]
+                try:
+                    with srv.lock:   # one inference at a time; the models are not thread-safe
+                        results = model(frames, conf=header.get("conf", 0.25), verbose=False)
+                    meta, out = pack_results(results)
+                    send_msg(self.request, {"ok": True, "results": meta}, out)
+                except Exception as e:
+                    send_msg(self.request, {"ok": False, "error": str(e)})
+            elif op == "shutdown":
+                send_msg(self.request, {"ok": True})
+                threading.Thread(target=srv.shutdown, daemon=True).start()
+                return
+            else:
+                send_msg(self.request, {"ok": False, "error": f"unknown op {op!r}"})
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, models, info):
+        self.models = models
+        self.info = info
+        self.lock = threading.Lock()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)   # stale socket from a previous run
+        super().__init__(socket_path, _Handler)
+        os.chmod(socket_path, 0o600)
+
+
+def warm_up(models, sizes, conf=0.25):
+    """A few dummy inferences per model so the first real frames do not pay for lazy init / autotuning."""
+    for w, h in sizes:
+        dummy = np.zeros((h, w, 3), np.uint8)
+        for model in models.values():
+            if model is not None:
+                for _ in range(2):
+                    model([dummy], conf=conf, verbose=False)
+
+
+def serve(socket_path, obj_model_path, seg_model_path, warmup_sizes=((1280, 720),)):
+    from src.detect_multiclass import load_models   # ultralytics is only needed by the server process
+    obj_model, seg_model = load_models(obj_model_path, seg_model_path)
+    models = {"obj": obj_model, "seg": seg_model}
+    warm_up(models, warmup_sizes)
+    # weights are identified by content: paths differ with each side's working directory
+    info = {"obj_model": os.path.abspath(obj_model_path),
+            "seg_model": os.path.abspath(seg_model_path) if seg_model is not None else None,
+            "obj_hash": file_hash(obj_model_path),
+            "seg_hash": file_hash(seg_model_path) if seg_model is not None else None,
+            "names": {"obj": {str(k): v for k, v in obj_model.names.items()},
+                      "seg": {str(k): v for k, v in seg_model.names.items()} if seg_model is not None else None}}
+    server = InferenceServer(socket_path, models, info)
+    print(f"Inference server ready on {socket_path} (pid {os.getpid()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        print("Inference server stopped")
+
+
+# ------------------------------------------------------------
+# client
+# ------------------------------------------------------------
+class RemoteModel:
+    """Drop-in for a loaded YOLO model in detect_multiclass: model(frames, conf=...) -> results, model.names."""
+    def __init__(self, conn, kind, names):
+        self.conn = conn
+        self.kind = kind
+        self.names = names
+
+    def __call__(self, frames, conf=0.25, **_):
+        if isinstance(frames, np.ndarray):
+            frames = [frames]
+        frames = [np.ascontiguousarray(f, dtype=np.uint8) for f in frames]
+        header, buffers = self.conn.request({"op": "infer", "model": self.kind, "conf": conf,
+                                             "shapes": [list(f.shape) for f in frames]}, frames)
+        return unpack_results(header["results"], buffers)
+
+
+class ServerConnection:
+    def __init__(self, socket_path, timeout=300):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(socket_path)
+        self.lock = threading.Lock()
+
+    def request(self, header, buffers=()):
+        with self.lock:
+            send_msg(self.sock, header, buffers)
+            reply, out = recv_msg(self.sock)
+        if not reply.get("ok"):
+            raise RuntimeError(f"inference server: {reply.get('error')}")
+        return reply, out
+
+    def close(self):
+        self.sock.close()
+
+
+def connect_models(socket_path, obj_model_path, seg_model_path):
+    """
+    (obj_model, seg_model) proxies backed by the server, or None (with the reason printed)
+    when it is unreachable or serves different weights; the caller then loads in-process.
+    """
+    socket_path = socket_path or DEFAULT_SOCKET
+    try:
+        conn = ServerConnection(socket_path)
+        info, _ = conn.request({"op": "hello"})
+    except (OSError, ConnectionError, RuntimeError, ValueError) as e:
+        print(f"⚠ inference server not reachable at {socket_path} ({e}); loading models in-process")
+        return None
+    if info.get("protocol") != PROTOCOL or info["obj_hash"] != file_hash(obj_model_path):
+        print(f"⚠ inference server at {socket_path} serves {info.get('obj_model')}, not {obj_model_path}; loading models in-process")
+        conn.close()
+        return None
+    # a server without a seg model would silently drop every pavement mask
+    want_seg = file_hash(seg_model_path) if seg_model_path else None
+    if want_seg is not None and info["seg_hash"] != want_seg:
+        served = f"serves seg model {info['seg_model']}" if info["seg_model"] else "has no seg model"
+        print(f"⚠ inference server at {socket_path} {served}, not {seg_model_path}; loading models in-process")
+        conn.close()
+        return None
+    names = info["names"]
+    obj = RemoteModel(conn, "obj", {int(k): v for k, v in names["obj"].items()})
+    seg = RemoteModel(conn, "seg", {int(k): v for k, v in names["seg"].items()}) if names["seg"] is not None else None
+    print(f"Using inference server {socket_path} (pid {info['pid']})")
+    return obj, seg
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--socket", default=DEFAULT_SOCKET)
+    ap.add_argument("--obj_model", default="yolov8n.pt")
+    ap.add_argument("--seg_model", default="best.pt")
+    ap.add_argument("--warmup", nargs="*", default=["1280x720"], help="frame sizes to warm up on (WxH)")
+    ap.add_argument("--stop", action="store_true", help="ask a running server to shut down")
+    args = ap.parse_args()
+
+    if args.stop:
+        ServerConnection(args.socket).request({"op": "shutdown"})
+        print("Shutdown requested:", args.socket)
+    else:
+        sizes = [tuple(int(v) for v in s.lower().split("x")) for s in args.warmup]
+        serve(args.socket, args.obj_model, args.seg_model, sizes)
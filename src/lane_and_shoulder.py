@@ -1,90 +1,212 @@
 # src/lane_and_shoulder.py
 import cv2
 import numpy as np
+from src import profiling
 
-def detect_lane_markings(frame, debug=False):
+# Heuristic parameters. detect_multiclass.py folds these into its cache key,
+# so any change here invalidates cached per-frame results.
+LANE_PARAMS = {
+    "clahe_clip": 2.0,
+    "clahe_tile": 8,
+    "canny_low": 50,
+    "canny_high": 150,
+    "hough_threshold": 50,
+    "min_line_frac": 0.05,   # minLineLength as a fraction of frame width
+    "max_line_gap": 20,
+}
+SHOULDER_PARAMS = {
+    "margin_frac": 0.2,      # bottom-left/right ROI size as a fraction of width/height
+    "canny_low": 50,
+    "canny_high": 150,
+    "erosion_gain": 3.0,
+    "present_brightness": 0.15,
+}
+
+class FrameAnalyzer:
     """
-    Returns a dict:
-      { 'line_count': int, 'faded_score': 0..1 (higher = more faded), 'mask': np.array }
-    Approach:
-      - convert to gray, apply CLAHE to normalize illumination
-      - use Canny + HoughLinesP to detect line segments
-      - estimate fadedness by comparing intensity under lines vs expected brightness
+    Reusable lane + shoulder analyzer.
+    The CLAHE object is built once; per frame, grayscale, CLAHE and Canny are computed once
+    and shared by both heuristics. Line patches are sampled with an integral image instead of
+    a Python loop. Visualization arrays ('mask', 'edges') are only built when visualize=True.
+    Numbers are identical to the original per-function implementation.
+
+    work_width (e.g. 640) runs both heuristics on a downscaled copy of wider frames. Pixel
+    thresholds (Hough votes, max line gap) are rescaled with the frame; size-relative ones
+    (min line length, patch radius, shoulder margins) follow automatically. Use
+    resolution_drift.py to measure how far the metrics move versus full resolution.
     """
-    h, w = frame.shape[:2]
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-
-    # illumination normalization
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-    norm = clahe.apply(gray)
-
-    # edge detection
-    edges = cv2.Canny(norm, 50, 150, apertureSize=3)
-
-    # Hough
-    lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=50, minLineLength=int(w*0.05), maxLineGap=20)
-    line_count = 0 if lines is None else len(lines)
-
-    # Faded score heuristic:
-    # sample brightness inside narrow band along lines (if any). If average is low -> faded
-    faded_score = 0.0
-    if lines is not None:
-        samples = []
-        for x1,y1,x2,y2 in lines[:,0]:
-            mx = int((x1+x2)/2)
-            my = int((y1+y2)/2)
-            r = max(2, int(min(w,h)*0.01))
+    def __init__(self, lane_params=None, shoulder_params=None, work_width=None):
+        self.lane_params = dict(LANE_PARAMS, **(lane_params or {}))
+        self.shoulder_params = dict(SHOULDER_PARAMS, **(shoulder_params or {}))
+        self.work_width = work_width
+        P = self.lane_params
+        self.clahe = cv2.createCLAHE(clipLimit=P["clahe_clip"], tileGridSize=(P["clahe_tile"],P["clahe_tile"]))
+
+    def params(self):
+        """Everything that affects the outputs (used in cache keys)."""
+        return {"lane": self.lane_params, "shoulder": self.shoulder_params, "work_width": self.work_width}
+
+    def gray(self, frame):
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+
+    def working_gray(self, frame):
+        """Grayscale at working resolution. Returns (gray, scale) with scale = working / full width."""
+        gray = self.gray(frame)
+        w = gray.shape[1]
+        if not self.work_width or w <= self.work_width:
+            return gray, 1.0
+        scale = self.work_width / w
+        small = cv2.resize(gray, (self.work_width, max(1, int(round(gray.shape[0]*scale)))), interpolation=cv2.INTER_AREA)
+        return small, scale
+
+    def lanes(self, gray, visualize=False, scale=1.0, edge_mask=None, ref_size=None):
+        """
+        Returns a dict:
+          { 'line_count': int, 'faded_score': 0..1 (higher = more faded) [, 'mask', 'edges'] }
+        Approach:
+          - apply CLAHE to the grayscale frame to normalize illumination
+          - use Canny + HoughLinesP to detect line segments
+          - estimate fadedness by comparing intensity under lines vs expected brightness
+        scale < 1 means gray is a downscaled frame; pixel thresholds are scaled to match.
+        With a road ROI, gray is the ROI crop, edge_mask (same size) keeps only edges inside
+        the ROI polygon and ref_size=(w, h) of the whole frame keeps size-relative thresholds
+        unchanged. Visualization arrays are at the resolution of gray.
+        """
+        P = self.lane_params
+        h, w = gray.shape[:2]
+        ref_w, ref_h = ref_size or (w, h)
+
+        # illumination normalization
+        norm = self.clahe.apply(gray)
+
+        # edge detection
+        edges = cv2.Canny(norm, P["canny_low"], P["canny_high"], apertureSize=3)
+        if edge_mask is not None:
+            edges = cv2.bitwise_and(edges, edge_mask)
+
+        # Hough
+        if scale == 1.0:
+            votes, gap = P["hough_threshold"], P["max_line_gap"]
+        else:
+            votes = max(1, int(round(P["hough_threshold"]*scale)))
+            gap = max(1, int(round(P["max_line_gap"]*scale)))
+        lines = cv2.HoughLinesP(edges, 1, np.pi/180, threshold=votes, minLineLength=int(ref_w*P["min_line_frac"]), maxLineGap=gap)
+        line_count = 0 if lines is None else len(lines)
+
+        # Faded score heuristic:
+        # mean brightness of a small patch around each segment midpoint. If average is low -> faded
+        faded_score = 0.0
+        if lines is not None:
+            segs = lines[:,0].astype(np.int64)
+            mx = (segs[:,0] + segs[:,2]) // 2
+            my = (segs[:,1] + segs[:,3]) // 2
+            r = max(2, int(min(ref_w,ref_h)*0.01))
             # clamp
-            y0 = max(0, my-r); y1b = min(h, my+r)
-            x0 = max(0, mx-r); x1b = min(w, mx+r)
-            patch = norm[y0:y1b, x0:x1b]
-            if patch.size>0:
-                samples.append(patch.mean()/255.0)
-        if samples:
+            y0 = np.maximum(0, my-r); y1 = np.minimum(h, my+r)
+            x0 = np.maximum(0, mx-r); x1 = np.minimum(w, mx+r)
+            # patch sums from the integral image (float64 holds the integer sums exactly)
+            ii = cv2.integral(norm, sdepth=cv2.CV_64F)
+            sums = ii[y1,x1] - ii[y0,x1] - ii[y1,x0] + ii[y0,x0]
+            samples = sums / ((y1-y0) * (x1-x0)) / 255.0
             mean_brightness = np.mean(samples)
             # if bright (>=0.6) => not faded, else faded
             faded_score = max(0.0, 1.0 - mean_brightness)
 
-    # Build mask for visualization
-    mask = np.zeros((h,w), dtype=np.uint8)
-    if lines is not None:
-        for x1,y1,x2,y2 in lines[:,0]:
-            cv2.line(mask, (x1,y1), (x2,y2), 255, 4)
+        out = {"line_count": line_count, "faded_score": round(float(faded_score),3)}
+        if visualize:
+            # Build mask for visualization
+            mask = np.zeros((h,w), dtype=np.uint8)
+            if lines is not None:
+                for x1_,y1_,x2_,y2_ in lines[:,0]:
+                    cv2.line(mask, (int(x1_),int(y1_)), (int(x2_),int(y2_)), 255, 4)
+            out["mask"] = mask
+            out["edges"] = edges
+        return out
+
+    def shoulder(self, gray):
+        """
+        Detects shoulder presence/erosion by analyzing left/right margins brightness & texture.
+        Returns dict:
+          { 'shoulder_present': bool, 'erosion_score': 0..1, 'left': {...}, 'right': {...} }
+        Heuristic:
+          - compute edge density and mean brightness near margins (bottom-left/right)
+          - if edge density is high in shoulder zone -> erosion
+        """
+        P = self.shoulder_params
+        h, w = gray.shape[:2]
+        # define ROI near bottom corners (20% width, 20% height)
+        margin_w = int(w*P["margin_frac"])
+        margin_h = int(h*P["margin_frac"])
+        left_roi = gray[h-margin_h:h, 0:margin_w]
+        right_roi = gray[h-margin_h:h, w-margin_w:w]
 
-    return {"line_count": line_count, "faded_score": round(float(faded_score),3), "mask": mask, "edges": edges}
+        # Canny stays per ROI: it runs on the raw (not CLAHE) gray, and the ROI borders
+        # change the gradients, so sharing the lane edge map would change the numbers.
+        def analyze_roi(roi):
+            if roi.size==0:
+                return {"edge_density":0.0, "mean_brightness":0.0}
+            edges = cv2.Canny(roi, P["canny_low"], P["canny_high"])
+            edge_density = edges.mean()
+            mean_brightness = roi.mean()/255.0
+            return {"edge_density": float(edge_density), "mean_brightness": float(mean_brightness)}
+
+        L = analyze_roi(left_roi)
+        R = analyze_roi(right_roi)
+
+        # heuristics: high edge density and low brightness -> erosion/damage
+        erosion_score = max(L["edge_density"], R["edge_density"])
+        erosion_score = min(1.0, erosion_score*P["erosion_gain"])  # scale into 0..1
+        shoulder_present = (L["mean_brightness"]>P["present_brightness"] or R["mean_brightness"]>P["present_brightness"])
+
+        return {"shoulder_present": bool(shoulder_present), "erosion_score": round(float(erosion_score),3), "left":L, "right":R}
+
+    def analyze(self, frame, visualize=False, roi=None):
+        """
+        Both heuristics on one BGR frame with shared preprocessing. Returns (lane_info, shoulder_info).
+        roi (road_roi.RoadROI) limits the lane search to the road; the shoulder ROIs stay on the full frame.
+        """
+        with profiling.stage("gray"):
+            gray, scale = self.working_gray(frame)
+        with profiling.stage("lane"):
+            if roi is None:
+                lane = self.lanes(gray, visualize, scale)
+            else:
+                gh, gw = gray.shape[:2]
+                lane = self.lanes(roi.crop(gray), visualize, scale, roi.crop_mask(gw, gh), (gw, gh))
+                lane["roi"] = roi.box(frame.shape[1], frame.shape[0])
+        with profiling.stage("shoulder"):
+            shoulder = self.shoulder(gray)
+        return lane, shoulder
+
+
+_default_analyzer = None
+
+def default_analyzer():
+    global _default_analyzer
+    if _default_analyzer is None:
+        _default_analyzer = FrameAnalyzer()
+    return _default_analyzer
+
+
+def detect_lane_markings(frame, debug=False, roi=None):
+    """
+    Returns a dict:
+      { 'line_count': int, 'faded_score': 0..1 (higher = more faded), 'mask': np.array, 'edges': np.array }
+    Thin wrapper over FrameAnalyzer.lanes (use FrameAnalyzer.analyze to also get the shoulder in one pass).
+    With roi (road_roi.RoadROI) only the road region is searched; 'mask'/'edges' then cover the
+    ROI bounding box given as 'roi' = [x1, y1, x2, y2] in full-frame pixels.
+    """
+    A = default_analyzer()
+    if roi is not None:
+        return A.analyze(frame, visualize=True, roi=roi)[0]
+    return A.lanes(A.gray(frame), visualize=True)
 
 
 def detect_shoulder_issues(frame, debug=False):
     """
-    Detects shoulder presence/erosion by analyzing left/right margins brightness & texture.
     Returns dict:
-      { 'shoulder_present': bool, 'erosion_score': 0..1 }
-    Heuristic:
-      - compute edge density and mean brightness near margins (bottom-left/right)
-      - if edge density is high in shoulder zone -> erosion
+      { 'shoulder_present': bool, 'erosion_score': 0..1, 'left': {...}, 'right': {...} }
+    Thin wrapper over FrameAnalyzer.shoulder.
     """
-    h, w = frame.shape[:2]
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    # define ROI near bottom corners (20% width, 20% height)
-    margin_w = int(w*0.2)
-    margin_h = int(h*0.2)
-    left_roi = gray[h-margin_h:h, 0:margin_w]
-    right_roi = gray[h-margin_h:h, w-margin_w:w]
-
-    def analyze_roi(roi):
-        if roi.size==0:
-            return {"edge_density":0.0, "mean_brightness":0.0}
-        edges = cv2.Canny(roi, 50, 150)
-        edge_density = edges.mean()
-        mean_brightness = roi.mean()/255.0
-        return {"edge_density": float(edge_density), "mean_brightness": float(mean_brightness)}
-
-    L = analyze_roi(left_roi)
-    R = analyze_roi(right_roi)
-
-    # heuristics: high edge density and low brightness -> erosion/damage
-    erosion_score = max(L["edge_density"], R["edge_density"])
-    erosion_score = min(1.0, erosion_score*3.0)  # scale into 0..1
-    shoulder_present = (L["mean_brightness"]>0.15 or R["mean_brightness"]>0.15)
-
-    return {"shoulder_present": bool(shoulder_present), "erosion_score": round(float(erosion_score),3), "left":L, "right":R}
+    A = default_analyzer()
+    return A.shoulder(A.gray(frame))
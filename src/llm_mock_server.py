@@ -0,0 +1,92 @@
+# src/llm_mock_server.py
+"""
+Local stand-in for the Gemini generateContent REST endpoint, for offline runs and tests
+of gemini_summary.py. Replies are deterministic JSON summaries built from the prompt's
+DATA lines (severity from how many factors say "Worsened"); no key is checked.
+
+PYTHONPATH=. python src/llm_mock_server.py --port 8765 [--latency-ms 200] [--fail-every 3]
+--fail-every N answers every Nth request with 429 + Retry-After: 1 to exercise the backoff.
+"""
+
+import re
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SEVERITY = ["Low", "Low", "Medium", "High", "Critical"]
+URGENCY = {"Low": "Routine", "Medium": "Within 3 months", "High": "Within 1 month", "Critical": "Immediate"}
+
+
+def mock_reply(prompt):
+    data = prompt.split("DATA:", 1)[-1].split("OUTPUT FORMAT", 1)[0].strip().splitlines()
+    facts = [l.strip() for l in data if l.strip().endswith(("Worsened", "Improved"))]
+    worsened = [l.split(":", 1)[0] for l in facts if l.endswith("Worsened")]
+    severity = SEVERITY[min(len(worsened), len(SEVERITY) - 1)]
+    return {
+        "executive_summary": (f"Mock summary: {len(worsened)} of {len(facts)} factors worsened"
+                              + (f" ({', '.join(worsened)})." if worsened else ".")),
+        "recommendations": [{"action": f"Inspect and repair: {w}", "priority": i + 1,
+                             "justification": next(l for l in facts if l.startswith(w))}
+                            for i, w in enumerate(worsened)],
+        "evidence": " | ".join(facts),
+        "severity": severity,
+        "urgency": URGENCY[severity],
+        "tldr": f"{len(worsened)} worsened factor(s); severity {severity}.",
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        srv = self.server
+        with srv.lock:
+            srv.requests += 1
+            n = srv.requests
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not re.search(r"/v1beta/.+:generateContent$", self.path):
+            return self._send(404, {"error": {"message": f"unknown path {self.path}"}})
+        if srv.fail_every and n % srv.fail_every == 0:
+            return self._send(429, {"error": {"message": "mock rate limit"}}, {"Retry-After": "1"})
+        time.sleep(srv.latency)
+        prompt = "".join(p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", []))
+        text = json.dumps(mock_reply(prompt), indent=2)
+        self._send(200, {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]})
+
+    def _send(self, code, payload, headers=None):
+        raw = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def log_message(self, fmt, *args):
+        print(f"mock llm: {self.command} {self.path} -> {args[1] if len(args) > 1 else ''}")
+
+
+def make_server(port=8765, latency_ms=0, fail_every=0, host="127.0.0.1"):
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.latency = latency_ms / 1000
+    server.fail_every = fail_every
+    return server
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency-ms", type=float, default=0, help="simulated model latency per request")
+    ap.add_argument("--fail-every", type=int, default=0, help="answer every Nth request with 429")
+    args = ap.parse_args()
+
+    server = make_server(args.port, args.latency_ms, args.fail_every)
+    print(f"Mock Gemini endpoint on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -2,23 +2,25 @@
 """
 FINAL HACKATHON PDF GENERATOR (Stable + Accurate)
 - Uses ONLY the correct older logic
-- Adds clean comparison charts
+- Adds clean comparison charts (vector, per-segment trends when the summary has segments)
+- One canvas, one pass: AI page, charts and the comparison sections straight into final_report.pdf
 - Keeps AI summary formatting perfect
 - No risky aggregation, no wrong computations
 """
 
 import json
 import os
-import matplotlib.pyplot as plt
+import argparse
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import cm
-from PyPDF2 import PdfReader, PdfWriter
+from src.report_charts import chart_factors, segment_series, bar_pair_chart, line_chart
+from src.align_and_compare_multi import draw_comparison
+from src import profiling
 
 
 AI_SUMMARY_PATH = "results/compare/llm_summary.json"
 MULTI_SUMMARY_PATH = "results/compare/multi_summary.json"
-YOLO_PDF_PATH = "results/compare/multi_report.pdf"
 METADATA_PATH = "results/compare/metadata.json"
 OUTPUT_FINAL_PDF = "results/final_report.pdf"
 
@@ -141,79 +143,37 @@ def draw_ai_page(c, data):
 
 
 # ------------------------------------------------------------
-# GENERATE CHARTS
+# CHART PAGES (vector, drawn on the report canvas)
 # ------------------------------------------------------------
-def make_charts(data):
-    os.makedirs("results/charts", exist_ok=True)
-
-    factors = {
-        "Pavement Area": (
-            data["pavement"]["avg_base_area"],
-            data["pavement"]["avg_present_area"],
-        ),
-        "Lane Line Count": (
-            data["lane"]["avg_base_lines"],
-            data["lane"]["avg_present_lines"],
-        ),
-        "Lane Fade Score": (
-            data["lane"]["avg_base_fade"],
-            data["lane"]["avg_present_fade"],
-        ),
-        "Shoulder Erosion": (
-            data["shoulder"]["avg_base_erosion"],
-            data["shoulder"]["avg_present_erosion"],
-        ),
-        "Road Signs Count": (
-            data["signs"]["base_sign_count"],
-            data["signs"]["present_sign_count"],
-        ),
-    }
-
-    chart_paths = []
-
-    for title, (base, present) in factors.items():
-        plt.figure(figsize=(6, 4))
-        plt.bar(["Base", "Present"], [base, present], color=["#2c7bb6", "#527de1"])
-        plt.title(title)
-        plt.tight_layout()
-
-        path = f"results/charts/{title.replace(' ', '_')}.png"
-        plt.savefig(path)
-        plt.close()
-
-        chart_paths.append((title, path))
-
-    return chart_paths
-
-
-# ------------------------------------------------------------
-# CHART PAGES
-# ------------------------------------------------------------
-def draw_chart_pages(c, chart_paths):
-    for title, img_path in chart_paths:
-        c.showPage()
-        c.setFont("Helvetica-Bold", 18)
-        c.drawString(2 * cm, 27 * cm, title)
-        c.drawImage(img_path, 2 * cm, 10 * cm, width=16 * cm, preserveAspectRatio=True)
-
-
-# ------------------------------------------------------------
-# MERGE PDFS
-# ------------------------------------------------------------
-def merge_pdfs(ai_pdf, yolo_pdf, out):
-    writer = PdfWriter()
-
-    for p in PdfReader(ai_pdf).pages:
-        writer.add_page(p)
-
-    if os.path.exists(yolo_pdf):
-        for p in PdfReader(yolo_pdf).pages:
-            writer.add_page(p)
-    else:
-        print("⚠ YOLO report not found — skipping.")
-
-    with open(out, "wb") as f:
-        writer.write(f)
+def draw_chart_pages(c, data):
+    """Whole-run factors as base/present bar charts, two per row."""
+    c.showPage()
+    c.setFont("Helvetica-Bold", 18)
+    c.drawString(2 * cm, 27 * cm, "Comparison Charts")
+    w, h = 8.3 * cm, 7.5 * cm
+    for i, (title, base, present) in enumerate(chart_factors(data)):
+        row, col = divmod(i, 2)
+        bar_pair_chart(c, 2 * cm + col * (w + 0.4 * cm), 26 * cm - (row + 1) * (h + 0.6 * cm), w, h,
+                       title, base, present)
+
+
+def draw_segment_pages(c, data, per_page=3):
+    """Per-segment trends (one line per run), three charts per page; a no-op without segments."""
+    segments = data.get("segments")
+    if not segments:
+        return
+    cfg = data.get("segment_config", {})
+    unit = {"frames": "frames", "seconds": "s", "meters": "m"}.get(cfg.get("by"), "frames")
+    x_title = f"segment ({cfg.get('size', '')} {unit} each{', aligned' if cfg.get('aligned') else ''})"
+    labels = [s["segment"] for s in segments]
+    h = 7.8 * cm
+    for i, (title, series) in enumerate(segment_series(segments)):
+        slot = i % per_page
+        if slot == 0:
+            c.showPage()
+            c.setFont("Helvetica-Bold", 18)
+            c.drawString(2 * cm, 27 * cm, f"Per-Segment Trends ({len(segments)} segments)")
+        line_chart(c, 2 * cm, 26 * cm - (slot + 1) * (h + 0.4 * cm), 17 * cm, h, title, series, labels, x_title)
 
 
 # ------------------------------------------------------------
@@ -221,33 +181,42 @@ def merge_pdfs(ai_pdf, yolo_pdf, out):
 # ------------------------------------------------------------
 def generate_final_report():
     # Load AI summary
-    with open(AI_SUMMARY_PATH) as f:
-        raw_ai = json.load(f)
-
-    raw = raw_ai.get("llm_text", "") or raw_ai.get("llm_parsed", {}).get("raw_text", "")
-    parsed = clean_llm_json(raw)
-
-    # Load multi-summary
-    with open(MULTI_SUMMARY_PATH) as f:
-        multi = json.load(f)
-
-    # Generate charts
-    charts = make_charts(multi)
-
-    # Build PDF
-    ai_pdf = "results/compare/_ai_summary_page.pdf"
-    os.makedirs("results/compare", exist_ok=True)
-
-    c = canvas.Canvas(ai_pdf, pagesize=A4)
-    draw_ai_page(c, parsed)
-    draw_chart_pages(c, charts)
-    c.save()
-
-    merge_pdfs(ai_pdf, YOLO_PDF_PATH, OUTPUT_FINAL_PDF)
+    with profiling.stage("load"):
+        with open(AI_SUMMARY_PATH) as f:
+            raw_ai = json.load(f)
+
+        raw = raw_ai.get("llm_text", "") or raw_ai.get("llm_parsed", {}).get("raw_text", "")
+        parsed = clean_llm_json(raw)
+
+        # Load multi-summary
+        with open(MULTI_SUMMARY_PATH) as f:
+            multi = json.load(f)
+
+    # Build PDF: AI page, charts, segment trends and the comparison sections on one canvas
+    os.makedirs(os.path.dirname(OUTPUT_FINAL_PDF), exist_ok=True)
+    c = canvas.Canvas(OUTPUT_FINAL_PDF, pagesize=A4)
+
+    with profiling.stage("pdf"):
+        draw_ai_page(c, parsed)
+    with profiling.stage("charts"):
+        draw_chart_pages(c, multi)
+        draw_segment_pages(c, multi)
+    with profiling.stage("comparison"):
+        c.showPage()
+        draw_comparison(c, multi)
+    with profiling.stage("save"):
+        c.save()
 
     print("\n🎉 FINAL REPORT READY!")
     print("➡", OUTPUT_FINAL_PDF)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profile", action="store_true", help="print per-stage timings and peak RSS")
+    parser.add_argument("--trace", default=None, help="Chrome trace-event JSON output (implies --profile)")
+    args = parser.parse_args()
+    if args.profile or args.trace:
+        profiling.enable(trace=bool(args.trace))
     generate_final_report()
+    profiling.report(args.trace)
@@ -0,0 +1,204 @@
+# src/onnx_backend.py
+"""
+ONNX Runtime inference backend for CPU-only boxes (detect_multiclass.py --backend onnx / onnx-int8).
+
+The .pt weights are exported once with ultralytics (dynamic input shape) next to the
+weights file, optionally followed by int8 dynamic quantization of the weights, and
+reused while they are newer than the .pt. OnnxYOLO then mirrors the ultralytics
+predict path so build_entry produces the same "objects" and "pavement" fields:
+ - LetterBox(auto=True): ratio-preserving resize, padding to a stride multiple with 114
+ - class-aware NMS (conf > threshold, IoU 0.7, max 300 detections), boxes scaled back
+ - segmentation: prototype mask logits -> crop to box -> bilinear upsample -> > 0
+Needs onnxruntime (pip install onnxruntime); onnx_parity.py measures agreement and speedup.
+"""
+
+import os
+import ast
+import cv2
+import numpy as np
+from src.inference import Boxes, Masks, Results
+
+IOU_THR = 0.7
+MAX_DET = 300
+MAX_NMS = 30000
+MAX_WH = 7680     # class offset for class-aware NMS (same as ultralytics)
+
+
+# ------------------------------------------------------------
+# export
+# ------------------------------------------------------------
+def _fresh(path, src):
+    """path exists and is not older than src; a shipped .onnx without its .pt counts as fresh."""
+    if not os.path.exists(path):
+        return False
+    return not os.path.exists(src) or os.path.getmtime(path) >= os.path.getmtime(src)
+
+
+def export_onnx(pt_path, imgsz=640, quantize=False):
+    """Exports (or reuses) <weights>.onnx, and <weights>.int8.onnx when quantize=True. Returns the path."""
+    stem = os.path.splitext(pt_path)[0]
+    onnx_path = stem + ".onnx"
+    if not _fresh(onnx_path, pt_path):
+        from ultralytics import YOLO
+        print("Exporting to ONNX:", pt_path)
+        exported = YOLO(pt_path).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+        if os.path.abspath(exported) != os.path.abspath(onnx_path):
+            os.replace(exported, onnx_path)
+    if not quantize:
+        return onnx_path
+    q_path = stem + ".int8.onnx"
+    if not _fresh(q_path, onnx_path):
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        print("Quantizing (int8 dynamic):", onnx_path)
+        quantize_dynamic(onnx_path, q_path, weight_type=QuantType.QInt8)
+    return q_path
+
+
+# ------------------------------------------------------------
+# pre / post processing (ultralytics-equivalent)
+# ------------------------------------------------------------
+def letterbox(img, new_shape=640, stride=32, auto=True):
+    """Returns (padded image, input shape (h, w))"""
+    h, w = img.shape[:2]
+    new_h, new_w = (new_shape, new_shape) if isinstance(new_shape, int) else new_shape
+    r = min(new_h / h, new_w / w)
+    unpad_w, unpad_h = int(round(w * r)), int(round(h * r))
+    dw, dh = new_w - unpad_w, new_h - unpad_h
+    if auto:
+        dw, dh = np.mod(dw, stride), np.mod(dh, stride)
+    dw, dh = dw / 2, dh / 2
+    if (w, h) != (unpad_w, unpad_h):
+        img = cv2.resize(img, (unpad_w, unpad_h), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return img, img.shape[:2]
+
+
+def scale_boxes(in_shape, boxes, out_shape):
+    """xyxy boxes from letterboxed input (h, w) back to the original image (h, w), clipped."""
+    gain = min(in_shape[0] / out_shape[0], in_shape[1] / out_shape[1])
+    pad_x = round((in_shape[1] - out_shape[1] * gain) / 2 - 0.1)
+    pad_y = round((in_shape[0] - out_shape[0] * gain) / 2 - 0.1)
+    boxes = boxes.copy()
+    boxes[:, [0, 2]] -= pad_x
+    boxes[:, [1, 3]] -= pad_y
+    boxes /= gain
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, out_shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, out_shape[0])
+    return boxes
+
+
+def nms(boxes, scores, iou_thr):
+    """Greedy NMS on xyxy boxes; returns kept indices, highest score first."""
+    order = np.argsort(-scores, kind="stable")
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    while len(order):
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        xx1 = np.maximum(boxes[i, 0], boxes[rest, 0]); yy1 = np.maximum(boxes[i, 1], boxes[rest, 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[rest, 2]); yy2 = np.minimum(boxes[i, 3], boxes[rest, 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_thr]
+    return np.array(keep, dtype=np.int64)
+
+
+def postprocess(pred, nc, conf):
+    """
+    One image's raw head output (4 + nc [+ 32], anchors) -> (xyxy, score, cls, mask coeffs or None)
+    in letterboxed input pixels.
+    """
+    x = pred.T
+    scores_all = x[:, 4:4+nc]
+    score = scores_all.max(axis=1)
+    keep = score > conf
+    x, score = x[keep], score[keep]
+    cls = scores_all[keep].argmax(axis=1)
+    order = np.argsort(-score, kind="stable")[:MAX_NMS]
+    x, score, cls = x[order], score[order], cls[order]
+    cx, cy, w, h = x[:, 0], x[:, 1], x[:, 2], x[:, 3]
+    xyxy = np.stack([cx - w/2, cy - h/2, cx + w/2, cy + h/2], axis=1)
+    i = nms(xyxy + cls[:, None] * MAX_WH, score, IOU_THR)[:MAX_DET]
+    coeffs = x[i, 4+nc:] if x.shape[1] > 4 + nc else None
+    return xyxy[i], score[i], cls[i], coeffs
+
+
+def process_masks(protos, coeffs, boxes, in_shape):
+    """
+    Prototype masks -> (n, h, w) 0/1 float32 masks at the letterboxed input size (ultralytics process_mask).
+    Works on the logits like ultralytics: crop, upsample, then > 0 (= sigmoid > 0.5); taking the
+    sigmoid first would blend cropped zeros into the box edges and shrink every mask.
+    """
+    c, mh, mw = protos.shape
+    masks = (coeffs @ protos.reshape(c, -1)).reshape(-1, mh, mw).astype(np.float32)
+    ih, iw = in_shape
+    db = boxes * np.array([mw / iw, mh / ih, mw / iw, mh / ih], dtype=np.float32)
+    cols = np.arange(mw, dtype=np.float32)[None, None, :]
+    rows = np.arange(mh, dtype=np.float32)[None, :, None]
+    inside = ((cols >= db[:, 0, None, None]) & (cols < db[:, 2, None, None]) &
+              (rows >= db[:, 1, None, None]) & (rows < db[:, 3, None, None]))
+    masks = masks * inside
+    up = [cv2.resize(m, (iw, ih), interpolation=cv2.INTER_LINEAR) for m in masks]
+    return (np.stack(up) > 0).astype(np.float32) if up else np.zeros((0, ih, iw), np.float32)
+
+
+# ------------------------------------------------------------
+# model
+# ------------------------------------------------------------
+class OnnxYOLO:
+    """model(frames, conf=...) -> list of inference.Results, like a loaded ultralytics YOLO."""
+    def __init__(self, onnx_path, threads=None):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("the onnx backends need onnxruntime (pip install onnxruntime)")
+        opts = ort.SessionOptions()
+        if threads:
+            opts.intra_op_num_threads = threads
+        self.onnx_path = onnx_path   # the file actually executed (part of the frame cache key)
+        self.session = ort.InferenceSession(onnx_path, opts, providers=["CPUExecutionProvider"])
+        meta = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(meta["names"]) if "names" in meta else {}
+        self.task = meta.get("task", "detect")
+        self.stride = int(meta.get("stride", 32))
+        imgsz = ast.literal_eval(meta["imgsz"]) if "imgsz" in meta else [640, 640]
+        self.imgsz = tuple(imgsz) if isinstance(imgsz, (list, tuple)) else (imgsz, imgsz)
+        self.input_name = self.session.get_inputs()[0].name
+        self.nc = len(self.names)
+
+    def __call__(self, frames, conf=0.25, **_):
+        if isinstance(frames, np.ndarray):
+            frames = [frames]
+        # ultralytics only letterboxes a batch to one rectangle when all frames share a shape
+        if len({f.shape for f in frames}) > 1:
+            return [self([f], conf)[0] for f in frames]
+        padded = [letterbox(f, self.imgsz, self.stride)[0] for f in frames]
+        in_shape = padded[0].shape[:2]
+        blob = np.stack([p[..., ::-1].transpose(2, 0, 1) for p in padded]).astype(np.float32) / 255.0
+        outs = self.session.run(None, {self.input_name: np.ascontiguousarray(blob)})
+        results = []
+        for k, frame in enumerate(frames):
+            xyxy, score, cls, coeffs = postprocess(outs[0][k], self.nc, conf)
+            masks = None
+            if self.task == "segment":
+                masks = Masks(process_masks(outs[1][k], coeffs, xyxy, in_shape) if coeffs is not None
+                              else np.zeros((0,) + in_shape, np.float32))
+                if not len(xyxy):
+                    masks = None   # ultralytics leaves masks unset when nothing was found
+            boxes = scale_boxes(in_shape, xyxy, frame.shape[:2])
+            results.append(Results(Boxes(boxes, cls, score), masks))
+        return results
+
+
+def load_onnx_models(obj_model_path, seg_model_path, quantize=False, threads=None):
+    """(obj_model, seg_model) on ONNX Runtime; seg_model is None when it cannot be exported / loaded."""
+    obj_model = OnnxYOLO(export_onnx(obj_model_path, quantize=quantize), threads)
+    seg_model = None
+    try:
+        seg_model = OnnxYOLO(export_onnx(seg_model_path, quantize=quantize), threads)
+    except Exception as e:
+        print(f"⚠ segmentation model not loaded ({e}); continuing without masks")
+    return obj_model, seg_model
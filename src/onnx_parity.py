@@ -0,0 +1,120 @@
+# src/onnx_parity.py
+"""
+Parity and speed check: ONNX Runtime backend vs the PyTorch ultralytics path.
+
+Runs both backends (detection + segmentation, no overlays) on the same frames and reports:
+ - object agreement: detections matched by label with IoU >= --iou, as
+   matched / max(torch count, onnx count) per frame and overall, plus mean |conf| difference
+ - pavement agreement: frames with identical mask_count, and total_mask_area relative difference
+ - ms/frame for each backend and the speedup
+
+PYTHONPATH=. python src/onnx_parity.py --frames frames/base --backend onnx-int8 --out results/onnx_parity.json
+(without --frames, synthetic_road.py frames are used)
+"""
+
+import os
+import json
+import time
+import argparse
+import itertools
+import numpy as np
+from src.detect_multiclass import load_models, analyze_batch, iter_folder_frames, iter_batches, OBJ_MODEL, SEG_MODEL, CONF_THR
+from src.lane_and_shoulder import FrameAnalyzer
+from src.synthetic_road import iter_road_frames
+from src.tracking import iou_matrix
+
+
+def run_backend(frames, backend, obj_model_path, seg_model_path, conf, batch_size):
+    obj_model, seg_model = load_models(obj_model_path, seg_model_path, backend)
+    analyzer = FrameAnalyzer()
+    # first call pays lazy init on both paths; keep it out of the timing
+    analyze_batch(frames[:1], obj_model, seg_model, conf, False, analyzer)
+    entries = []
+    t0 = time.perf_counter()
+    for batch in iter_batches(frames, batch_size):
+        entries += [e for e, _ in analyze_batch(batch, obj_model, seg_model, conf, False, analyzer)]
+    return entries, time.perf_counter() - t0
+
+
+def match_objects(a, b, iou_thr):
+    """Greedy same-label matching of two object lists -> (matched pairs count, conf diffs)"""
+    matched, diffs = 0, []
+    used = set()
+    for label in {o["label"] for o in a}:
+        ia = [i for i, o in enumerate(a) if o["label"] == label]
+        ib = [j for j, o in enumerate(b) if o["label"] == label and j not in used]
+        if not ib:
+            continue
+        iou = iou_matrix([a[i]["bbox"] for i in ia], [b[j]["bbox"] for j in ib])
+        for flat in np.argsort(-iou, axis=None):
+            r, c = divmod(int(flat), iou.shape[1])
+            if iou[r, c] < iou_thr:
+                break
+            if ia[r] is None or ib[c] in used:
+                continue
+            matched += 1
+            diffs.append(abs(a[ia[r]]["conf"] - b[ib[c]]["conf"]))
+            used.add(ib[c])
+            ia[r] = None
+    return matched, diffs
+
+
+def parity_report(ref, test, iou_thr=0.5):
+    total_matched = total_max = 0
+    per_frame, conf_diffs = [], []
+    same_masks, area_rel = 0, []
+    for e_ref, e_test in zip(ref, test):
+        m, d = match_objects(e_ref["objects"], e_test["objects"], iou_thr)
+        n = max(len(e_ref["objects"]), len(e_test["objects"]))
+        total_matched += m
+        total_max += n
+        per_frame.append(m / n if n else 1.0)
+        conf_diffs += d
+        pr, pt = e_ref["pavement"], e_test["pavement"]
+        same_masks += pr["mask_count"] == pt["mask_count"]
+        area_rel.append(abs(pt["total_mask_area"] - pr["total_mask_area"]) / max(pr["total_mask_area"], 1))
+    n = max(len(ref), 1)
+    return {
+        "frames": len(ref),
+        "object_agreement": round(total_matched / total_max, 4) if total_max else 1.0,
+        "mean_frame_agreement": round(float(np.mean(per_frame)), 4) if per_frame else 1.0,
+        "frames_fully_matched": int(sum(1 for p in per_frame if p == 1.0)),
+        "mean_conf_abs_diff": round(float(np.mean(conf_diffs)), 4) if conf_diffs else 0.0,
+        "mask_count_agreement": round(same_masks / n, 4),
+        "mean_mask_area_rel_diff": round(float(np.mean(area_rel)), 4) if area_rel else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--frames", default=None, help="frames folder (default: 30 synthetic frames)")
+    ap.add_argument("--limit", type=int, default=100)
+    ap.add_argument("--backend", choices=["onnx", "onnx-int8"], default="onnx")
+    ap.add_argument("--obj_model", default=OBJ_MODEL)
+    ap.add_argument("--seg_model", default=SEG_MODEL)
+    ap.add_argument("--conf", type=float, default=CONF_THR)
+    ap.add_argument("--batch-size", type=int, default=1)
+    ap.add_argument("--iou", type=float, default=0.5, help="IoU for two detections to count as the same object")
+    ap.add_argument("--out", default="results/onnx_parity.json")
+    args = ap.parse_args()
+
+    if args.frames:
+        frames = list(itertools.islice((f for _, f, _ in iter_folder_frames(args.frames)), args.limit))
+    else:
+        frames = list(iter_road_frames(min(args.limit, 30)))
+
+    ref, t_ref = run_backend(frames, "torch", args.obj_model, args.seg_model, args.conf, args.batch_size)
+    test, t_test = run_backend(frames, args.backend, args.obj_model, args.seg_model, args.conf, args.batch_size)
+    report = parity_report(ref, test, args.iou)
+    report.update({
+        "backend": args.backend,
+        "torch_ms_per_frame": round(t_ref / max(len(frames), 1) * 1000, 2),
+        f"{args.backend}_ms_per_frame": round(t_test / max(len(frames), 1) * 1000, 2),
+        "speedup": round(t_ref / max(t_test, 1e-9), 2),
+    })
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    for k, v in report.items():
+        print(f"{k:<26}{v}")
+    print("Saved:", args.out)
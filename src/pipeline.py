@@ -0,0 +1,317 @@
+# src/pipeline.py
+"""
+End-to-end pipeline runner: extract -> detect -> compare -> summarize -> report.
+
+Each stage declares its command (with its parameters), input paths (data, model weights,
+the script it runs and every src module it imports) and output paths. A stage's key is a hash of all of them; the stage is skipped
+when its key matches the last successful run and its outputs are still there, unchanged.
+Because downstream keys hash the upstream outputs, a rerun that reproduces the same
+file stops the cascade there. Stages run as soon as the stages producing their inputs
+are done, so base and present extraction/detection run side by side (--jobs).
+
+State (stage keys, output hashes, a stat cache so unchanged files are not re-read)
+lives in results/.pipeline_state.json; stage logs go to results/logs/<stage>.log.
+
+PYTHONPATH=. python src/pipeline.py --base input_videos/base.mp4 --present input_videos/present.mp4
+  --dry-run      show what would run
+  --force NAME   rerun a stage even if it is current ("all" for everything)
+  --until NAME   stop after this stage (and what it needs)
+--base / --present may also be frames folders; extraction is then skipped.
+"""
+
+import os
+import ast
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+STATE_PATH = "results/.pipeline_state.json"
+LOG_DIR = "results/logs"
+STAGE_ORDER = ("extract", "detect", "compare", "summarize", "report")
+
+
+
+# ------------------------------------------------------------
+# hashing
+# ------------------------------------------------------------
+def file_hash(path, cache):
+    """sha256 of a file; reuses the cached digest while size and mtime are unchanged."""
+    st = os.stat(path)
+    sig = [st.st_size, st.st_mtime_ns]
+    hit = cache.get(path)
+    if hit and hit[0] == sig:
+        return hit[1]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    cache[path] = [sig, h.hexdigest()]
+    return cache[path][1]
+
+
+def path_hash(path, cache):
+    """File digest, digest over (relative name, digest) of a folder's files, or "missing"."""
+    if os.path.isfile(path):
+        return file_hash(path, cache)
+    if not os.path.isdir(path):
+        return "missing"
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            full = os.path.join(root, name)
+            h.update(os.path.relpath(full, path).encode())
+            h.update(file_hash(full, cache).encode())
+    return h.hexdigest()
+
+
+def code_inputs(script):
+    """
+    The script plus every src module it imports, transitively (function-level imports
+    included, e.g. the optional backends), sorted; editing any of them makes the stage stale.
+    """
+    seen, todo = set(), [script]
+    while todo:
+        path = todo.pop()
+        if path in seen or not os.path.exists(path):
+            continue
+        seen.add(path)
+        with open(path) as f:
+            tree = ast.parse(f.read(), path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.ImportFrom) and node.module == "src":
+                todo += [f"src/{a.name}.py" for a in node.names]
+            elif isinstance(node, ast.ImportFrom) and (node.module or "").startswith("src."):
+                todo.append(node.module.replace(".", "/") + ".py")
+            elif isinstance(node, ast.Import):
+                todo += [a.name.replace(".", "/") + ".py" for a in node.names if a.name.startswith("src.")]
+    return sorted(seen)
+
+
+def stage_key(stage, cache):
+    # the interpreter path is left out so a new venv does not invalidate every stage
+    blob = json.dumps({"cmd": stage["cmd"][1:],
+                       "inputs": {p: path_hash(p, cache) for p in stage["inputs"]}}, sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def load_state(path=STATE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"stages": {}, "stat_cache": {}}
+
+
+def save_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp, path)
+
+
+def is_current(stage, key, state, cache):
+    prev = state["stages"].get(stage["name"])
+    if not prev or prev["key"] != key:
+        return False
+    return all(path_hash(p, cache) == prev["outputs"].get(p) for p in stage["outputs"])
+
+
+# ------------------------------------------------------------
+# stages
+# ------------------------------------------------------------
+def py(script, *args):
+    return [sys.executable, script] + [str(a) for a in args]
+
+
+def weights_inputs(path):
+    # weights that ultralytics downloads on first use are not on disk yet; their name is still in the cmd
+    return [path] if os.path.exists(path) else []
+
+
+def build_stages(args):
+    """Stage list in declaration order; dependencies follow from matching outputs to inputs."""
+    stages = []
+    frames = {}
+    for tag in ("base", "present"):
+        src = getattr(args, tag)
+        if os.path.isdir(src):
+            frames[tag] = src
+            continue
+        frames[tag] = f"frames/{tag}"
+        stages.append({"name": f"extract_{tag}", "kind": "extract",
+                       "cmd": py("src/extract_frames.py", src, "--out", frames[tag], "--fps", args.fps, "--mode", args.sample_mode),
+                       "inputs": [src] + code_inputs("src/extract_frames.py"),
+                       "outputs": [frames[tag]], "clean": True})
+
+    for tag in ("base", "present"):
+        cmd = py("src/detect_multiclass.py", "--frames", frames[tag], "--out", f"results/multi_{tag}.json",
+                 "--obj_model", args.obj_model, "--seg_model", args.seg_model, "--conf", args.conf,
+                 "--batch-size", args.batch_size, "--workers", args.workers, "--backend", args.backend,
+                 "--track-window", args.track_window, "--roi", args.roi)
+        cmd += ["--overlays", f"frames/overlays_{tag}"] if args.overlays else ["--no-overlays"]
+        stages.append({"name": f"detect_{tag}", "kind": "detect", "cmd": cmd,
+                       "inputs": [frames[tag]] + weights_inputs(args.obj_model) + weights_inputs(args.seg_model) + code_inputs("src/detect_multiclass.py"),
+                       "outputs": [f"results/multi_{tag}.json"]})
+
+    stages.append({"name": "compare", "kind": "compare",
+                   "cmd": py("src/align_and_compare_multi.py", "--base", "results/multi_base.json",
+                             "--present", "results/multi_present.json", "--out", "results/compare/multi_summary.json",
+                             "--pdf", "results/compare/multi_report.pdf", "--segment-size", args.segment_size),
+                   "inputs": ["results/multi_base.json", "results/multi_present.json"] + code_inputs("src/align_and_compare_multi.py"),
+                   "outputs": ["results/compare/multi_summary.json", "results/compare/multi_report.pdf"]})
+
+    stages.append({"name": "summarize", "kind": "summarize",
+                   "cmd": py("src/gemini_summary.py", "--summary", "results/compare/multi_summary.json",
+                             "--out", "results/compare/llm_summary.json", "--engine", args.summarizer),
+                   "inputs": ["results/compare/multi_summary.json"] + code_inputs("src/gemini_summary.py"),
+                   "outputs": ["results/compare/llm_summary.json"]})
+
+    # make_final_report reads fixed paths; metadata.json is optional and hashes as "missing" when absent
+    stages.append({"name": "report", "kind": "report",
+                   "cmd": py("src/make_final_report.py"),
+                   "inputs": ["results/compare/llm_summary.json", "results/compare/multi_summary.json",
+                              "results/compare/metadata.json"] + code_inputs("src/make_final_report.py"),
+                   "outputs": ["results/final_report.pdf"]})
+    return stages
+
+
+def dependencies(stages):
+    """{stage name: set of stage names producing one of its inputs}"""
+    producer = {out: s["name"] for s in stages for out in s["outputs"]}
+    return {s["name"]: {producer[p] for p in s["inputs"] if p in producer} for s in stages}
+
+
+def select(stages, until):
+    """Stages up to and including kind `until` (None = all)."""
+    if not until:
+        return stages
+    last = STAGE_ORDER.index(until)
+    return [s for s in stages if STAGE_ORDER.index(s["kind"]) <= last]
+
+
+def run_stage(stage):
+    """Runs one stage command with its output in results/logs/<name>.log -> (returncode, seconds)."""
+    if stage.get("clean"):
+        for out in stage["outputs"]:
+            if os.path.isdir(out):
+                shutil.rmtree(out)   # stale frames from an earlier run (other fps) must not leak into detection
+    os.makedirs(LOG_DIR, exist_ok=True)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.getcwd(), os.environ.get("PYTHONPATH")])))
+    t0 = time.perf_counter()
+    with open(os.path.join(LOG_DIR, f"{stage['name']}.log"), "w") as log:
+        log.write(" ".join(stage["cmd"]) + "\n\n")
+        log.flush()
+        rc = subprocess.call(stage["cmd"], stdout=log, stderr=subprocess.STDOUT, env=env)
+    return rc, time.perf_counter() - t0
+
+
+def log_tail(name, n=15):
+    with open(os.path.join(LOG_DIR, f"{name}.log"), errors="replace") as f:
+        return "".join(f.readlines()[-n:])
+
+
+# ------------------------------------------------------------
+# scheduler
+# ------------------------------------------------------------
+def run_pipeline(stages, jobs=2, force=(), dry_run=False):
+    """Runs stale stages, independent ones concurrently. Returns {stage name: status}."""
+    state = load_state()
+    cache = state.setdefault("stat_cache", {})
+    deps = dependencies(stages)
+    status = {}
+    pending = list(stages)
+    running = {}
+    t0 = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        while pending or running:
+            for s in list(pending):
+                name = s["name"]
+                dep_status = {status.get(d) for d in deps[name]}
+                if dep_status & {"failed", "blocked"}:
+                    pending.remove(s)
+                    status[name] = "blocked"
+                    print(f"⚠ {name}: skipped, an upstream stage failed")
+                    continue
+                if None in dep_status:
+                    continue   # an upstream stage is still running
+                pending.remove(s)
+                forced = "all" in force or name in force or s["kind"] in force
+                if dry_run and "would run" in dep_status:
+                    status[name] = "would run"
+                    print(f"▶ {name}: would run (upstream changes)")
+                    continue
+                key = stage_key(s, cache)
+                if not forced and is_current(s, key, state, cache):
+                    status[name] = "current"
+                    print(f"✔ {name}: up to date")
+                    continue
+                if dry_run:
+                    status[name] = "would run"
+                    print(f"▶ {name}: would run")
+                    continue
+                print(f"▶ {name}: running ({' '.join(s['cmd'][1:])})")
+                running[pool.submit(run_stage, s)] = (s, key)
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                s, key = running.pop(fut)
+                name = s["name"]
+                rc, sec = fut.result()
+                missing = [p for p in s["outputs"] if not os.path.exists(p)]
+                if rc != 0 or missing:
+                    status[name] = "failed"
+                    state["stages"].pop(name, None)
+                    reason = f"exit code {rc}" if rc else f"missing outputs {missing}"
+                    print(f"⚠ {name}: failed ({reason}) after {sec:.1f}s; log {LOG_DIR}/{name}.log\n{log_tail(name)}")
+                else:
+                    status[name] = "ran"
+                    state["stages"][name] = {"key": key, "seconds": round(sec, 2),
+                                             "outputs": {p: path_hash(p, cache) for p in s["outputs"]}}
+                    print(f"✔ {name}: done in {sec:.1f}s")
+                save_state(state)
+
+    if not dry_run:
+        state["stat_cache"] = {p: v for p, v in cache.items() if os.path.exists(p)}
+        save_state(state)
+    ran = sum(1 for v in status.values() if v == "ran")
+    skipped = sum(1 for v in status.values() if v == "current")
+    print(f"Pipeline finished in {time.perf_counter() - t0:.1f}s: {ran} ran, {skipped} up to date, "
+          f"{sum(1 for v in status.values() if v in ('failed', 'blocked'))} failed/blocked")
+    return status
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--base", required=True, help="base video or frames folder")
+    ap.add_argument("--present", required=True, help="present video or frames folder")
+    ap.add_argument("--fps", type=float, default=1)
+    ap.add_argument("--sample_mode", default="grab", help="frame sampler (see extract_frames.py --mode)")
+    ap.add_argument("--obj_model", default="yolov8n.pt")
+    ap.add_argument("--seg_model", default="best.pt")
+    ap.add_argument("--conf", type=float, default=0.25)
+    ap.add_argument("--batch-size", type=int, default=1)
+    ap.add_argument("--workers", type=int, default=1, help="detection worker processes per run")
+    ap.add_argument("--backend", default="torch", help="detection backend (see detect_multiclass.py)")
+    ap.add_argument("--track-window", type=int, default=5)
+    ap.add_argument("--roi", default="none")
+    ap.add_argument("--overlays", action="store_true", help="write overlays to frames/overlays_<run>")
+    ap.add_argument("--segment-size", type=float, default=50)
+    ap.add_argument("--summarizer", choices=["gemini", "rules"], default="gemini", help="rules: offline rule_summary.py")
+    ap.add_argument("--jobs", type=int, default=2, help="stages run at the same time")
+    ap.add_argument("--force", nargs="*", default=[], help='stage names or kinds to rerun, or "all"')
+    ap.add_argument("--until", choices=STAGE_ORDER, default=None)
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+
+    status = run_pipeline(select(build_stages(args), args.until), args.jobs, set(args.force), args.dry_run)
+    sys.exit(1 if any(v in ("failed", "blocked") for v in status.values()) else 0)
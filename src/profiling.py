@@ -0,0 +1,182 @@
+# src/profiling.py
+"""
+Per-stage timing for the pipeline scripts (--profile / --trace on each CLI).
+
+    with profiling.stage("obj_yolo", frames=len(batch)):
+        results = obj_model(batch)
+
+records wall time and CPU time (of the calling thread) per stage, the number of
+frames it covered and the process' peak RSS. report() prints a summary table and,
+with a trace path, writes Chrome trace-event JSON (open in chrome://tracing or Perfetto).
+
+Disabled (the default) stage() returns one shared no-op context manager, so the
+cost is a function call and a flag check per stage.
+Worker processes collect() their numbers and the parent merge()s them.
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+
+try:
+    import resource
+except ImportError:   # Windows
+    resource = None
+
+_enabled = False
+_trace = False
+_stats = {}      # stage -> [calls, frames, wall_s, cpu_s, max_wall_s]
+_events = []     # Chrome trace events
+_child_rss = 0.0
+_lock = threading.Lock()
+# perf_counter -> epoch seconds, so events from worker processes share one time axis
+_EPOCH = time.time() - time.perf_counter()
+
+
+class _Null:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _Null()
+
+
+class _Stage:
+    __slots__ = ("name", "frames", "args", "w0", "c0")
+
+    def __init__(self, name, frames, args):
+        self.name, self.frames, self.args = name, frames, args
+
+    def __enter__(self):
+        self.w0 = time.perf_counter()
+        self.c0 = time.thread_time()
+        return self
+
+    def __exit__(self, *exc):
+        _record(self.name, self.frames, time.perf_counter() - self.w0, time.thread_time() - self.c0, self.w0, self.args)
+        return False
+
+
+def enable(trace=False):
+    global _enabled, _trace
+    _enabled = True
+    _trace = _trace or trace
+
+
+def enabled():
+    return _enabled
+
+
+def settings():
+    """enable() kwargs reproducing this process' setup in a worker, or None when disabled."""
+    return {"trace": _trace} if _enabled else None
+
+
+def stage(name, frames=1, **args):
+    """Context manager timing one stage; frames = how many frames it covered (for per-frame means)."""
+    if not _enabled:
+        return _NULL
+    return _Stage(name, frames, args)
+
+
+def timed_iter(name, iterable):
+    """Times each next() of an iterable as stage `name` (e.g. frame decoding inside a generator)."""
+    if not _enabled:
+        return iterable
+    return _timed_iter(name, iterable)
+
+
+def _timed_iter(name, iterable):
+    it = iter(iterable)
+    while True:
+        w0, c0 = time.perf_counter(), time.thread_time()
+        try:
+            item = next(it)
+        except StopIteration:
+            return
+        _record(name, 1, time.perf_counter() - w0, time.thread_time() - c0, w0, None)
+        yield item
+
+
+def _record(name, frames, wall, cpu, w0, args):
+    with _lock:
+        s = _stats.get(name)
+        if s is None:
+            s = _stats[name] = [0, 0, 0.0, 0.0, 0.0]
+        s[0] += 1
+        s[1] += frames
+        s[2] += wall
+        s[3] += cpu
+        s[4] = max(s[4], wall)
+        if _trace:
+            _events.append({"name": name, "cat": "stage", "ph": "X",
+                            "ts": round((w0 + _EPOCH) * 1e6, 1), "dur": round(wall * 1e6, 1),
+                            "pid": os.getpid(), "tid": threading.get_ident(),
+                            "args": dict(args, frames=frames) if args else {"frames": frames}})
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where unsupported)."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024   # bytes on macOS, KB on Linux
+
+
+def collect():
+    """Snapshot of this process' numbers (picklable), then reset. Used by worker processes."""
+    with _lock:
+        snap = {"stats": {k: list(v) for k, v in _stats.items()}, "events": list(_events), "peak_rss_mb": peak_rss_mb()}
+        _stats.clear()
+        _events.clear()
+    return snap
+
+
+def merge(snap):
+    """Adds a worker snapshot from collect()."""
+    global _child_rss
+    if not snap:
+        return
+    with _lock:
+        for k, (calls, frames, wall, cpu, mx) in snap["stats"].items():
+            s = _stats.setdefault(k, [0, 0, 0.0, 0.0, 0.0])
+            s[0] += calls; s[1] += frames; s[2] += wall; s[3] += cpu; s[4] = max(s[4], mx)
+        _events.extend(snap["events"])
+        _child_rss = max(_child_rss, snap["peak_rss_mb"] or 0.0)
+
+
+def summary_table():
+    rows = sorted(_stats.items(), key=lambda kv: -kv[1][2])
+    total_wall = sum(s[2] for _, s in rows) or 1e-9
+    lines = [f"{'stage':<18}{'calls':>8}{'frames':>8}{'wall s':>10}{'ms/frame':>10}{'cpu ms/frame':>13}{'cpu s':>10}{'cpu/wall':>9}{'max ms':>9}{'share':>7}"]
+    for name, (calls, frames, wall, cpu, mx) in rows:
+        lines.append(f"{name:<18}{calls:>8}{frames:>8}{wall:>10.2f}{wall / max(frames, 1) * 1000:>10.2f}"
+                     f"{cpu / max(frames, 1) * 1000:>13.2f}{cpu:>10.2f}{cpu / max(wall, 1e-9):>9.2f}{mx * 1000:>9.1f}{wall / total_wall * 100:>6.1f}%")
+    rss = peak_rss_mb()
+    if rss is not None:
+        lines.append(f"peak RSS: {rss:.0f} MB" + (f" (largest worker: {_child_rss:.0f} MB)" if _child_rss else ""))
+    return "\n".join(lines)
+
+
+def write_trace(path):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"traceEvents": _events, "displayTimeUnit": "ms"}, f)
+
+
+def report(trace_path=None):
+    """Prints the summary table and writes the Chrome trace (no-op when profiling is off)."""
+    if not _enabled:
+        return
+    print("\n⏱ Stage timings (share = part of all recorded stage time; nested stages count in both)")
+    print(summary_table())
+    if trace_path:
+        write_trace(trace_path)
+        print("Trace saved:", trace_path)
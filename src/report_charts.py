@@ -0,0 +1,158 @@
+# src/report_charts.py
+"""
+Vector charts drawn straight onto a reportlab canvas (no matplotlib, no PNG files).
+
+ - bar_pair_chart: base vs present bars for one factor (make_final_report chart page)
+ - line_chart: one or more series over segments; a single path per series, so
+   hundreds of segments cost about as much as ten
+chart_factors / segment_series pull the plotted numbers out of multi_summary.json,
+so the dashboard plots exactly what the PDF shows.
+"""
+
+from reportlab.lib.colors import HexColor, black, lightgrey
+
+BASE_COLOR = HexColor("#2c7bb6")
+PRESENT_COLOR = HexColor("#527de1")
+CHANGE_COLOR = HexColor("#d7191c")
+MAX_X_TICKS = 8
+
+
+# ------------------------------------------------------------
+# data
+# ------------------------------------------------------------
+def chart_factors(summary):
+    """[(title, base, present)] for the whole-run factors"""
+    signs = summary["signs"]
+    factors = [
+        ("Pavement Area", summary["pavement"]["avg_base_area"], summary["pavement"]["avg_present_area"]),
+        ("Lane Line Count", summary["lane"]["avg_base_lines"], summary["lane"]["avg_present_lines"]),
+        ("Lane Fade Score", summary["lane"]["avg_base_fade"], summary["lane"]["avg_present_fade"]),
+        ("Shoulder Erosion", summary["shoulder"]["avg_base_erosion"], summary["shoulder"]["avg_present_erosion"]),
+        ("Road Signs Count", signs["base_sign_count"], signs["present_sign_count"]),
+    ]
+    if "base_unique_signs" in signs:
+        factors.append(("Unique Road Signs", signs["base_unique_signs"], signs["present_unique_signs"]))
+    return factors
+
+
+def segment_series(segments):
+    """[(title, [(name, values, color), ...])] per plotted metric, from summary["segments"]"""
+    col = lambda k: [s[k] for s in segments]
+    return [
+        ("Pavement Area", [("Base", col("avg_base_area"), BASE_COLOR), ("Present", col("avg_present_area"), CHANGE_COLOR)]),
+        ("Lane Line Count", [("Base", col("avg_base_lines"), BASE_COLOR), ("Present", col("avg_present_lines"), CHANGE_COLOR)]),
+        ("Lane Fade Change", [("Present - Base", col("fade_change"), CHANGE_COLOR)]),
+        ("Shoulder Erosion Change", [("Present - Base", col("erosion_change"), CHANGE_COLOR)]),
+        ("Road Signs", [("Base", col("base_sign_count"), BASE_COLOR), ("Present", col("present_sign_count"), CHANGE_COLOR)]),
+    ]
+
+
+# ------------------------------------------------------------
+# drawing helpers
+# ------------------------------------------------------------
+def nice_step(span, ticks=4):
+    """Round tick step (1, 2, 2.5, 5 x 10^k) covering span in about `ticks` steps."""
+    if span <= 0:
+        return 1
+    raw = span / ticks
+    mag = 1.0
+    while mag * 10 <= raw:
+        mag *= 10
+    while mag > raw:
+        mag /= 10
+    for m in (1, 2, 2.5, 5, 10):
+        if m * mag >= raw:
+            return m * mag
+    return 10 * mag
+
+
+def fmt(v):
+    return f"{v:.0f}" if abs(v) >= 100 or float(v).is_integer() else f"{v:.3g}"
+
+
+def draw_frame(c, x, y, w, h, title, lo, hi):
+    """Title, y gridlines and labels for a plot area at (x, y) of size w x h; returns the y -> page mapper."""
+    step = nice_step(hi - lo)
+    lo = step * (lo // step)
+    hi = max(lo + step, step * -(-hi // step))
+    to_y = lambda v: y + (v - lo) / (hi - lo) * h
+
+    c.setFont("Helvetica-Bold", 11)
+    c.setFillColor(black)
+    c.drawString(x, y + h + 8, title)
+    c.setFont("Helvetica", 7)
+    c.setLineWidth(0.3)
+    v = lo
+    while v <= hi + step / 2:
+        c.setStrokeColor(lightgrey)
+        c.line(x, to_y(v), x + w, to_y(v))
+        c.drawRightString(x - 3, to_y(v) - 2, fmt(v))
+        v += step
+    c.setStrokeColor(black)
+    c.line(x, y, x, y + h)
+    c.line(x, to_y(0) if lo < 0 else y, x + w, to_y(0) if lo < 0 else y)
+    return to_y
+
+
+def bar_pair_chart(c, x, y, w, h, title, base, present):
+    """Base / present bars with value labels in the box (x, y, w, h)."""
+    plot_x, plot_w = x + 30, w - 40
+    to_y = draw_frame(c, plot_x, y + 14, plot_w, h - 34, title, min(0, base, present), max(base, present, 0) * 1.1)
+    bar_w = plot_w / 5
+    c.setFont("Helvetica", 8)
+    for i, (label, v, color) in enumerate((("Base", base, BASE_COLOR), ("Present", present, PRESENT_COLOR))):
+        bx = plot_x + plot_w * (0.25 + 0.5 * i) - bar_w / 2
+        y0, y1 = to_y(0), to_y(v)
+        c.setFillColor(color)
+        c.rect(bx, min(y0, y1), bar_w, abs(y1 - y0), stroke=0, fill=1)
+        c.setFillColor(black)
+        c.drawCentredString(bx + bar_w / 2, max(y0, y1) + 2, fmt(v))
+        c.drawCentredString(bx + bar_w / 2, y + 2, label)
+
+
+def line_chart(c, x, y, w, h, title, series, x_labels=None, x_title="segment"):
+    """
+    series: [(name, values, color)], all the same length. One path per series;
+    x ticks are thinned to MAX_X_TICKS labels (x_labels, or the point index).
+    """
+    n = max(len(v) for _, v, _ in series)
+    if not n:
+        return
+    values = [v for _, vals, _ in series for v in vals]
+    plot_x, plot_w = x + 30, w - 40
+    plot_y, plot_h = y + 22, h - 50
+    to_y = draw_frame(c, plot_x, plot_y, plot_w, plot_h, title, min(0, min(values)), max(0, max(values)))
+    to_x = lambda i: plot_x + (plot_w * i / (n - 1) if n > 1 else plot_w / 2)
+
+    c.setLineWidth(0.8 if n > 100 else 1.2)
+    for name, vals, color in series:
+        c.setStrokeColor(color)
+        if len(vals) == 1:
+            c.setFillColor(color)
+            c.circle(to_x(0), to_y(vals[0]), 1.5, stroke=0, fill=1)
+            continue
+        p = c.beginPath()
+        p.moveTo(to_x(0), to_y(vals[0]))
+        for i in range(1, len(vals)):
+            p.lineTo(to_x(i), to_y(vals[i]))
+        c.drawPath(p, stroke=1, fill=0)
+
+    c.setFillColor(black)
+    c.setFont("Helvetica", 7)
+    labels = x_labels if x_labels is not None else list(range(n))
+    every = max(1, -(-n // MAX_X_TICKS))
+    for i in range(0, n, every):
+        c.drawCentredString(to_x(i), plot_y - 9, str(labels[i]))
+    c.drawRightString(plot_x + plot_w, plot_y - 18, x_title)
+
+    # legend, right-aligned on the title line
+    lx, ly = plot_x + plot_w, plot_y + plot_h + 8
+    c.setLineWidth(2)
+    for name, _, color in reversed(series):
+        lx -= c.stringWidth(name, "Helvetica", 7)
+        c.drawString(lx, ly, name)
+        c.setStrokeColor(color)
+        c.line(lx - 15, ly + 2.5, lx - 3, ly + 2.5)
+        lx -= 25
+    c.setStrokeColor(black)
+    c.setLineWidth(1)
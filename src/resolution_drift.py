@@ -0,0 +1,113 @@
+# src/resolution_drift.py
+"""
+Validation report for FrameAnalyzer(work_width=...).
+Runs the lane/shoulder heuristics at full resolution and at each working width
+on the same frames, and reports how far every metric drifts plus the speedup.
+
+PYTHONPATH=. python src/resolution_drift.py --frames frames/base --widths 480 640 960 --out results/resolution_drift.json
+"""
+
+import os
+import json
+import time
+import argparse
+import cv2
+import numpy as np
+from src.extract_frames import iter_frames
+from src.lane_and_shoulder import FrameAnalyzer
+
+
+def load_frames(frames=None, video=None, fps=1.0, limit=200):
+    out = []
+    if video:
+        for _, _, f in iter_frames(video, fps):
+            out.append(f)
+            if len(out) >= limit:
+                break
+        return out
+    for fname in sorted(os.listdir(frames)):
+        if not fname.lower().endswith((".jpg", ".png", ".webp")) or fname.endswith(("_multi.jpg", "_multi.png", "_multi.webp")):
+            continue
+        f = cv2.imread(os.path.join(frames, fname))
+        if f is not None:
+            out.append(f)
+        if len(out) >= limit:
+            break
+    return out
+
+
+def run(analyzer, frames):
+    rows = []
+    t0 = time.perf_counter()
+    for f in frames:
+        lane, sh = analyzer.analyze(f)
+        rows.append((lane["line_count"], lane["faded_score"], sh["erosion_score"], sh["shoulder_present"]))
+    elapsed = time.perf_counter() - t0
+    return np.array(rows, dtype=np.float64).reshape(-1, 4), elapsed
+
+
+def drift_report(frames, widths):
+    full, t_full = run(FrameAnalyzer(), frames)
+    report = {
+        "frames": len(frames),
+        "full_resolution": {
+            "ms_per_frame": round(t_full / max(len(frames), 1) * 1000, 2),
+            "mean_line_count": round(float(full[:, 0].mean()), 3) if len(full) else 0,
+            "mean_faded_score": round(float(full[:, 1].mean()), 4) if len(full) else 0,
+            "mean_erosion_score": round(float(full[:, 2].mean()), 4) if len(full) else 0,
+        },
+        "widths": {},
+    }
+    for width in widths:
+        res, t = run(FrameAnalyzer(work_width=width), frames)
+        if not len(res):
+            continue
+        diff = res - full
+        report["widths"][str(width)] = {
+            "ms_per_frame": round(t / len(frames) * 1000, 2),
+            "speedup": round(t_full / max(t, 1e-9), 2),
+            "line_count": {
+                "mean_abs_diff": round(float(np.abs(diff[:, 0]).mean()), 3),
+                "bias": round(float(diff[:, 0].mean()), 3),
+                "mean_rel_diff": round(float((np.abs(diff[:, 0]) / np.maximum(full[:, 0], 1)).mean()), 4),
+            },
+            "faded_score": {
+                "mean_abs_diff": round(float(np.abs(diff[:, 1]).mean()), 4),
+                "max_abs_diff": round(float(np.abs(diff[:, 1]).max()), 4),
+                "bias": round(float(diff[:, 1].mean()), 4),
+            },
+            "erosion_score": {
+                "mean_abs_diff": round(float(np.abs(diff[:, 2]).mean()), 4),
+                "max_abs_diff": round(float(np.abs(diff[:, 2]).max()), 4),
+                "bias": round(float(diff[:, 2].mean()), 4),
+            },
+            "shoulder_present_agreement": round(float((res[:, 3] == full[:, 3]).mean()), 4),
+        }
+    return report
+
+
+def print_report(report):
+    print(f"Frames: {report['frames']}   full-res: {report['full_resolution']['ms_per_frame']} ms/frame")
+    print(f"{'width':>6} {'speedup':>8} {'lines |d|':>10} {'lines rel':>10} {'fade |d|':>9} {'eros |d|':>9} {'shoulder=':>10}")
+    for width, r in report["widths"].items():
+        print(f"{width:>6} {r['speedup']:>8} {r['line_count']['mean_abs_diff']:>10} {r['line_count']['mean_rel_diff']:>10} "
+              f"{r['faded_score']['mean_abs_diff']:>9} {r['erosion_score']['mean_abs_diff']:>9} {r['shoulder_present_agreement']:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--frames", help="frames folder")
+    src.add_argument("--video", help="video file")
+    parser.add_argument("--fps", type=float, default=1)
+    parser.add_argument("--limit", type=int, default=200, help="max frames to compare")
+    parser.add_argument("--widths", type=int, nargs="+", default=[480, 640, 960])
+    parser.add_argument("--out", default="results/resolution_drift.json")
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames, args.video, args.fps, args.limit)
+    report = drift_report(frames, args.widths)
+    print_report(report)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    json.dump(report, open(args.out, "w"), indent=2)
+    print("Saved:", args.out)
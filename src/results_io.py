@@ -0,0 +1,300 @@
+# src/results_io.py
+"""
+Reading / writing per-frame detection results in several layouts.
+
+ - .json     nested {frame: {"objects": [...], "pavement": {...}, "lane": {...}, "shoulder": {...}}};
+             entries of video runs also carry "timestamp" (seconds), folder runs keep exactly this shape
+ - .jsonl    one line per frame, {"frame", "index", "timestamp", ...entry}, written as frames
+             are processed (constant memory); load_tables reads it line by line straight
+             into columns, so only the scalars are held, never the nested entries
+ - .npz      columnar, one compressed numpy archive
+ - .parquet  columnar, a directory holding frames.parquet + objects.parquet
+             (needs a pandas parquet engine such as pyarrow)
+
+The columnar layouts hold two tables:
+ - frames:  one row per frame; "frame" (+ "index"/"timestamp" when known) plus every scalar
+            of pavement/lane/shoulder as dotted columns ("pavement.total_mask_area", ...)
+ - objects: one row per object detection; frame, label, conf, x1, y1, x2, y2, track_id
+            (track_id -1 when the run was not tracked)
+List-valued extras (ROI mode "roi" / "pavement.boxes") are only kept in JSON.
+"""
+
+import os
+import json
+import numpy as np
+import pandas as pd
+
+SECTIONS = ("pavement", "lane", "shoulder")
+OBJECT_COLUMNS = ["frame", "label", "conf", "x1", "y1", "x2", "y2", "track_id"]
+
+
+def result_format(path):
+    ext = os.path.splitext(path.rstrip("/"))[1].lower()
+    return {".npz": "npz", ".parquet": "parquet", ".jsonl": "jsonl"}.get(ext, "json")
+
+
+def require_parquet_engine():
+    """Fails early (before a long run, not at the final write) when pandas has no parquet engine."""
+    for mod in ("pyarrow", "fastparquet"):
+        try:
+            __import__(mod)
+            return
+        except ImportError:
+            pass
+    raise ImportError(".parquet results need a parquet engine: pip install pyarrow "
+                      "(or write .npz / .jsonl instead)")
+
+
+# ------------------------------------------------------------
+# nested <-> tables
+# ------------------------------------------------------------
+def frame_scalars(entry):
+    """(column, value) for every scalar of an entry: index/timestamp and the dotted section values"""
+    for k in ("index", "timestamp"):
+        if entry.get(k) is not None:
+            yield k, entry[k]
+    for sec in SECTIONS:
+        for k, v in (entry.get(sec) or {}).items():
+            if isinstance(v, (bool, int, float, np.integer, np.floating)):
+                yield f"{sec}.{k}", v
+
+
+def object_rows(fname, entry):
+    for o in entry.get("objects", []):
+        x1, y1, x2, y2 = o["bbox"]
+        tid = o.get("track_id")
+        yield fname, o["label"], o["conf"], x1, y1, x2, y2, -1 if tid is None else tid
+
+
+def to_tables(results):
+    """{frame: entry} (or an iterable of (frame, entry) pairs) -> (frames_df, objects_df)"""
+    frame_rows, obj_rows = [], []
+    items = results.items() if isinstance(results, dict) else results
+    for fname, entry in items:
+        row = {"frame": fname}
+        row.update(frame_scalars(entry))
+        frame_rows.append(row)
+        obj_rows.extend(object_rows(fname, entry))
+    frames_df = pd.DataFrame(frame_rows)
+    if frames_df.empty:
+        frames_df = pd.DataFrame(columns=["frame"])
+    objects_df = pd.DataFrame(obj_rows, columns=OBJECT_COLUMNS)
+    return frames_df, objects_df
+
+
+def _py(v):
+    return v.item() if isinstance(v, np.generic) else v
+
+
+def from_tables(frames_df, objects_df):
+    """(frames_df, objects_df) -> {frame: entry}, in frames_df row order"""
+    results = {}
+    cols = [c for c in frames_df.columns if "." in c]
+    top = [c for c in ("index", "timestamp") if c in frames_df.columns]
+    for rec in frames_df.to_dict("records"):
+        entry = {"objects": [], "pavement": {}, "lane": {}, "shoulder": {}}
+        for c in top:
+            entry[c] = _py(rec[c])
+        for c in cols:
+            v = rec[c]
+            if v is None or (isinstance(v, float) and np.isnan(v)):
+                continue
+            sec, key = c.split(".", 1)
+            entry.setdefault(sec, {})[key] = _py(v)
+        results[rec["frame"]] = entry
+    if "track_id" not in objects_df.columns:
+        # tables written before tracking existed
+        objects_df = objects_df.assign(track_id=-1)
+    for fname, label, conf, x1, y1, x2, y2, tid in objects_df[OBJECT_COLUMNS].itertuples(index=False):
+        if fname in results:
+            obj = {"label": label, "conf": float(conf), "bbox": [int(x1), int(y1), int(x2), int(y2)]}
+            if tid >= 0:
+                obj["track_id"] = int(tid)
+            results[fname]["objects"].append(obj)
+    return results
+
+
+# ------------------------------------------------------------
+# write
+# ------------------------------------------------------------
+class JsonlWriter:
+    """Writes one JSON line per frame as results arrive, flushing every flush_every lines."""
+    def __init__(self, path, flush_every=50):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.flush_every = max(1, flush_every)
+        self.count = 0
+        self.f = open(path, "w")
+
+    def add(self, fname, entry, timestamp=None):
+        rec = {"frame": fname, "index": self.count,
+               "timestamp": round(timestamp, 3) if timestamp is not None else None}
+        rec.update(entry)
+        self.f.write(json.dumps(rec) + "\n")
+        self.count += 1
+        if self.count % self.flush_every == 0:
+            self.f.flush()
+
+    def close(self):
+        """Nothing is kept in memory, so there is no results dict to return."""
+        self.f.close()
+        return None
+
+
+class ResultsCollector:
+    """Keeps every entry in memory and writes the whole file at close() (.json / .npz / .parquet)."""
+    def __init__(self, path):
+        if result_format(path) == "parquet":
+            require_parquet_engine()
+        self.path = path
+        self.results = {}
+        self.count = 0
+
+    def add(self, fname, entry, timestamp=None):
+        # the timestamp gives every layout a "t" for time/distance segments; only added when known,
+        # so folder runs keep the plain nested JSON shape
+        if timestamp is not None:
+            entry = dict({"timestamp": round(timestamp, 3)}, **entry)
+        self.results[fname] = entry
+        self.count += 1
+
+    def close(self):
+        write_results(self.results, self.path)
+        return self.results
+
+
+def open_sink(path, flush_every=50):
+    """Streaming JsonlWriter for .jsonl, otherwise a ResultsCollector."""
+    if result_format(path) == "jsonl":
+        return JsonlWriter(path, flush_every)
+    return ResultsCollector(path)
+
+
+def write_results(results, path):
+    """Writes results in the layout implied by the file extension."""
+    os.makedirs(os.path.dirname(path.rstrip("/")) or ".", exist_ok=True)
+    fmt = result_format(path)
+    if fmt == "json":
+        json.dump(results, open(path, "w"), indent=2)
+        return
+    if fmt == "jsonl":
+        sink = JsonlWriter(path)
+        for fname, entry in results.items():
+            sink.add(fname, {k: v for k, v in entry.items() if k not in ("index", "timestamp")}, entry.get("timestamp"))
+        sink.close()
+        return
+    frames_df, objects_df = to_tables(results)
+    if fmt == "parquet":
+        require_parquet_engine()
+        os.makedirs(path, exist_ok=True)
+        frames_df.to_parquet(os.path.join(path, "frames.parquet"), index=False)
+        objects_df.to_parquet(os.path.join(path, "objects.parquet"), index=False)
+        return
+    arrays = {}
+    for prefix, df in (("frames", frames_df), ("objects", objects_df)):
+        for c in df.columns:
+            arr = df[c].to_numpy()
+            # object (and pandas string-dtype) columns become fixed-width str so no pickle is needed
+            arrays[f"{prefix}/{c}"] = arr.astype(str) if arr.dtype == object else arr
+    np.savez_compressed(path, **arrays)
+
+
+# ------------------------------------------------------------
+# read
+# ------------------------------------------------------------
+def _tables_from_npz(path):
+    data = np.load(path, allow_pickle=False)
+    cols = {"frames": {}, "objects": {}}
+    for key in data.files:
+        prefix, c = key.split("/", 1)
+        cols[prefix][c] = data[key]
+    frames_df = pd.DataFrame(cols["frames"]) if cols["frames"] else pd.DataFrame(columns=["frame"])
+    objects_df = pd.DataFrame(cols["objects"]) if cols["objects"] else pd.DataFrame(columns=OBJECT_COLUMNS)
+    return frames_df, objects_df
+
+
+def _tables_from_jsonl(path):
+    """
+    Streams a .jsonl file into the two tables column by column: each line is parsed,
+    its scalars appended to per-column lists and the entry dropped.
+    """
+    cols = {"frame": []}
+    objs = []
+    n = 0
+    for fname, entry in iter_records(path):
+        cols["frame"].append(fname)
+        for key, v in frame_scalars(entry):
+            col = cols.get(key)
+            if col is None:
+                col = cols[key] = [None] * n   # column first seen on this line
+            col.append(v)
+        n += 1
+        for col in cols.values():
+            if len(col) < n:
+                col.append(None)
+        objs.extend(object_rows(fname, entry))
+    return pd.DataFrame(cols), pd.DataFrame(objs, columns=OBJECT_COLUMNS)
+
+
+def iter_records(path):
+    """Streams (frame, entry) pairs from a .jsonl file; entry keeps its index/timestamp."""
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            rec = json.loads(line)
+            yield rec.pop("frame"), rec
+
+
+class StreamedResults:
+    """
+    Read-only, dict-like view of a .jsonl results file. Every values()/items() call
+    streams the file again instead of holding all frames in memory.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def items(self):
+        return iter_records(self.path)
+
+    def values(self):
+        return (entry for _, entry in iter_records(self.path))
+
+    def keys(self):
+        return (fname for fname, _ in iter_records(self.path))
+
+    def __iter__(self):
+        return self.keys()
+
+    def __len__(self):
+        return sum(1 for _ in self.keys())
+
+
+def load_tables(path):
+    """Any supported layout -> (frames_df, objects_df)"""
+    fmt = result_format(path)
+    if fmt == "jsonl":
+        return _tables_from_jsonl(path)
+    if fmt == "parquet":
+        require_parquet_engine()
+        return (pd.read_parquet(os.path.join(path, "frames.parquet")),
+                pd.read_parquet(os.path.join(path, "objects.parquet")))
+    if fmt == "npz":
+        return _tables_from_npz(path)
+    with open(path) as f:
+        return to_tables(json.load(f))
+
+
+def load_results(path, stream=False):
+    """
+    Any supported layout -> nested {frame: entry}.
+    stream=True returns a StreamedResults view for .jsonl files instead of loading them.
+    """
+    fmt = result_format(path)
+    if fmt == "json":
+        with open(path) as f:
+            return json.load(f)
+    if fmt == "jsonl":
+        return StreamedResults(path) if stream else dict(iter_records(path))
+    return from_tables(*load_tables(path))
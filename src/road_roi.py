@@ -0,0 +1,143 @@
+# src/road_roi.py
+"""
+Road region of interest for dashcam frames.
+
+The top 30-40% of a dashcam frame is sky and roadside. Pavement segmentation
+and the lane search only need the road, so process_frames / detect_lane_markings
+can restrict them to a trapezoid:
+ - static:  RoadROI.trapezoid(top=0.4, top_width=0.3, bottom_width=1.0)
+ - auto:    estimate_roi(frames) from the vanishing point of lane-like lines
+The ROI is stored in normalized coordinates so one object fits any frame size.
+"""
+
+import itertools
+import cv2
+import numpy as np
+
+AUTO_FRAMES = 30
+
+
+class RoadROI:
+    def __init__(self, points):
+        """points: polygon as [(x, y), ...] in 0..1 frame coordinates"""
+        self.points = [(float(x), float(y)) for x, y in points]
+
+    @classmethod
+    def trapezoid(cls, top=0.4, top_width=0.3, bottom_width=1.0, center=0.5):
+        """Trapezoid from y=top to the bottom edge, centred on x=center (all fractions of the frame)."""
+        tl, tr = center - top_width / 2, center + top_width / 2
+        bl, br = center - bottom_width / 2, center + bottom_width / 2
+        clip = lambda v: min(1.0, max(0.0, v))
+        return cls([(clip(tl), top), (clip(tr), top), (clip(br), 1.0), (clip(bl), 1.0)])
+
+    def to_dict(self):
+        return {"points": [[round(x, 4), round(y, 4)] for x, y in self.points]}
+
+    def polygon(self, w, h):
+        """Polygon in pixel coordinates (int32, shape (N, 2))."""
+        pts = np.array(self.points, dtype=np.float64) * [w - 1, h - 1]
+        return np.round(pts).astype(np.int32)
+
+    def box(self, w, h):
+        """Bounding box [x1, y1, x2, y2) of the polygon in pixels (x2/y2 exclusive)."""
+        poly = self.polygon(w, h)
+        x1, y1 = poly.min(axis=0)
+        x2, y2 = poly.max(axis=0) + 1
+        return [int(x1), int(y1), int(min(x2, w)), int(min(y2, h))]
+
+    def crop(self, img):
+        """Bounding-box crop (a view, no copy) of img."""
+        h, w = img.shape[:2]
+        x1, y1, x2, y2 = self.box(w, h)
+        return img[y1:y2, x1:x2]
+
+    def crop_mask(self, w, h):
+        """uint8 polygon mask (255 inside) at bounding-box size, for masking edges inside the crop."""
+        x1, y1, x2, y2 = self.box(w, h)
+        mask = np.zeros((y2 - y1, x2 - x1), dtype=np.uint8)
+        cv2.fillPoly(mask, [self.polygon(w, h) - [x1, y1]], 255)
+        return mask
+
+
+def parse_roi(spec):
+    """
+    "none"/None -> None; "auto" or "auto:N" -> ("auto", N);
+    "top,top_width,bottom_width[,center]" -> RoadROI.trapezoid(...)
+    """
+    if not spec or spec == "none":
+        return None
+    if spec.startswith("auto"):
+        n = int(spec.split(":", 1)[1]) if ":" in spec else AUTO_FRAMES
+        return ("auto", n)
+    vals = [float(v) for v in spec.split(",")]
+    return RoadROI.trapezoid(*vals)
+
+
+def _lane_like_lines(frame):
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    h, w = gray.shape[:2]
+    y0 = int(h * 0.4)
+    edges = cv2.Canny(cv2.GaussianBlur(gray[y0:], (5, 5), 0), 50, 150)
+    lines = cv2.HoughLinesP(edges, 1, np.pi / 180, threshold=50, minLineLength=int(w * 0.05), maxLineGap=20)
+    if lines is None:
+        return [], []
+    segs = lines[:, 0].astype(np.float64)
+    segs[:, [1, 3]] += y0
+    dx = segs[:, 2] - segs[:, 0]
+    dy = segs[:, 3] - segs[:, 1]
+    angle = np.degrees(np.arctan2(np.abs(dy), np.abs(dx)))
+    keep = (angle > 20) & (angle < 75)
+    slope = dy / np.where(dx == 0, 1e-9, dx)
+    left = segs[keep & (slope < 0)]    # rises to the right (image y points down)
+    right = segs[keep & (slope > 0)]
+    return left, right
+
+
+def _intersections(left, right, limit=200):
+    pts = []
+    for a, b in itertools.islice(itertools.product(left, right), limit):
+        x1, y1, x2, y2 = a
+        x3, y3, x4, y4 = b
+        d = (x1 - x2) * (y3 - y4) - (y1 - y2) * (x3 - x4)
+        if abs(d) < 1e-9:
+            continue
+        px = ((x1 * y2 - y1 * x2) * (x3 - x4) - (x1 - x2) * (x3 * y4 - y3 * x4)) / d
+        py = ((x1 * y2 - y1 * x2) * (y3 - y4) - (y1 - y2) * (x3 * y4 - y3 * x4)) / d
+        pts.append((px, py))
+    return pts
+
+
+def estimate_roi(frames, top_margin=0.03, top_width=0.3, bottom_width=1.0):
+    """
+    Auto ROI from the vanishing point of lane-like (left/right leaning) Hough lines,
+    taken as the median intersection over the given frames. Falls back to the
+    default static trapezoid when too few lines are found.
+    """
+    pts = []
+    size = None
+    for f in frames:
+        h, w = f.shape[:2]
+        size = (w, h)
+        left, right = _lane_like_lines(f)
+        pts += [(x / w, y / h) for x, y in _intersections(left, right)
+                if 0 <= x < w and 0 <= y < h]
+    if size is None or len(pts) < 5:
+        print("⚠ road ROI: vanishing point not found; using default trapezoid")
+        return RoadROI.trapezoid()
+    vx, vy = np.median(np.array(pts), axis=0)
+    top = float(min(0.8, max(0.2, vy + top_margin)))
+    print(f"Road ROI: vanishing point ≈ ({vx:.2f}, {vy:.2f}) -> top at {top:.2f}")
+    return RoadROI.trapezoid(top=top, top_width=top_width, bottom_width=bottom_width, center=float(vx))
+
+
+def resolve_roi(spec, frames):
+    """
+    Turns a parse_roi() result into a RoadROI. For ("auto", N) the first N frames of
+    the (fname, frame, ...) iterable are used and then replayed, so no frame is lost.
+    Returns (roi or None, frames).
+    """
+    if not isinstance(spec, tuple):
+        return spec, frames
+    head = list(itertools.islice(frames, spec[1]))
+    roi = estimate_roi([item[1] for item in head])
+    return roi, itertools.chain(head, frames)
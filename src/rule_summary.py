@@ -0,0 +1,164 @@
+# src/rule_summary.py
+"""
+Offline rule-based summarizer: multi_summary.json -> the same JSON gemini_summary.py writes
+({"llm_text", "llm_parsed"} with executive_summary, recommendations, evidence, severity,
+urgency, tldr), deterministic and in milliseconds, so air-gapped laptops and large batches
+do not wait on the network.
+
+Each factor gets a level (0 none .. 3 high) from the thresholds below; recommendations are
+templated per worsened factor with the relevant IRC code of practice. Overall severity is
+the worst factor level (Critical when two or more factors are high).
+
+PYTHONPATH=. python src/rule_summary.py --summary results/compare/multi_summary.json --out results/compare/llm_summary.json
+(or gemini_summary.py --engine rules; gemini_summary.py also falls back to these rules when Gemini fails)
+"""
+
+import os
+import json
+import argparse
+
+# level thresholds (low, medium, high) per factor
+THRESHOLDS = {
+    "pavement": (5.0, 20.0, 50.0),     # % increase of mean damaged (mask) area per frame
+    "lane": (0.05, 0.10, 0.20),        # increase of mean fade score (0-1)
+    "signs": (0.0, 10.0, 25.0),        # % of base signs missing (> low threshold)
+    "shoulder": (0.02, 0.05, 0.10),    # increase of mean erosion score (0-1)
+}
+LEVELS = ["none", "low", "medium", "high"]
+SEVERITY = {0: "Low", 1: "Low", 2: "Medium", 3: "High"}
+URGENCY = {"Low": "Routine - next scheduled maintenance cycle", "Medium": "Within 3 months",
+           "High": "Within 1 month", "Critical": "Immediate - within 7 days"}
+WORST_SEGMENTS = 3
+
+REFERENCES = {
+    "pavement": "IRC:82-2015 (maintenance of bituminous surfaces)",
+    "lane": "IRC:35-2015 (road markings)",
+    "signs": "IRC:67-2022 (road signs)",
+    "shoulder": "IRC:SP:73 / IRC:SP:84 (shoulder provisions)",
+    "vru": "IRC:103-2022 (pedestrian facilities)",
+}
+ACTIONS = {
+    "pavement": ["Monitor pavement distress at the next survey",
+                 "Seal cracks and patch potholes",
+                 "Patch potholes and crack-seal the affected stretches; plan a renewal coat",
+                 "Immediate pothole repair on the affected stretches; assess for resurfacing / overlay"],
+    "lane": ["Monitor lane marking visibility",
+             "Touch up faded lane markings",
+             "Repaint lane markings on the affected stretches",
+             "Repaint lane and edge markings with retro-reflective thermoplastic along the route"],
+    "signs": ["Verify sign inventory",
+              "Verify and restore missing road signs",
+              "Reinstate missing road signs",
+              "Reinstate missing road signs as a priority; audit sign inventory along the route"],
+    "shoulder": ["Monitor shoulder edges",
+                 "Dress and re-compact eroded shoulder edges",
+                 "Restore eroded shoulders flush with the carriageway edge",
+                 "Rebuild eroded shoulders and remove edge drop-offs along the route"],
+}
+
+
+def level(value, thresholds):
+    return sum(1 for t in thresholds if value > t)
+
+
+def factor_levels(summary):
+    """{factor: (level, evidence text)} for pavement, lane, signs and shoulder"""
+    pav, lane, signs, sh = summary["pavement"], summary["lane"], summary["signs"], summary["shoulder"]
+    out = {}
+    # percent from the raw means: the stored percent_change is 0 when the base run had no damage at all
+    pav_pct = pav["change_pixels"] / max(pav["avg_base_area"], 1) * 100
+    out["pavement"] = (level(pav_pct, THRESHOLDS["pavement"]) if pav["change_pixels"] > 0 else 0,
+                       f"mean damaged area per frame {pav['avg_base_area']} -> {pav['avg_present_area']} px "
+                       + (f"({pav['percent_change']:+}%)" if pav["avg_base_area"] > 1 else "(no damage in the base run)"))
+    lines = f", lines per frame {lane['avg_base_lines']} -> {lane['avg_present_lines']}"
+    out["lane"] = (level(lane["fade_change"], THRESHOLDS["lane"]),
+                   f"fade score {lane['avg_base_fade']} -> {lane['avg_present_fade']} ({lane['fade_change']:+}){lines}")
+    if "base_unique_signs" in signs:
+        base, diff, what = signs["base_unique_signs"], signs["unique_difference"], "unique signs"
+    else:
+        base, diff, what = signs["base_sign_count"], signs["difference"], "sign detections"
+    missing_pct = -diff / max(base, 1) * 100 if diff < 0 else 0.0
+    out["signs"] = (level(missing_pct, THRESHOLDS["signs"]),
+                    f"{what} {base} -> {base + diff} ({diff:+}, {missing_pct:.0f}% missing)")
+    out["shoulder"] = (level(sh["change"], THRESHOLDS["shoulder"]),
+                       f"erosion score {sh['avg_base_erosion']} -> {sh['avg_present_erosion']} ({sh['change']:+})")
+    return out
+
+
+def worst_segments(summary, n=WORST_SEGMENTS):
+    segments = [s for s in summary.get("segments") or [] if s["pavement_verdict"] == "Worsened"]
+    return sorted(segments, key=lambda s: -s["area_change"])[:n], len(segments), len(summary.get("segments") or [])
+
+
+def overall_severity(levels):
+    worst = max(levels.values())
+    if sum(1 for l in levels.values() if l == 3) >= 2:
+        return "Critical"
+    return SEVERITY[worst]
+
+
+def rule_summary(summary):
+    """multi_summary dict -> parsed summary dict (the llm_parsed schema)"""
+    facts = factor_levels(summary)
+    levels = {k: l for k, (l, _) in facts.items()}
+    severity = overall_severity(levels)
+    worsened = [k for k in ("pavement", "lane", "signs", "shoulder") if levels[k] > 0]
+    names = {"pavement": "pavement", "lane": "lane markings", "signs": "road signs", "shoulder": "shoulders"}
+    worst, n_worse, n_segments = worst_segments(summary)
+
+    where = ""
+    if worst:
+        where = " Worst stretches: " + "; ".join(f"segment {s['segment']} ({s['base_range']}, {s['area_change']:+.0f} px)"
+                                                   for s in worst) + "."
+    recommendations = []
+    for k in sorted(worsened, key=lambda k: -levels[k]):
+        l, text = facts[k]
+        action = ACTIONS[k][l] + (f" (start with segments {', '.join(str(s['segment']) for s in worst)})"
+                                  if k == "pavement" and worst else "")
+        recommendations.append({"action": action, "priority": len(recommendations) + 1,
+                                "justification": f"{names[k].capitalize()} {LEVELS[l]} deterioration: {text}. "
+                                                 f"Ref. {REFERENCES[k]}."})
+    vru = summary.get("vru") or {}
+    if vru.get("present_unique_vru", vru.get("present_vru_detections", 0)) > 0 and severity in ("High", "Critical"):
+        recommendations.append({"action": "Add temporary warning signs and delineation for pedestrians / cyclists until repairs are done",
+                                "priority": len(recommendations) + 1,
+                                "justification": f"Vulnerable road users present on a {severity.lower()}-severity stretch. Ref. {REFERENCES['vru']}."})
+
+    if worsened:
+        executive = (f"Compared with the base survey, {', '.join(f'{names[k]} ({LEVELS[levels[k]]})' for k in worsened)} "
+                     f"deteriorated; overall severity is {severity}.")
+    else:
+        executive = "No factor deteriorated beyond the rule thresholds compared with the base survey; overall severity is Low."
+    if n_segments:
+        executive += f" Pavement worsened in {n_worse} of {n_segments} segments.{where}"
+    evidence = "; ".join(f"{names[k].capitalize()}: {text}" for k, (_, text) in facts.items()) + "."
+    if worsened:
+        tldr = f"{severity} severity: fix {', '.join(names[k] for k in sorted(worsened, key=lambda k: -levels[k]))} ({URGENCY[severity].lower()})."
+    else:
+        tldr = "No significant deterioration; routine maintenance."
+    return {
+        "executive_summary": executive,
+        "recommendations": recommendations,
+        "evidence": evidence,
+        "severity": severity,
+        "urgency": URGENCY[severity],
+        "tldr": tldr,
+    }
+
+
+def write_rule_summary(summary_path, output_path):
+    with open(summary_path) as f:
+        parsed = rule_summary(json.load(f))
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump({"llm_text": json.dumps(parsed, indent=2), "llm_parsed": parsed, "engine": "rules"}, f, indent=2)
+    return parsed
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--summary", default="results/compare/multi_summary.json")
+    ap.add_argument("--out", default="results/compare/llm_summary.json")
+    args = ap.parse_args()
+    parsed = write_rule_summary(args.summary, args.out)
+    print(f"✅ Saved: {args.out} (severity {parsed['severity']})")
@@ -0,0 +1,139 @@
+# src/synthetic_road.py
+"""
+Synthetic dash-cam road footage for benchmarks and validation (no real videos needed).
+
+Every frame is drawn with OpenCV from a seed and the frame index, so the same
+arguments always give the same pixels:
+ - asphalt trapezoid with noise texture, converging to a vanishing point
+ - solid edge lines and a dashed centre line; fade 0 (fresh paint) .. 1 (gone)
+ - dark crack-like polylines on the road, scrolling towards the camera
+ - gravel texture in the bottom corners (shoulder); erosion 0..1 adds edge density
+ - a red roadside sign that grows and slides out of view every `sign_every` frames
+
+PYTHONPATH=. python src/synthetic_road.py --out input_videos/synthetic.mp4 --size 1280x720 --frames 120 --fade 0.3
+"""
+
+import os
+import argparse
+import cv2
+import numpy as np
+
+
+def parse_size(spec):
+    """"1280x720" -> (1280, 720)"""
+    w, h = spec.lower().split("x")
+    return int(w), int(h)
+
+
+def _texture(rng, h, w, base, spread):
+    return np.clip(rng.normal(base, spread, (h, w)), 0, 255).astype(np.uint8)
+
+
+def make_frame(i, width=1280, height=720, fade=0.0, cracks=6, erosion=0.3, sign_every=40, seed=0):
+    """Frame i of the synthetic drive as a BGR uint8 image."""
+    rng = np.random.RandomState(seed * 100003 + i)
+    w, h = width, height
+    horizon = int(h * 0.42)
+    vx = w // 2
+    frame = np.empty((h, w, 3), np.uint8)
+    frame[:horizon] = (200, 170, 140)                      # sky
+    frame[horizon:] = (70, 110, 80)                        # verge
+
+    # asphalt
+    road = np.array([[vx - w*0.02, horizon], [vx + w*0.02, horizon], [w*0.98, h], [w*0.02, h]], np.int32)
+    road_mask = np.zeros((h, w), np.uint8)
+    cv2.fillPoly(road_mask, [road], 255)
+    asphalt = _texture(rng, h, w, 85, 10)
+    frame[road_mask > 0] = cv2.cvtColor(asphalt, cv2.COLOR_GRAY2BGR)[road_mask > 0]
+
+    # shoulders: gravel in the bottom corners, noisier with erosion
+    m = int(min(w, h) * 0.22)
+    for x0 in (0, w - m):
+        patch = _texture(rng, m, m, 120, 12 + 60 * erosion)
+        if erosion > 0:
+            speckle = rng.rand(m, m) < 0.08 * erosion
+            patch[speckle] = 30
+        frame[h-m:h, x0:x0+m] = cv2.cvtColor(patch, cv2.COLOR_GRAY2BGR)
+
+    # lane markings
+    paint = int(round(85 + (235 - 85) * (1 - fade)))
+    thick = max(2, w // 160)
+    for bx in (w * 0.12, w * 0.88):
+        cv2.line(frame, (vx, horizon), (int(bx), h), (paint,) * 3, thick)
+    # dashed centre line scrolling with the frame index
+    n_dash = 8
+    phase = (i % 10) / 10
+    for k in range(n_dash):
+        t0 = (k + phase) / n_dash
+        t1 = t0 + 0.5 / n_dash
+        y0 = int(horizon + (h - horizon) * t0 ** 2)
+        y1 = int(horizon + (h - horizon) * min(t1, 1.0) ** 2)
+        cv2.line(frame, (vx, y0), (vx, y1), (paint,) * 3, max(1, int(thick * (0.3 + t0))))
+
+    # cracks: the same set scrolls down the road as the car moves (stable over frames)
+    crng = np.random.RandomState(seed)
+    for c in range(cracks):
+        t = ((crng.rand() + i * 0.01) % 1.0)
+        y = int(horizon + (h - horizon) * (0.15 + 0.85 * t))
+        half = int((w * 0.02 + (w * 0.46) * (y - horizon) / max(h - horizon, 1)) * 0.8)
+        x = vx + int((crng.rand() - 0.5) * 2 * half)
+        pts = [(x, y)]
+        for _ in range(6):
+            x += int(crng.randint(-12, 13) * (0.3 + t) * w / 1280)
+            y += int(crng.randint(2, 10) * (0.3 + t) * h / 720)
+            pts.append((x, y))
+        cv2.polylines(frame, [np.array(pts, np.int32)], False, (25, 25, 25), max(1, int(3 * t * w / 1280) + 1))
+
+    # roadside sign approaching on the right
+    if sign_every:
+        t = (i % sign_every) / sign_every
+        size = int(h * (0.03 + 0.12 * t))
+        sx = int(w * (0.6 + 0.35 * t))
+        sy = int(horizon - size * 1.5 + h * 0.1 * t)
+        if sx + size < w:
+            cv2.rectangle(frame, (sx, sy), (sx + size, sy + size), (30, 30, 210), -1)
+            cv2.line(frame, (sx + size // 2, sy + size), (sx + size // 2, min(h - 1, sy + size * 3)), (90, 90, 90), max(1, size // 10))
+    return frame
+
+
+def iter_road_frames(n_frames, width=1280, height=720, **kw):
+    for i in range(n_frames):
+        yield make_frame(i, width, height, **kw)
+
+
+def write_video(path, n_frames=120, width=1280, height=720, fps=30, **kw):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    for f in iter_road_frames(n_frames, width, height, **kw):
+        out.write(f)
+    out.release()
+    return path
+
+
+def write_frames(folder, n_frames=30, width=1280, height=720, **kw):
+    """Frames as folder/frame_XXXXX.jpg, like extract_frames.py"""
+    os.makedirs(folder, exist_ok=True)
+    for i, f in enumerate(iter_road_frames(n_frames, width, height, **kw)):
+        cv2.imwrite(os.path.join(folder, f"frame_{i:05}.jpg"), f)
+    return folder
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", required=True, help=".mp4 video, or a folder for JPEG frames")
+    ap.add_argument("--size", default="1280x720")
+    ap.add_argument("--frames", type=int, default=120)
+    ap.add_argument("--fps", type=int, default=30)
+    ap.add_argument("--fade", type=float, default=0.0, help="lane paint fade 0..1")
+    ap.add_argument("--cracks", type=int, default=6)
+    ap.add_argument("--erosion", type=float, default=0.3, help="shoulder erosion 0..1")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    w, h = parse_size(args.size)
+    kw = dict(fade=args.fade, cracks=args.cracks, erosion=args.erosion, seed=args.seed)
+    if args.out.lower().endswith((".mp4", ".avi", ".mov")):
+        write_video(args.out, args.frames, w, h, args.fps, **kw)
+    else:
+        write_frames(args.out, args.frames, w, h, **kw)
+    print("Saved:", args.out)
@@ -0,0 +1,152 @@
+# src/tracking.py
+"""
+Lightweight cross-frame object tracker (IoU first, centroid distance as fallback).
+
+Detections of the same physical object on consecutive sampled frames get the same
+track_id, so signs / VRUs can be counted once instead of once per frame (which made
+counts depend on vehicle speed). Temporal smoothing over the window:
+ - a track survives up to `window` frames without a match (missed detections / occlusion
+   do not start a new track)
+ - a track only counts as a physical object once it has `min_hits` detections
+Per frame the work is one small IoU matrix per label, negligible next to inference.
+"""
+
+import numpy as np
+
+IOU_THR = 0.3
+CENTROID_FRAC = 0.5    # max centroid shift as a fraction of the track box diagonal
+SIGN_KEY = "sign"      # labels containing this count as signs (same rule as compare_signs)
+VRU_LABELS = ("vru", "person", "bicycle")
+
+
+def iou_matrix(a, b):
+    """(n, 4) x (m, 4) xyxy boxes -> (n, m) IoU"""
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0]); iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2]); iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+def centroid_ratio(a, b):
+    """(n, m) centroid distance divided by the diagonal of the boxes in a"""
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    ca = (a[:, :2] + a[:, 2:]) / 2
+    cb = (b[:, :2] + b[:, 2:]) / 2
+    dist = np.linalg.norm(ca[:, None, :] - cb[None, :, :], axis=2)
+    diag = np.linalg.norm(a[:, 2:] - a[:, :2], axis=1)
+    return dist / np.maximum(diag, 1.0)[:, None]
+
+
+class Tracker:
+    """
+    Greedy per-label matcher. Call update() once per frame, in frame order.
+    window: frames a track may go unmatched before it is closed (detect_multiclass.TEMPORAL_WINDOW).
+    """
+    def __init__(self, window=5, min_hits=1, iou_thr=IOU_THR, centroid_frac=CENTROID_FRAC):
+        self.window = max(1, window)
+        self.min_hits = max(1, min_hits)
+        self.iou_thr = iou_thr
+        self.centroid_frac = centroid_frac
+        self.frame = 0
+        self.next_id = 0
+        self.active = {}     # track_id -> {"label", "box", "last", "hits"}
+        self.hits = {}       # track_id -> hits, kept for every track ever opened
+        self.labels = {}     # track_id -> label
+
+    def _match(self, ids, boxes):
+        """Greedy assignment of this label's boxes to its active tracks -> list of track ids (None = new)."""
+        out = [None] * len(boxes)
+        if not ids or not len(boxes):
+            return out
+        prev = np.array([self.active[t]["box"] for t in ids], dtype=np.float64)
+        iou = iou_matrix(prev, boxes)
+        near = centroid_ratio(prev, boxes) <= self.centroid_frac
+        # IoU decides; boxes that do not overlap enough but stayed close rank below any IoU match
+        score = np.where(iou >= self.iou_thr, 1.0 + iou, np.where(near, 1.0 - centroid_ratio(prev, boxes), -1.0))
+        for flat in np.argsort(-score, axis=None):
+            r, c = divmod(int(flat), score.shape[1])
+            if score[r, c] < 0:
+                break
+            if out[c] is None and ids[r] is not None:
+                out[c] = ids[r]
+                ids[r] = None
+        return out
+
+    def update(self, boxes, labels):
+        """boxes: (k, 4) xyxy, labels: k labels for one frame -> k track ids"""
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        track_ids = [None] * len(boxes)
+        for label in dict.fromkeys(labels):   # first-seen order keeps ids deterministic
+            idx = [i for i, l in enumerate(labels) if l == label]
+            ids = [t for t, tr in self.active.items() if tr["label"] == label]
+            for i, t in zip(idx, self._match(ids, boxes[idx])):
+                if t is None:
+                    t = self.next_id
+                    self.next_id += 1
+                    self.labels[t] = label
+                    self.hits[t] = 0
+                    self.active[t] = {"label": label}
+                self.active[t].update(box=boxes[i], last=self.frame)
+                self.hits[t] += 1
+                track_ids[i] = t
+        # close tracks unmatched for longer than the window
+        self.active = {t: tr for t, tr in self.active.items() if self.frame - tr["last"] < self.window}
+        self.frame += 1
+        return track_ids
+
+    def track_objects(self, objects):
+        """Adds "track_id" to each object dict of one frame entry (in place)."""
+        ids = self.update([o["bbox"] for o in objects], [o["label"] for o in objects])
+        for o, t in zip(objects, ids):
+            o["track_id"] = t
+        return objects
+
+    def confirmed(self):
+        """Track ids with at least min_hits detections."""
+        return [t for t, n in self.hits.items() if n >= self.min_hits]
+
+    def unique_counts(self):
+        """count_unique() of every track seen so far"""
+        return count_unique(self.labels, self.hits, self.min_hits)
+
+
+def is_sign(label):
+    return SIGN_KEY in str(label).lower()
+
+
+def is_vru(label):
+    return str(label).lower() in VRU_LABELS
+
+
+def count_unique(track_labels, track_hits=None, min_hits=1):
+    """
+    track_labels: {track_id: label} (track_hits: {track_id: detections}) ->
+    {"signs": n, "vru": n, "by_label": {...}} counting each physical object once.
+    """
+    by_label = {}
+    for t, label in track_labels.items():
+        if track_hits is not None and track_hits.get(t, 0) < min_hits:
+            continue
+        by_label[label] = by_label.get(label, 0) + 1
+    return {"signs": sum(n for l, n in by_label.items() if is_sign(l)),
+            "vru": sum(n for l, n in by_label.items() if is_vru(l)),
+            "by_label": by_label}
+
+
+def track_results(items, window=5, min_hits=1):
+    """
+    Tracks an ordered iterable of (frame, entry) pairs that have no track ids yet
+    (results written before tracking existed). Entries are not modified.
+    Returns count_unique() of the tracks found.
+    """
+    tracker = Tracker(window, min_hits)
+    for _, entry in items:
+        objs = entry.get("objects", [])
+        tracker.update([o["bbox"] for o in objs], [o["label"] for o in objs])
+    return tracker.unique_counts()